@@ -0,0 +1,100 @@
+"""
+Compares the time per request of the two connection engines,
+`http_client_handler` on asyncio streams and `HttpProtocol` on
+the transport, with the client in the same process and event
+loop. The client's own cost is the same for both, so the
+difference is the overhead one engine saves over the other.
+
+    python -m benchmarks.engines
+    python -m benchmarks.engines --pipeline 16
+"""
+
+from benchmarks.micro import BROWSER_REQUEST
+from server import server
+from server.protocol import HttpProtocol
+
+import argparse
+import asyncio
+import time
+from functools import partial
+
+REQUESTS = 20_000
+REPEAT = 3
+
+
+async def handler(req):
+    # what most handlers look at
+    await req.method
+    await req.path
+    async for _ in req.headers:
+        pass
+    return server.HELLO_WORLD
+
+
+async def start(engine: str) -> asyncio.AbstractServer:
+    loop = asyncio.get_running_loop()
+    if engine == "protocol":
+        factory = partial(
+            HttpProtocol, handler=handler, max_requests=None
+        )
+        return await loop.create_server(factory, "127.0.0.1", 0)
+    client_handler = partial(
+        server.http_client_handler,
+        handler=handler,
+        max_requests=None,
+    )
+    return await asyncio.start_server(client_handler, "127.0.0.1", 0)
+
+
+async def measure(engine: str, requests: int, pipeline: int):
+    srv = await start(engine)
+    port = srv.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    batch = BROWSER_REQUEST * pipeline
+    end = b"Hello, world!"
+
+    async def run(count: int) -> None:
+        for _ in range(count // pipeline):
+            writer.write(batch)
+            for _ in range(pipeline):
+                await reader.readuntil(end)
+
+    await run(requests // 10)  # warm up
+    best = float("inf")
+    for _ in range(REPEAT):
+        start_ns = time.perf_counter_ns()
+        await run(requests)
+        best = min(best, time.perf_counter_ns() - start_ns)
+
+    writer.close()
+    srv.close()
+    await srv.wait_closed()
+    return best / requests / 1_000
+
+
+async def main() -> None:
+    args = argparse.ArgumentParser()
+    args.add_argument("--requests", type=int, default=REQUESTS)
+    args.add_argument(
+        "--pipeline",
+        type=int,
+        default=1,
+        help="requests sent before reading their responses",
+    )
+    args = args.parse_args()
+
+    results = {}
+    for engine in ("streams", "protocol"):
+        results[engine] = await measure(
+            engine, args.requests, args.pipeline
+        )
+        print(f"{engine:<10}{results[engine]:>8.1f} µs/request")
+    saved = results["streams"] - results["protocol"]
+    print(
+        f"{'saved':<10}{saved:>8.1f} µs/request "
+        f"({saved / results['streams']:.0%})"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,396 @@
+"""
+Micro-benchmarks of the parsing and serializing hot paths, with
+a baseline to catch regressions.
+
+    python -m benchmarks.micro            # compare to the baseline
+    python -m benchmarks.micro --save     # record a new baseline
+    make bench
+
+Each case reports the best time per operation over several runs
+and the peak of the memory traced by tracemalloc while one
+operation runs, which is what it holds at its busiest rather
+than the number of its allocations. `--check` exits non-zero
+when a case is slower than its baseline by more than
+`--threshold` or peaks higher by more than `--peak-threshold`;
+slow cases are timed once more before failing, to ride out a
+noisy moment. Timings only compare on the same machine and
+Python, so the baseline is not kept in the repository: the first
+`--check` without one records it, where the gate runs.
+"""
+
+from server import server
+from server.http import parser, request, response
+from server.http.header import Header
+from server.metrics import Metrics
+
+import argparse
+import asyncio
+import atexit
+import json
+import os
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+# timings are noisier than peaks
+THRESHOLD = 0.25
+PEAK_THRESHOLD = 0.10
+# slack for peaks small enough to come and go with the
+# interpreter's own bookkeeping
+PEAK_SLACK = 256
+MIN_TIME = 0.1
+REPEAT = 5
+
+BROWSER_REQUEST = (
+    b"GET /assets/app.js?v=3 HTTP/1.1\r\n"
+    b"Host: www.example.com\r\n"
+    b"Connection: keep-alive\r\n"
+    b'sec-ch-ua: "Chromium";v="118", "Not=A?Brand";v="99"\r\n'
+    b"sec-ch-ua-mobile: ?0\r\n"
+    b"User-Agent: Mozilla/5.0 (X11; Linux x86_64) "
+    b"AppleWebKit/537.36 (KHTML, like Gecko) "
+    b"Chrome/118.0.0.0 Safari/537.36\r\n"
+    b'sec-ch-ua-platform: "Linux"\r\n'
+    b"Accept: */*\r\n"
+    b"Sec-Fetch-Site: same-origin\r\n"
+    b"Sec-Fetch-Mode: no-cors\r\n"
+    b"Sec-Fetch-Dest: script\r\n"
+    b"Referer: https://www.example.com/\r\n"
+    b"Accept-Encoding: gzip, deflate, br\r\n"
+    b"Accept-Language: en-US,en;q=0.9\r\n"
+    b"Cookie: session=4f3c2a1b9e8d7c6b5a4f3e2d1c0b9a8f; "
+    b"theme=dark; _ga=GA1.1.123456789.1700000000\r\n"
+    b"\r\n"
+)
+
+MANY_HEADERS_REQUEST = (
+    b"GET / HTTP/1.1\r\n"
+    + b"".join(
+        b"X-Header-%03d: value-%03d\r\n" % (i, i) for i in range(100)
+    )
+    + b"\r\n"
+)
+
+LARGE_BODY = b"x" * 1_048_576
+LARGE_BODY_REQUEST = (
+    b"POST /upload HTTP/1.1\r\nContent-Length: %d\r\n\r\n"
+    % len(LARGE_BODY)
+)
+LARGE_BODY_READS = [
+    LARGE_BODY[start:end]
+    for start, end in zip(
+        range(0, len(LARGE_BODY), 65_536),
+        range(65_536, len(LARGE_BODY) + 65_536, 65_536),
+    )
+]
+
+ONE_BYTE_READS = [bytes([byte]) for byte in BROWSER_REQUEST]
+
+DYNAMIC_RESPONSE = response.Response(
+    protocol=response.Protocol.HTTP1_1,
+    status=response.Status.OK,
+    headers=[
+        Header("Content-Type", "application/json"),
+        Header("Cache-Control", "no-cache"),
+        Header("Vary", "Accept-Encoding"),
+    ],
+    body=b'{"hello": "world", "items": [1, 2, 3]}',
+)
+
+PRERENDERED_RESPONSE = response.prerender(
+    response.Response(
+        protocol=response.Protocol.HTTP1_1,
+        status=response.Status.OK,
+        body=b"Hello, world!",
+    )
+)
+
+
+def parse_reads(reads: List[bytes]) -> Callable[[], None]:
+    def parse() -> None:
+        p = parser.BufferedParser(max_body_size=None)
+        for data in reads:
+            p.maybe_get_lines(data)
+
+    return parse
+
+
+def parse_large_body() -> None:
+    p = parser.BufferedParser()
+    p.maybe_get_lines(LARGE_BODY_REQUEST)
+    for data in LARGE_BODY_READS:
+        p.maybe_get_lines(data)
+
+
+METRICS = Metrics()
+TIMED_REQUEST = SimpleNamespace(
+    received_at=1.0, parsed_at=1.000_002, head_at=1.000_01
+)
+
+
+def record_request() -> None:
+    """What `Metrics` adds to a request it times."""
+    clock = METRICS.clock
+    called = clock()
+    returned = clock()
+    METRICS.request_done(
+        TIMED_REQUEST, 0.9, called, returned, clock()
+    )
+    METRICS.responded(response.Status.OK, 100)
+
+
+class MemoryWriter(object):
+    """Stands in for a `StreamWriter`, noting each response."""
+
+    def __init__(self) -> None:
+        self.responded: Optional[asyncio.Future] = None
+
+    def write(self, data: bytes) -> None:
+        self.responded.set_result(None)
+
+    def writelines(self, buffers: List[bytes]) -> None:
+        self.responded.set_result(None)
+
+    async def drain(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    async def wait_closed(self) -> None:
+        pass
+
+
+class KeepAliveConnection(object):
+    """
+    One connection of `http_client_handler`, over an in-memory
+    stream, that is sent a request and answered per call. The
+    connection stays open across calls, so each one is what a
+    further request on a kept-alive connection costs.
+    """
+
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+        self.writer = MemoryWriter()
+        # only once the case runs, not for every `-k` left out
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def open(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        self.loop.run_until_complete(self.connect())
+        atexit.register(self.close)
+
+    async def connect(self) -> None:
+        self.reader = asyncio.StreamReader()
+        self.task = asyncio.ensure_future(
+            server.http_client_handler(
+                self.reader, self.writer, max_requests=None
+            )
+        )
+
+    def __call__(self) -> None:
+        if self.loop is None:
+            self.open()
+        self.writer.responded = self.loop.create_future()
+        self.reader.feed_data(self.data)
+        self.loop.run_until_complete(self.writer.responded)
+
+    def close(self) -> None:
+        self.reader.feed_eof()
+        self.loop.run_until_complete(self.task)
+        self.loop.close()
+
+
+class Case(NamedTuple):
+    name: str
+    op: Callable[[], object]
+
+
+CASES = [
+    Case("parser_browser", parse_reads([BROWSER_REQUEST])),
+    Case("parser_100_headers", parse_reads([MANY_HEADERS_REQUEST])),
+    Case("parser_1_byte_reads", parse_reads(ONE_BYTE_READS)),
+    Case("parser_large_body", parse_large_body),
+    Case(
+        "parse_start_line",
+        lambda: request.parse_start_line(
+            b"GET /assets/app.js?v=3 HTTP/1.1"
+        ),
+    ),
+    Case(
+        "parse_header",
+        lambda: request.parse_header(
+            b"Accept-Language: en-US,en;q=0.9"
+        ),
+    ),
+    Case("to_bytes", lambda: response.to_bytes(DYNAMIC_RESPONSE)),
+    Case(
+        "to_bytes_prerendered",
+        lambda: response.to_bytes(PRERENDERED_RESPONSE),
+    ),
+    Case("metrics_per_request", record_request),
+    Case("keep_alive_request", KeepAliveConnection(BROWSER_REQUEST)),
+]
+
+
+def time_op(op: Callable[[], object]) -> float:
+    """Best nanoseconds per call over `REPEAT` timed loops."""
+    number = 1
+    while True:
+        start = time.perf_counter_ns()
+        for _ in range(number):
+            op()
+        elapsed = time.perf_counter_ns() - start
+        if elapsed >= MIN_TIME * 1e9:
+            break
+        number *= 2
+
+    best = elapsed / number
+    for _ in range(REPEAT - 1):
+        start = time.perf_counter_ns()
+        for _ in range(number):
+            op()
+        best = min(best, (time.perf_counter_ns() - start) / number)
+    return best
+
+
+def peak_op(op: Callable[[], object]) -> int:
+    """Peak bytes allocated while running `op` once."""
+    op()  # warm up caches and lazily created objects
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        op()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return max(peak - before, 0)
+
+
+def measure(cases: List[Case]) -> Dict[str, Dict[str, float]]:
+    return {
+        case.name: {
+            "ns_per_op": round(time_op(case.op), 1),
+            "peak_bytes_per_op": peak_op(case.op),
+        }
+        for case in cases
+    }
+
+
+def regressions(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    threshold: float,
+    peak_threshold: float,
+) -> List[str]:
+    found = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        ns, base_ns = result["ns_per_op"], base["ns_per_op"]
+        if ns > base_ns * (1 + threshold):
+            found.append(
+                f"{name}: {ns:.0f} ns/op vs {base_ns:.0f} baseline"
+            )
+        peak = result["peak_bytes_per_op"]
+        base_peak = base["peak_bytes_per_op"]
+        if peak > base_peak * (1 + peak_threshold) + PEAK_SLACK:
+            found.append(
+                f"{name}: {peak} peak B vs {base_peak} baseline"
+            )
+    return found
+
+
+def any_about(name: str, found: List[str]) -> bool:
+    return any(line.startswith(f"{name}:") for line in found)
+
+
+def report(
+    results: Dict[str, Dict[str, float]],
+    baseline: Optional[Dict[str, Dict[str, float]]],
+) -> str:
+    lines = [
+        f"{'case':<24}{'ns/op':>12}{'peak B':>10}{'vs base':>10}"
+    ]
+    for name, result in results.items():
+        ns = result["ns_per_op"]
+        change = ""
+        if baseline and name in baseline:
+            base_ns = baseline[name]["ns_per_op"]
+            change = f"{(ns / base_ns - 1) * 100:+.1f}%"
+        lines.append(
+            f"{name:<24}{ns:>12.0f}"
+            f"{result['peak_bytes_per_op']:>10}{change:>10}"
+        )
+    return "\n".join(lines)
+
+
+def load_baseline(path: str) -> Optional[Dict]:
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = argparse.ArgumentParser()
+    args.add_argument("--baseline", default=BASELINE)
+    args.add_argument(
+        "--save",
+        action="store_true",
+        help="write the results as the new baseline",
+    )
+    args.add_argument(
+        "--check",
+        action="store_true",
+        help="exit with 1 if any case regressed",
+    )
+    args.add_argument("--threshold", type=float, default=THRESHOLD)
+    args.add_argument(
+        "--peak-threshold", type=float, default=PEAK_THRESHOLD
+    )
+    args.add_argument("-k", help="only run cases containing this")
+    args = args.parse_args(argv)
+
+    cases = [c for c in CASES if not args.k or args.k in c.name]
+    results = measure(cases)
+    baseline = load_baseline(args.baseline)
+    print(report(results, baseline))
+
+    if args.save or (args.check and baseline is None):
+        # cases left out with -k keep their old baseline
+        saved = {**(baseline or {}), **results}
+        with open(args.baseline, "w") as f:
+            json.dump(saved, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    if args.check:
+        found = regressions(
+            results, baseline, args.threshold, args.peak_threshold
+        )
+        if found:
+            retried = measure(
+                [c for c in cases if any_about(c.name, found)]
+            )
+            results.update(retried)
+            found = regressions(
+                results,
+                baseline,
+                args.threshold,
+                args.peak_threshold,
+            )
+        for line in found:
+            print(f"REGRESSION {line}")
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
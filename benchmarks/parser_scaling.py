@@ -0,0 +1,81 @@
+"""
+Feeds ever larger messages to `BufferedParser` in small reads
+and reports the cost per byte, which should stay flat if the
+parser is linear in the message size.
+
+    python -m benchmarks.parser_scaling
+"""
+
+from server.http import parser
+
+import argparse
+import time
+from typing import Callable, List
+
+
+READ_SIZE = 128
+SIZES = [1_024, 4_096, 16_384, 65_536, 262_144, 1_048_576]
+# well past `parser.MAX_HEADER_SIZE`, which would turn the larger
+# heads away
+MAX_HEADER_SIZE = 2 * max(SIZES)
+
+
+def many_headers(size: int) -> bytes:
+    header = b"X-Filler: " + b"a" * 54 + b"\r\n"
+    count = max(size // len(header), 1)
+    return b"GET / HTTP/1.1\r\n" + header * count + b"\r\n"
+
+
+def large_body(size: int) -> bytes:
+    line = b"a" * 63 + b"\n"
+    body = line * max(size // len(line), 1)
+    head = f"POST / HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n"
+    return head.encode() + body
+
+
+def split(message: bytes, read_size: int) -> List[bytes]:
+    reads = []
+    for start in range(0, len(message), read_size):
+        end = start + read_size
+        reads.append(message[start:end])
+    return reads
+
+
+def parse(reads: List[bytes]) -> None:
+    p = parser.BufferedParser(max_header_size=MAX_HEADER_SIZE)
+    for data in reads:
+        p.maybe_get_lines(data)
+    assert p.complete
+
+
+def measure(
+    make: Callable[[int], bytes],
+    size: int,
+    read_size: int,
+    repeat: int,
+) -> float:
+    message = make(size)
+    reads = split(message, read_size)
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        parse(reads)
+        best = min(best, time.perf_counter_ns() - start)
+    return best / len(message)
+
+
+def main() -> None:
+    args = argparse.ArgumentParser()
+    args.add_argument("--read-size", type=int, default=READ_SIZE)
+    args.add_argument("--repeat", type=int, default=5)
+    args = args.parse_args()
+
+    print(f"{'corpus':<14}{'bytes':>10}{'ns/byte':>10}")
+    for make in (many_headers, large_body):
+        for size in SIZES:
+            ns = measure(make, size, args.read_size, args.repeat)
+            print(f"{make.__name__:<14}{size:>10}{ns:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
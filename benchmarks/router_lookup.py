@@ -0,0 +1,79 @@
+"""
+Registers ever more routes with `Router` and reports the cost of
+looking up a path, which should stay flat as the table grows
+since each path segment is a single dict access.
+
+    python -m benchmarks.router_lookup
+"""
+
+from server import router
+from server.http.method import Method
+
+import argparse
+import random
+import time
+from typing import List
+
+ROUTE_COUNTS = [10, 100, 1_000, 10_000]
+LOOKUPS = 10_000
+
+
+async def handler(req):
+    return None
+
+
+def make_router(count: int) -> router.Router:
+    r = router.Router()
+    r.add(Method.GET, "/static/{path*}", handler)
+    for i in range(count - 1):
+        prefix = f"/api/v{i % 10}/resource{i // 2}"
+        if i % 2:
+            r.add(Method.GET, prefix + "/{id}/items/{item}", handler)
+        else:
+            r.add(Method.GET, prefix, handler)
+    return r
+
+
+def make_paths(count: int) -> List[bytes]:
+    rand = random.Random(count)
+    paths = []
+    for _ in range(LOOKUPS):
+        i = rand.randrange(count - 1)
+        prefix = f"/api/v{i % 10}/resource{i // 2}"
+        match rand.randrange(3):
+            case 0:
+                path = f"/static/css/site-{i}.css"
+            case _ if i % 2:
+                path = prefix + "/42/items/7"
+            case _:
+                path = prefix
+        paths.append(path.encode())
+    return paths
+
+
+def measure(count: int, repeat: int) -> float:
+    r = make_router(count)
+    paths = make_paths(count)
+    lookup = r.lookup
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        for path in paths:
+            assert lookup(path)
+        best = min(best, time.perf_counter_ns() - start)
+    return best / len(paths)
+
+
+def main() -> None:
+    args = argparse.ArgumentParser()
+    args.add_argument("--repeat", type=int, default=5)
+    args = args.parse_args()
+
+    print(f"{'routes':>10}{'ns/lookup':>12}")
+    for count in ROUTE_COUNTS:
+        ns = measure(count, args.repeat)
+        print(f"{count:>10}{ns:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -30,5 +30,5 @@ def connect(
 
 if __name__ == "__main__":
     sleep_for = int(argv[1])
-    message = b"GET /path/to/resource HTTP/1.1\nHost: localhost\nAccept-Language: en\n\nTHIS IS SOME BODY TEXT"
+    message = b"GET /path/to/resource HTTP/1.1\nHost: localhost\nAccept-Language: en\nContent-Length: 22\n\nTHIS IS SOME BODY TEXT"
     connect(message, sleep_for)
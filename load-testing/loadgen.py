@@ -0,0 +1,333 @@
+"""
+Stdlib-only load generator. Opens `--connections` concurrent
+connections that each send requests back to back for
+`--duration` seconds, and reports requests per second and the
+latency distribution from an HDR-style histogram.
+
+    python -m server &
+    python load-testing/loadgen.py --port 8080 -c 50 -d 10
+    python load-testing/loadgen.py --port 8080 --no-keep-alive
+    python load-testing/loadgen.py --port 8080 --pipeline 8
+
+    python sync_server.py &
+    python load-testing/loadgen.py --port 50007 -c 1
+
+`sync_server.py` echoes requests instead of answering them,
+which is detected and counted as a response all the same.
+Responses with a 503 status are counted as shed and left out of
+the latencies, which are those of the requests the server took.
+Each connection waits for its responses before sending more
+(a closed loop), so latencies under overload understate what
+an open stream of clients would see. `--json` writes the
+results to a file for comparing runs between commits.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, List, Optional, Tuple
+
+HTTP = b"HTTP/"
+SHED = 503
+PERCENTILES = (50.0, 90.0, 99.0, 99.9)
+
+
+class Histogram(object):
+    """
+    Log-linear histogram of non-negative integers: every power
+    of two is split into 2 ** (`bits` - 1) equal buckets, so a
+    recorded value is off by less than 2 ** -(`bits` - 1), about
+    1.6% for the default, at any magnitude.
+    """
+
+    __slots__ = (
+        "_bits",
+        "_counts",
+        "_total",
+        "_min",
+        "_max",
+        "_sum",
+    )
+
+    def __init__(self, bits: int = 7) -> None:
+        self._bits: int = bits
+        self._counts: Dict[Tuple[int, int], int] = {}
+        self._total: int = 0
+        self._min: Optional[int] = None
+        self._max: int = 0
+        self._sum: int = 0
+
+    @property
+    def total(self) -> int:
+        return self._total
+
+    @property
+    def min(self) -> int:
+        return self._min or 0
+
+    @property
+    def max(self) -> int:
+        return self._max
+
+    @property
+    def mean(self) -> float:
+        return self._sum / self._total if self._total else 0.0
+
+    def record(self, value: int) -> None:
+        shift = max(value.bit_length() - self._bits, 0)
+        key = (shift, value >> shift)
+        self._counts[key] = self._counts.get(key, 0) + 1
+        self._total += 1
+        self._sum += value
+        self._max = max(self._max, value)
+        if self._min is None or value < self._min:
+            self._min = value
+
+    def percentile(self, percent: float) -> int:
+        """
+        Highest value equivalent to the one below which
+        `percent` of the recorded values fall.
+        """
+        if not self._total:
+            return 0
+        target = max(percent / 100 * self._total, 1)
+        seen = 0
+        for shift, mantissa in sorted(self._counts):
+            seen += self._counts[shift, mantissa]
+            if seen >= target:
+                highest = ((mantissa + 1) << shift) - 1
+                return min(highest, self._max)
+        return self._max
+
+
+class Stats(object):
+    __slots__ = (
+        "latency",
+        "responses",
+        "errors",
+        "connections",
+        "received",
+        "shed",
+    )
+
+    def __init__(self) -> None:
+        self.latency: Histogram = Histogram()
+        self.responses: int = 0
+        self.errors: int = 0
+        self.connections: int = 0
+        self.received: int = 0
+        self.shed: int = 0
+
+
+def make_request(host: str, path: str, keep_alive: bool) -> bytes:
+    lines = [f"GET {path} HTTP/1.1", f"Host: {host}"]
+    if not keep_alive:
+        lines.append("Connection: close")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode()
+
+
+async def read_response(
+    reader: asyncio.StreamReader, request: bytes
+) -> Tuple[int, int, bool]:
+    """
+    Read one response and return its status, its size and
+    whether the server will close the connection after it.
+    """
+    start = await reader.readexactly(len(HTTP))
+    if start != HTTP:
+        # an echo server sends back the request itself
+        rest = await reader.readexactly(len(request) - len(HTTP))
+        return 200, len(start) + len(rest), False
+
+    head = start + await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(maxsplit=2)[1])
+    length = None
+    chunked = False
+    close = head.startswith(b"HTTP/1.0")
+    for line in head.split(b"\r\n")[1:]:
+        name, _, value = line.partition(b":")
+        name = name.strip().lower()
+        value = value.strip().lower()
+        if name == b"content-length":
+            length = int(value)
+        elif name == b"transfer-encoding":
+            chunked = value.endswith(b"chunked")
+        elif name == b"connection":
+            if value == b"close":
+                close = True
+            elif value == b"keep-alive":
+                close = False
+
+    size = len(head)
+    if chunked:
+        while True:
+            line = await reader.readuntil(b"\r\n")
+            chunk = int(line.split(b";")[0], 16)
+            data = await reader.readexactly(chunk + 2)
+            size += len(line) + len(data)
+            if not chunk:
+                break
+    elif length is not None:
+        size += len(await reader.readexactly(length))
+    else:
+        size += len(await reader.read())
+        close = True
+    return status, size, close
+
+
+async def connection(
+    host: str,
+    port: int,
+    request: bytes,
+    keep_alive: bool,
+    pipeline: int,
+    deadline: float,
+    stats: Stats,
+) -> None:
+    batch = request * pipeline
+    while time.monotonic() < deadline:
+        try:
+            reader, writer = await asyncio.open_connection(
+                host, port
+            )
+        except OSError:
+            stats.errors += 1
+            await asyncio.sleep(0.01)
+            continue
+        stats.connections += 1
+
+        try:
+            closed = False
+            while not closed and time.monotonic() < deadline:
+                sent = time.perf_counter_ns()
+                writer.write(batch)
+                for _ in range(pipeline):
+                    status, size, closed = await read_response(
+                        reader, request
+                    )
+                    if status == SHED:
+                        stats.shed += 1
+                    else:
+                        stats.latency.record(
+                            time.perf_counter_ns() - sent
+                        )
+                    stats.responses += 1
+                    stats.received += size
+                    if closed:
+                        # the rest of the batch goes unanswered
+                        break
+                if not keep_alive:
+                    break
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            stats.errors += 1
+        finally:
+            writer.close()
+
+
+async def run(args) -> Dict:
+    keep_alive = not args.no_keep_alive
+    pipeline = args.pipeline if keep_alive else 1
+    request = make_request(args.host, args.path, keep_alive)
+    stats = Stats()
+
+    started = time.monotonic()
+    deadline = started + args.duration
+    tasks = [
+        asyncio.ensure_future(
+            connection(
+                args.host,
+                args.port,
+                request,
+                keep_alive,
+                pipeline,
+                deadline,
+                stats,
+            )
+        )
+        for _ in range(args.connections)
+    ]
+    _, stuck = await asyncio.wait(tasks, timeout=args.duration + 1)
+    for task in stuck:
+        # e.g. waiting to be accepted by a one-at-a-time server
+        task.cancel()
+    elapsed = time.monotonic() - started
+
+    latency = stats.latency
+    return {
+        "connections": args.connections,
+        "keep_alive": keep_alive,
+        "pipeline": pipeline,
+        "seconds": round(elapsed, 3),
+        "responses": stats.responses,
+        "errors": stats.errors,
+        "shed": stats.shed,
+        "stuck": len(stuck),
+        "connects": stats.connections,
+        "rps": round(stats.responses / elapsed, 1),
+        "mb_per_s": round(stats.received / elapsed / 1e6, 3),
+        "latency_ms": {
+            "min": latency.min / 1e6,
+            "mean": round(latency.mean / 1e6, 3),
+            **{
+                f"p{p:g}": latency.percentile(p) / 1e6
+                for p in PERCENTILES
+            },
+            "max": latency.max / 1e6,
+        },
+    }
+
+
+def report(results: Dict) -> str:
+    lines = [
+        f"{results['connections']} connections, "
+        f"keep-alive {'on' if results['keep_alive'] else 'off'}, "
+        f"pipeline {results['pipeline']}, "
+        f"{results['seconds']} s",
+        f"{results['responses']} responses, "
+        f"{results['errors']} errors, "
+        f"{results['shed']} shed, "
+        f"{results['stuck']} stuck, "
+        f"{results['connects']} connects",
+        f"{results['rps']:.1f} requests/s, "
+        f"{results['mb_per_s']:.3f} MB/s",
+        "latency (ms):",
+    ]
+    for name, value in results["latency_ms"].items():
+        lines.append(f"  {name:>6} {value:10.3f}")
+    return "\n".join(lines)
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--path", default="/")
+    parser.add_argument("-c", "--connections", type=int, default=10)
+    parser.add_argument("-d", "--duration", type=float, default=5.0)
+    parser.add_argument(
+        "--no-keep-alive",
+        action="store_true",
+        help="open a new connection for every request",
+    )
+    parser.add_argument(
+        "--pipeline",
+        type=int,
+        default=1,
+        help="requests sent before waiting for their responses",
+    )
+    parser.add_argument("--json", help="also write results here")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    results = asyncio.run(run(args))
+    print(report(results))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,53 @@
+"""
+Serve the Flask app either on this server or, for comparison,
+on Flask's own development server. Run from this directory:
+
+    PYTHONPATH=.. python wsgi.py            # this server
+    PYTHONPATH=.. python wsgi.py --flask    # Flask's server
+
+and point locust at it:
+
+    locust -f locustfile.py --host http://localhost:8080
+"""
+
+import argparse
+import asyncio
+from functools import partial
+
 from app import app
+from server import server
+from server.blocking import BlockingPool
+from server.wsgi import WSGIHandler
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument(
+        "--flask",
+        action="store_true",
+        help="use Flask's development server instead",
+    )
+    return parser.parse_args()
+
 
 if __name__ == "__main__":
-    app.run()
+    args = parse_args()
+
+    if args.flask:
+        app.run(host=args.host, port=args.port, threaded=True)
+
+    else:
+        handler = WSGIHandler(
+            app,
+            pool=BlockingPool(max_workers=args.threads),
+            server_port=args.port,
+        )
+        client_handler = partial(
+            server.http_client_handler, handler=handler
+        )
+        asyncio.run(
+            server.serve(args.host, args.port, client_handler)
+        )
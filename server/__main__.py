@@ -1,24 +1,236 @@
-from server import server
+from server import asgi, compression, server, static, workers
+from server.admission import Admission
+from server.http.reader import BufferBudget
+from server.metrics import Metrics, serve_metrics
+from server.protocol import HttpProtocol
+from server.shutdown import SHUTDOWN_TIMEOUT, Shutdown
 
+import argparse
 import asyncio
+import importlib
 import logging
+import signal
 from functools import partial
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(prog="python -m server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of pre-forked worker processes",
+    )
+    parser.add_argument(
+        "--reuse-port",
+        action="store_true",
+        help="let each worker bind its own SO_REUSEPORT socket "
+        "instead of inheriting one from the parent",
+    )
+    parser.add_argument(
+        "--static-root",
+        help="serve the files in this directory",
+    )
+    parser.add_argument(
+        "--asgi",
+        metavar="MODULE:APP",
+        help="serve an ASGI 3 application",
+    )
+    parser.add_argument(
+        "--compress",
+        action="store_true",
+        help="gzip or deflate response bodies for clients that "
+        "accept it",
+    )
+    parser.add_argument(
+        "--metrics-path",
+        metavar="PATH",
+        help="serve Prometheus metrics on this path, e.g. /metrics",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help="serve Prometheus metrics on this port instead",
+    )
+    parser.add_argument(
+        "--backlog",
+        type=int,
+        default=server.BACKLOG,
+        help="connections the kernel queues until accepted",
+    )
+    parser.add_argument(
+        "--max-connections",
+        type=int,
+        help="answer connections beyond this many with a 503",
+    )
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        help="answer requests beyond this many being handled at "
+        "once with a 503",
+    )
+    parser.add_argument(
+        "--max-lag",
+        type=float,
+        metavar="SECONDS",
+        help="answer with a 503 while the event loop lags more",
+    )
+    parser.add_argument(
+        "--shutdown-timeout",
+        type=float,
+        default=SHUTDOWN_TIMEOUT,
+        metavar="SECONDS",
+        help="time open connections get to finish on SIGTERM",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=("streams", "protocol"),
+        default="streams",
+        help="serve connections on asyncio streams, or on the "
+        "leaner protocol engine without metrics or admission",
+    )
+    args = parser.parse_args()
+    if args.metrics_port and args.workers > 1:
+        # every worker process has metrics of its own
+        parser.error("--metrics-port needs a single worker")
+    if args.engine == "protocol" and (
+        args.metrics_path
+        or args.metrics_port
+        or args.max_connections
+        or args.max_in_flight
+        or args.max_lag
+    ):
+        parser.error(
+            "metrics and --max-* limits need the streams engine"
+        )
+    return args
+
+
+def load_app(path: str):
+    module, _, name = path.partition(":")
+    return getattr(importlib.import_module(module), name or "app")
+
+
+def with_metrics_port(serve, metrics: Metrics, host: str, port: int):
+    async def serve_with_metrics():
+        async with await serve_metrics(metrics, host, port):
+            await serve()
+
+    return serve_with_metrics
+
+
+def ignore_reload(signum, frame) -> None:
+    # without a parent there is no one to fork new workers, and
+    # by default SIGHUP would end the process
+    logging.warning(
+        "Received SIGHUP, ignored: reloads need --workers 2 or more"
+    )
+
+
 if __name__ == "__main__":
     logging.getLogger().setLevel(logging.DEBUG)
+    args = parse_args()
+
+    host = args.host
+    port = args.port
+    handler = None
+    if args.static_root:
+        handler = static.StaticFiles(args.static_root)
+    if args.asgi:
+        handler = asgi.ASGIHandler(
+            load_app(args.asgi), server=(host, port)
+        )
+    if args.compress:
+        handler = compression.Compressor(
+            handler or server.hello_world_handler
+        )
+    metrics = None
+    if args.metrics_path or args.metrics_port:
+        metrics = Metrics()
+    if args.metrics_path:
+        handler = metrics.expose(
+            handler or server.hello_world_handler,
+            args.metrics_path.encode(),
+        )
 
-    host = "0.0.0.0"
-    port = 8080
-    client_handler = server.http_client_handler
+    shutdown = Shutdown()
+    client_handler = partial(
+        server.http_client_handler,
+        handler=handler,
+        idle_timeout=server.IDLE_TIMEOUT,
+        max_requests=server.MAX_REQUESTS,
+        max_body_size=server.MAX_BODY_SIZE,
+        budget=BufferBudget(server.BUFFER_BUDGET),
+        metrics=metrics,
+        admission=Admission(
+            max_connections=args.max_connections,
+            max_in_flight=args.max_in_flight,
+            max_lag=args.max_lag,
+        ),
+        shutdown=shutdown,
+    )
+    protocol_factory = None
+    if args.engine == "protocol":
+        protocol_factory = partial(
+            HttpProtocol,
+            handler=handler,
+            idle_timeout=server.IDLE_TIMEOUT,
+            max_requests=server.MAX_REQUESTS,
+            max_body_size=server.MAX_BODY_SIZE,
+            shutdown=shutdown,
+        )
     logging.info(
-        f"Starting server on http://{host}:{port} with client handler {client_handler}"
+        f"Starting server on http://{host}:{port} with client handler {protocol_factory or client_handler}"
     )
 
-    asyncio.run(
-        server.serve(
+    if args.workers == 1:
+        serve = partial(
+            server.serve,
             host=host,
             port=port,
             client_handler=client_handler,
+            protocol_factory=protocol_factory,
+            backlog=args.backlog,
+            shutdown=shutdown,
+            shutdown_timeout=args.shutdown_timeout,
         )
-    )
+        if args.metrics_port:
+            serve = with_metrics_port(
+                serve, metrics, host, args.metrics_port
+            )
+        signal.signal(signal.SIGHUP, ignore_reload)
+        asyncio.run(serve())
+
+    elif args.reuse_port:
+        serve = partial(
+            server.serve,
+            host=host,
+            port=port,
+            client_handler=client_handler,
+            protocol_factory=protocol_factory,
+            reuse_port=True,
+            backlog=args.backlog,
+            shutdown=shutdown,
+            shutdown_timeout=args.shutdown_timeout,
+        )
+        workers.Supervisor(
+            target=lambda: asyncio.run(serve()),
+            workers=args.workers,
+        ).run()
+
+    else:
+        serve = partial(
+            server.serve,
+            sock=workers.listen(host, port, args.backlog),
+            client_handler=client_handler,
+            protocol_factory=protocol_factory,
+            backlog=args.backlog,
+            shutdown=shutdown,
+            shutdown_timeout=args.shutdown_timeout,
+        )
+        workers.Supervisor(
+            target=lambda: asyncio.run(serve()),
+            workers=args.workers,
+        ).run()
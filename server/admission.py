@@ -0,0 +1,118 @@
+from server.http.error import HttpBaseError
+
+import asyncio
+from typing import Optional
+
+
+# seconds a shed client is asked to wait before trying again
+RETRY_AFTER = 1
+# how often the event loop's lag is sampled
+LAG_INTERVAL = 0.05
+
+
+class AdmissionError(HttpBaseError):
+    pass
+
+
+class Admission(object):
+    """
+    Limits on the work one server process takes on. A connection
+    or request beyond `max_connections` or `max_in_flight`, or
+    arriving while the event loop runs more than `max_lag`
+    seconds behind, is refused with an `AdmissionError` so that
+    it can be answered with a 503 at once, rather than slowing
+    down everything already admitted. `None` means no limit.
+
+    A request is in flight from its start line being read to its
+    response being written.
+    """
+
+    __slots__ = (
+        "_max_connections",
+        "_max_in_flight",
+        "_max_lag",
+        "_connections",
+        "_in_flight",
+        "_lag",
+        "_monitor",
+    )
+
+    def __init__(
+        self,
+        max_connections: Optional[int] = None,
+        max_in_flight: Optional[int] = None,
+        max_lag: Optional[float] = None,
+    ) -> None:
+        self._max_connections: Optional[int] = max_connections
+        self._max_in_flight: Optional[int] = max_in_flight
+        self._max_lag: Optional[float] = max_lag
+        self._connections: int = 0
+        self._in_flight: int = 0
+        self._lag: float = 0.0
+        self._monitor: Optional[asyncio.Task] = None
+
+    @property
+    def connections(self) -> int:
+        return self._connections
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def lag(self) -> float:
+        """How late the event loop last woke up, in seconds."""
+        return self._lag
+
+    @property
+    def overloaded(self) -> bool:
+        return (
+            self._max_lag is not None and self._lag > self._max_lag
+        )
+
+    def admit_connection(self) -> None:
+        self._check_lag()
+        limit = self._max_connections
+        if limit is not None and self._connections >= limit:
+            raise AdmissionError(f"Already {limit} connections")
+        self._connections += 1
+
+    def release_connection(self) -> None:
+        self._connections -= 1
+
+    def admit_request(self) -> None:
+        self._check_lag()
+        limit = self._max_in_flight
+        if limit is not None and self._in_flight >= limit:
+            raise AdmissionError(
+                f"Already {limit} requests in flight"
+            )
+        self._in_flight += 1
+
+    def release_request(self) -> None:
+        self._in_flight -= 1
+
+    def stop(self) -> None:
+        if self._monitor:
+            self._monitor.cancel()
+            self._monitor = None
+
+    def _check_lag(self) -> None:
+        if self._max_lag is None:
+            return
+        if self._monitor is None:
+            # started on first use, in the loop of the process
+            # that serves, which may be a forked worker
+            self._monitor = asyncio.ensure_future(self._watch())
+        if self.overloaded:
+            raise AdmissionError(
+                f"Event loop lagging by {self._lag:.3f} s"
+            )
+
+    async def _watch(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(LAG_INTERVAL)
+            late = loop.time() - start - LAG_INTERVAL
+            self._lag = max(late, 0.0)
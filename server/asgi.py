@@ -0,0 +1,276 @@
+from server.error import HttpServerError
+from server.http.header import Header
+from server.http.protocol import Protocol
+from server.http.response import (
+    Response,
+    StreamingResponse,
+    prerender,
+)
+from server.http.status import Status
+
+import asyncio
+import logging
+from typing import Callable, Dict, List, NamedTuple, Optional
+from urllib.parse import unquote_to_bytes
+
+
+LOGGER = logging.getLogger("asgi")
+
+ASGI = {"version": "3.0", "spec_version": "2.3"}
+HTTP_VERSIONS = {
+    Protocol.HTTP1_0: "1.0",
+    Protocol.HTTP1_1: "1.1",
+}
+
+INTERNAL_SERVER_ERROR = prerender(
+    Response(
+        protocol=Protocol.HTTP1_1,
+        status=Status.InternalServerError,
+        body=b"Internal Server Error",
+    )
+)
+
+
+class ASGIError(HttpServerError):
+    pass
+
+
+class Chunk(NamedTuple):
+    body: bytes
+    more: bool
+    error: Optional[BaseException] = None
+
+
+class Exchange(object):
+    """
+    The `receive` and `send` callables of one request. Body
+    chunks are only read from the connection when the
+    application asks for them, and `send` returns once the
+    server has taken the chunk, which is what paces the
+    application to the client.
+
+    Once the response has been written, the server reads
+    whatever is left of the body itself and moves on to the
+    next request, so `detach` leaves the application with no
+    more of it. A streamed response is only written once its
+    stream ends, so until then the application can go on
+    reading the body between the chunks it sends.
+    """
+
+    __slots__ = (
+        "_req",
+        "_body",
+        "_start",
+        "_chunks",
+        "_finished",
+        "_responded",
+        "_taken",
+    )
+
+    def __init__(self, req) -> None:
+        self._req = req
+        self._body = None
+        self._start: asyncio.Future = (
+            asyncio.get_running_loop().create_future()
+        )
+        self._chunks: asyncio.Queue = asyncio.Queue()
+        self._finished: bool = False
+        self._responded: asyncio.Event = asyncio.Event()
+        self._taken: bool = False
+
+    @property
+    def start(self) -> asyncio.Future:
+        return self._start
+
+    async def receive(self) -> Dict:
+        if self._finished:
+            # nothing more to read, so wait for the response to
+            # be sent, after which the client counts as gone
+            await self._responded.wait()
+            return {"type": "http.disconnect"}
+        if self._req is None:
+            # the server has read the rest of the body
+            self._finished = True
+            return {
+                "type": "http.request",
+                "body": b"",
+                "more_body": False,
+            }
+
+        if self._body is None:
+            self._body = self._req.body
+        try:
+            chunk = await anext(self._body)
+        except StopAsyncIteration:
+            chunk = b""
+            self._finished = True
+        else:
+            self._finished = self._req.body_complete
+        return {
+            "type": "http.request",
+            "body": chunk,
+            "more_body": not self._finished,
+        }
+
+    async def send(self, message: Dict) -> None:
+        match message["type"]:
+            case "http.response.start":
+                if self._start.done():
+                    raise ASGIError("Response already started")
+                self._start.set_result(message)
+
+            case "http.response.body":
+                if not self._start.done():
+                    raise ASGIError("Response not started")
+                if self._responded.is_set():
+                    raise ASGIError("Response already sent")
+                chunk = Chunk(
+                    message.get("body", b""),
+                    message.get("more_body", False),
+                )
+                if not chunk.more:
+                    self._responded.set()
+                self._chunks.put_nowait(chunk)
+                # until the server has written it
+                await self._chunks.join()
+
+            case other:
+                raise ASGIError(f"Unsupported message {other}")
+
+    def detach(self) -> None:
+        self._req = None
+        self._body = None
+
+    def app_done(self, task: asyncio.Task) -> None:
+        error = None if task.cancelled() else task.exception()
+        if not self._start.done():
+            self._start.set_exception(
+                error or ASGIError("Application sent no response")
+            )
+        if not self._responded.is_set():
+            # ends the body whether or not the app sent it all
+            self._responded.set()
+            self._chunks.put_nowait(Chunk(b"", False, error))
+
+    async def next_chunk(self) -> Chunk:
+        """
+        The next body chunk sent by the application. Taking it
+        releases the `send` call of the previous one.
+        """
+        self.release()
+        chunk = await self._chunks.get()
+        self._taken = True
+        if chunk.error:
+            raise chunk.error
+        return chunk
+
+    def release(self) -> None:
+        if self._taken:
+            self._taken = False
+            self._chunks.task_done()
+
+
+class ASGIHandler(object):
+    """
+    Request handler running an ASGI 3 application for the
+    `http` scope.
+
+    A response whose first body message is also its last is
+    returned with a Content-Length; otherwise the body is
+    streamed as the application sends it. Lifespan events are
+    not sent.
+    """
+
+    __slots__ = (
+        "_app",
+        "_server",
+    )
+
+    def __init__(
+        self,
+        app: Callable,
+        server: Optional[tuple] = None,
+    ) -> None:
+        self._app: Callable = app
+        self._server: Optional[tuple] = server
+
+    async def __call__(self, req) -> Response:
+        scope = await self.make_scope(req)
+        exchange = Exchange(req)
+        task = asyncio.ensure_future(
+            self._app(scope, exchange.receive, exchange.send)
+        )
+        task.add_done_callback(exchange.app_done)
+        try:
+            start = await exchange.start
+            first = await exchange.next_chunk()
+        except Exception:
+            LOGGER.exception("ASGI application failed")
+            exchange.detach()
+            return INTERNAL_SERVER_ERROR
+
+        status = Status(start["status"])
+        raw_headers = start.get("headers", ())
+        headers = [Header(n, v) for n, v in raw_headers]
+        if not first.more:
+            exchange.release()
+            # the connection moves on without the application
+            exchange.detach()
+            return Response(
+                protocol=Protocol.HTTP1_1,
+                status=status,
+                headers=headers,
+                body=first.body,
+            )
+
+        return StreamingResponse(
+            protocol=Protocol.HTTP1_1,
+            status=status,
+            headers=headers,
+            stream=stream(exchange, first, task),
+            length=content_length(raw_headers),
+        )
+
+    async def make_scope(self, req) -> Dict:
+        path, _, query = (await req.path).partition(b"?")
+        headers = [
+            [name.lower(), value]
+            for name, value in await req.header_items()
+        ]
+        return {
+            "type": "http",
+            "asgi": ASGI,
+            "http_version": HTTP_VERSIONS[await req.protocol],
+            "method": (await req.method).name,
+            "scheme": "http",
+            "path": unquote_to_bytes(path).decode(errors="replace"),
+            "raw_path": path,
+            "query_string": query,
+            "root_path": "",
+            "headers": headers,
+            "server": self._server,
+        }
+
+
+async def stream(exchange: Exchange, first: Chunk, task):
+    complete = False
+    try:
+        yield first.body
+        while not complete:
+            chunk = await exchange.next_chunk()
+            complete = not chunk.more
+            if chunk.body:
+                yield chunk.body
+    finally:
+        exchange.release()
+        exchange.detach()
+        if not complete and not task.done():
+            # the response was cut short, e.g. the client left
+            task.cancel()
+
+
+def content_length(headers) -> Optional[int]:
+    for name, value in headers:
+        if name.lower() == b"content-length":
+            return int(value)
+    return None
@@ -0,0 +1,112 @@
+from server.error import HttpServerError
+from server.http.response import Response
+
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+
+LOGGER = logging.getLogger("blocking")
+
+MAX_WORKERS = 8
+
+
+class BlockingPoolError(HttpServerError):
+    pass
+
+
+class BlockingPool(object):
+    """
+    A bounded thread pool for code that blocks, so that the
+    event loop keeps serving other connections meanwhile.
+
+    `pending` is the number of calls waiting for a free thread
+    and `running` the number being executed.
+
+        pool = BlockingPool(max_workers=4)
+
+        def report(req):
+            ...  # may block
+
+        router.add(Method.GET, "/report", pool.handler(report))
+    """
+
+    __slots__ = (
+        "_executor",
+        "_max_workers",
+        "_lock",
+        "_pending",
+        "_running",
+    )
+
+    def __init__(self, max_workers: int = MAX_WORKERS) -> None:
+        if max_workers < 1:
+            raise BlockingPoolError(
+                f"Need at least one worker, got {max_workers}"
+            )
+        self._max_workers: int = max_workers
+        self._executor: ThreadPoolExecutor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="blocking",
+        )
+        # the counts are updated from the worker threads too
+        self._lock: threading.Lock = threading.Lock()
+        self._pending: int = 0
+        self._running: int = 0
+
+    @property
+    def max_workers(self) -> int:
+        return self._max_workers
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    async def run(self, fn: Callable, *args):
+        """Call `fn(*args)` on a worker thread and await it."""
+        with self._lock:
+            self._pending += 1
+        future = self._executor.submit(self._call, fn, *args)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # only succeeds if no thread has picked it up yet
+            if future.cancel():
+                with self._lock:
+                    self._pending -= 1
+            raise
+
+    def handler(self, fn: Callable[..., Response]):
+        """
+        Wrap a synchronous handler, which is given the request
+        read in full as a `BufferedRequest`, as an async handler
+        running it on the pool.
+        """
+
+        async def blocking_handler(req) -> Response:
+            buffered = await req.buffered()
+            return await self.run(fn, buffered)
+
+        blocking_handler.__name__ = getattr(
+            fn, "__name__", "blocking_handler"
+        )
+        return blocking_handler
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _call(self, fn: Callable, *args):
+        with self._lock:
+            self._pending -= 1
+            self._running += 1
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self._running -= 1
@@ -0,0 +1,239 @@
+from server.http.header import Header
+from server.http.response import (
+    FileResponse,
+    Response,
+    StreamingResponse,
+    is_prerendered,
+)
+
+import asyncio
+import gzip
+import logging
+import zlib
+from dataclasses import replace
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+LOGGER = logging.getLogger("compression")
+
+# smaller bodies barely shrink and often grow
+MIN_SIZE = 1_024
+# bodies at least this large are compressed off the event loop
+EXECUTOR_SIZE = 65_536
+# compressed variants kept, counting their source bodies too
+CACHE_SIZE = 16 * 1_048_576
+LEVEL = 6
+
+GZIP = b"gzip"
+DEFLATE = b"deflate"
+# in order of preference when the client weighs them equally
+ENCODINGS = (GZIP, DEFLATE)
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+)
+
+VARY = Header("Vary", "Accept-Encoding")
+
+
+def gzip_compress(body: bytes) -> bytes:
+    # a fixed mtime keeps the output, and so the cache, stable
+    return gzip.compress(body, compresslevel=LEVEL, mtime=0)
+
+
+def deflate_compress(body: bytes) -> bytes:
+    return zlib.compress(body, LEVEL)
+
+
+COMPRESSORS: Dict[bytes, Callable[[bytes], bytes]] = {
+    GZIP: gzip_compress,
+    DEFLATE: deflate_compress,
+}
+
+
+class Compressor(object):
+    """
+    Wraps a request handler and compresses the bodies of its
+    responses with gzip or deflate, whichever the client prefers
+    according to Accept-Encoding.
+
+    Compressed variants of fixed bodies, i.e. prerendered
+    responses and ones with an ETag, are cached by body up to
+    `cache_size` bytes. Bodies of `EXECUTOR_SIZE` bytes or more
+    are compressed in the default executor.
+    """
+
+    __slots__ = (
+        "_handler",
+        "_min_size",
+        "_cache_size",
+        "_cache",
+        "_cached_bytes",
+    )
+
+    def __init__(
+        self,
+        handler,
+        min_size: int = MIN_SIZE,
+        cache_size: int = CACHE_SIZE,
+    ) -> None:
+        self._handler = handler
+        self._min_size: int = min_size
+        self._cache_size: int = cache_size
+        self._cache: Dict[Tuple[bytes, bytes], bytes] = {}
+        self._cached_bytes: int = 0
+
+    async def __call__(self, req) -> Response:
+        resp = await self._handler(req)
+        if not self.eligible(resp):
+            return resp
+
+        fixed = cacheable(resp)
+        resp = replace(resp, headers=[*(resp.headers or ()), VARY])
+        encoding = accepted_encoding(
+            await req.header(b"accept-encoding")
+        )
+        if encoding is None:
+            return resp
+
+        body = await self.compress(encoding, resp.body, fixed)
+        return replace(
+            resp,
+            headers=encoded_headers(resp.headers, encoding),
+            body=body,
+        )
+
+    def eligible(self, resp: Response) -> bool:
+        if isinstance(resp, (FileResponse, StreamingResponse)):
+            return False
+        if not resp.body or len(resp.body) < self._min_size:
+            return False
+
+        for header in resp.headers or ():
+            name = header_name(header)
+            if name == b"content-encoding":
+                return False
+            if name == b"content-type":
+                content_type = header_value(header)
+                if not content_type.startswith(COMPRESSIBLE_TYPES):
+                    return False
+        return True
+
+    async def compress(
+        self, encoding: bytes, body: bytes, cacheable: bool
+    ) -> bytes:
+        key = (encoding, body)
+        if cacheable:
+            compressed = self._cache.pop(key, None)
+            if compressed is not None:
+                # most recently used entries go last
+                self._cache[key] = compressed
+                return compressed
+
+        compress = COMPRESSORS[encoding]
+        if len(body) >= EXECUTOR_SIZE:
+            loop = asyncio.get_running_loop()
+            compressed = await loop.run_in_executor(
+                None, compress, body
+            )
+        else:
+            compressed = compress(body)
+
+        if cacheable:
+            self._store(key, compressed)
+        return compressed
+
+    def _store(self, key: Tuple[bytes, bytes], compressed: bytes):
+        size = len(key[1]) + len(compressed)
+        if size > self._cache_size:
+            return
+        if key in self._cache:
+            return
+        while self._cached_bytes + size > self._cache_size:
+            oldest = next(iter(self._cache))
+            old = self._cache.pop(oldest)
+            self._cached_bytes -= len(oldest[1]) + len(old)
+        self._cache[key] = compressed
+        self._cached_bytes += size
+
+
+def accepted_encoding(value: Optional[bytes]) -> Optional[bytes]:
+    """
+    The supported content coding with the highest q-value in an
+    Accept-Encoding header, or None for the identity.
+    """
+    if not value:
+        return None
+
+    weights: Dict[bytes, float] = {}
+    for item in value.lower().split(b","):
+        coding, _, params = item.partition(b";")
+        coding = coding.strip()
+        q = 1.0
+        name, _, weight = params.partition(b"=")
+        if name.strip() == b"q":
+            try:
+                q = float(weight)
+            except ValueError:
+                q = 0.0
+        weights[coding] = q
+
+    wildcard = weights.get(b"*", 0.0)
+    best, best_q = None, 0.0
+    for encoding in ENCODINGS:
+        q = weights.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def cacheable(resp: Response) -> bool:
+    if is_prerendered(resp):
+        return True
+    return any(header_name(h) == b"etag" for h in resp.headers or ())
+
+
+def encoded_headers(
+    headers: List[Header], encoding: bytes
+) -> List[Header]:
+    encoded = []
+    for header in headers:
+        name = header_name(header)
+        if name == b"content-length":
+            # recomputed for the compressed body
+            continue
+        if name == b"etag":
+            header = Header(
+                header.name, variant_etag(header, encoding)
+            )
+        encoded.append(header)
+    encoded.append(Header("Content-Encoding", encoding.decode()))
+    return encoded
+
+
+def variant_etag(header: Header, encoding: bytes) -> str:
+    # a compressed variant is a different representation and
+    # must not share the strong validator of the original
+    etag = header_value(header)
+    suffix = encoding.decode()
+    if etag.endswith('"'):
+        return f'{etag[:-1]}-{suffix}"'
+    return f"{etag}-{suffix}"
+
+
+def header_value(header: Header) -> str:
+    value = header.value
+    if isinstance(value, bytes):
+        return value.decode()
+    return str(value)
+
+
+def header_name(header: Header) -> bytes:
+    name = header.name
+    if isinstance(name, str):
+        name = name.encode()
+    return name.lower()
@@ -1,7 +1,99 @@
 from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
 
 
 @dataclass(eq=True, frozen=True)
 class Header:
     name: bytes
     value: bytes
+
+
+class HeaderIndex(object):
+    """
+    The header lines of one message, indexed by lower-cased
+    name. Values are only sliced out of their line the first
+    time they are asked for, and kept from then on.
+    """
+
+    __slots__ = (
+        "_lines",
+        "_colons",
+        "_values",
+        "_index",
+    )
+
+    def __init__(self) -> None:
+        self._lines: List[bytes] = []
+        self._colons: List[int] = []
+        self._values: List[Optional[bytes]] = []
+        self._index: Dict[bytes, List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._lines)
+
+    def __contains__(self, name: bytes) -> bool:
+        return self._positions(name) is not None
+
+    def add(self, line: bytes) -> None:
+        colon = line.find(b":")
+        if colon < 0:
+            raise ValueError(f"No colon in header line {line}")
+        name = line[:colon].strip().lower()
+
+        position = len(self._lines)
+        self._lines.append(line)
+        self._colons.append(colon)
+        self._values.append(None)
+        positions = self._index.get(name)
+        if positions is None:
+            self._index[name] = [position]
+        else:
+            positions.append(position)
+
+    def get(
+        self, name: bytes, default: Optional[bytes] = None
+    ) -> Optional[bytes]:
+        """
+        Value of the first header called `name`, compared
+        case-insensitively.
+        """
+        positions = self._positions(name)
+        if positions is None:
+            return default
+        return self._value(positions[0])
+
+    def getall(self, name: bytes) -> List[bytes]:
+        positions = self._positions(name)
+        if positions is None:
+            return []
+        return [self._value(p) for p in positions]
+
+    def items(self) -> List[Tuple[bytes, bytes]]:
+        """Every name, as received, and value in order."""
+        return [
+            (line[:colon].strip(), self._value(position))
+            for position, (line, colon) in enumerate(
+                zip(self._lines, self._colons)
+            )
+        ]
+
+    def clear(self) -> None:
+        self._lines.clear()
+        self._colons.clear()
+        self._values.clear()
+        self._index.clear()
+
+    def _positions(self, name: bytes) -> Optional[List[int]]:
+        positions = self._index.get(name)
+        if positions is None:
+            # callers mostly ask in lower case already
+            positions = self._index.get(name.lower())
+        return positions
+
+    def _value(self, position: int) -> bytes:
+        value = self._values[position]
+        if value is None:
+            start = self._colons[position] + 1
+            value = self._lines[position][start:].strip()
+            self._values[position] = value
+        return value
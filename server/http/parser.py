@@ -6,6 +6,14 @@ from typing import List, NamedTuple, Optional
 
 CR = b"\r"
 NL = b"\n"
+CONTENT_LENGTH = b"content-length"
+TRANSFER_ENCODING = b"transfer-encoding"
+CHUNKED = b"chunked"
+HEX_DIGITS = frozenset(b"0123456789abcdefABCDEF")
+
+# start line and headers together, a little more than what common
+# browsers send with a few cookies
+MAX_HEADER_SIZE = 8_192
 
 
 class HeaderLengthError(HttpBaseError):
@@ -16,78 +24,415 @@ class BodyLengthError(HttpBaseError):
     pass
 
 
+class FramingError(HttpBaseError):
+    pass
+
+
 class MessageState(Enum):
     StartLine = auto()
     Header = auto()
     Body = auto()
 
 
+class BodyMode(Enum):
+    # body handed out as size-bounded chunks of raw bytes
+    Raw = auto()
+    # body split after every line ending
+    Lines = auto()
+
+
+class ChunkState(Enum):
+    Size = auto()
+    Data = auto()
+    DataEnd = auto()
+    Trailer = auto()
+
+
 class Line(NamedTuple):
     data: bytes
     type: MessageState
 
 
+# enum attribute lookups are slow, so the per-line code compares
+# against these instead
+START_LINE = MessageState.StartLine
+HEADER = MessageState.Header
+BODY = MessageState.Body
+
+
 class BufferedParser(object):
+    """
+    Splits a byte stream into the lines of one HTTP message at
+    a time. Once the message is `complete`, any further bytes
+    stay buffered until `reset` moves on to the next message,
+    which is what lets requests be pipelined.
+
+    The body is framed by `Content-Length` or by chunked
+    `Transfer-Encoding`; chunked bodies are decoded as they
+    arrive rather than collected first.
+
+    Received bytes are appended to one growable buffer. `_start`
+    marks the first unconsumed byte and `_scan` how far it is
+    known to hold no newline, so each byte is searched once no
+    matter how small the reads are. Consumed bytes are only
+    dropped once they make up most of the buffer.
+
+    In `BodyMode.Raw` the body comes out in chunks of at most
+    `max_body_chunk` bytes. When nothing else is buffered, a
+    `Content-Length` body is sliced straight out of the received
+    data without passing through the buffer at all.
+
+    A head longer than `max_header_size` raises
+    `HeaderLengthError` as soon as that many bytes arrive without
+    it ending, and a body longer than `max_body_size` raises
+    `BodyLengthError` as soon as its length is declared.
+    """
+
     __slots__ = (
         "_state",
         "_buffer",
+        "_start",
+        "_scan",
+        "_view",
         "_max_header_size",
         "_max_body_chunk",
+        "_max_body_size",
+        "_head_size",
+        "_body_size_total",
+        "_raw",
+        "_body_remaining",
+        "_length",
+        "_chunked",
+        "_chunk_state",
+        "_complete",
     )
 
     def __init__(
         self,
-        max_header_size: int = 1_024,
+        max_header_size: int = MAX_HEADER_SIZE,
         max_body_chunk: int = 102_400,
+        body_mode: BodyMode = BodyMode.Raw,
+        max_body_size: Optional[int] = None,
     ) -> None:
         self._max_header_size: int = max_header_size
         self._max_body_chunk: int = max_body_chunk
+        self._max_body_size: Optional[int] = max_body_size
+        self._head_size: int = 0
+        self._body_size_total: int = 0
+        self._raw: bool = body_mode == BodyMode.Raw
         self._state: MessageState = MessageState.StartLine
-        self._buffer: bytes = b""
+        self._buffer: bytearray = bytearray()
+        self._start: int = 0
+        self._scan: int = 0
+        self._view: Optional[memoryview] = None
+        self._body_remaining: int = 0
+        # the declared Content-Length, if any
+        self._length: Optional[int] = None
+        self._chunked: bool = False
+        self._chunk_state: ChunkState = ChunkState.Size
+        self._complete: bool = False
+
+    @property
+    def complete(self) -> bool:
+        return self._complete
+
+    @property
+    def in_head(self) -> bool:
+        """Whether the head of the current message is unfinished."""
+        return self._state is not BODY and not self._complete
+
+    @property
+    def started(self) -> bool:
+        """Whether any of the current message was received."""
+        return self._state is not START_LINE or self.buffered > 0
+
+    @property
+    def expected(self) -> int:
+        """
+        Number of bytes the current message is known to still
+        need, or 0 if that depends on data not yet received.
+        """
+        if self._state != MessageState.Body:
+            return 0
+        return max(self._body_remaining - self.buffered, 0)
+
+    @property
+    def buffered(self) -> int:
+        """Number of received bytes not handed out yet."""
+        return len(self._buffer) - self._start
 
     def maybe_get_lines(self, data: bytes) -> Optional[List[Line]]:
+        lines: List[Line] = []
+        if (
+            self._state is BODY
+            and self._raw
+            and not self._chunked
+            and self._start == len(self._buffer)
+        ):
+            data = self._pass_body(data, lines)
         self._buffer += data
-        *complete, incomplete = self._buffer.splitlines(
-            keepends=True
-        )
-        if BufferedParser.incomplete_actually_complete(incomplete):
-            if not complete:
-                complete.append(incomplete)
-                incomplete = b""
-            else:
-                complete[-1] += incomplete
-
-        self._buffer = incomplete
-
-        lines = []
-        for c in complete:
-            stripped_c = c.strip()
-            cur_state = self._state
-
-            match self._state:
-                case MessageState.StartLine:
-                    ws = BufferedParser.count_ws(c)
-                    if ws == 2:
-                        self._state = MessageState.Header
-                    line = Line(data=stripped_c, type=cur_state)
-
-                case MessageState.Header:
-                    if not stripped_c:
-                        self._state = MessageState.Body
-                        continue
-                    line = Line(data=stripped_c, type=cur_state)
-
-                case MessageState.Body:
-                    line = Line(data=c, type=cur_state)
-
-            lines.append(line)
 
+        progress = True
+        with memoryview(self._buffer) as self._view:
+            while progress and not self._complete:
+                state = self._state
+                if state is not BODY:
+                    progress = self._head_line(lines, state)
+                elif self._chunked:
+                    progress = self._chunked_body(lines)
+                else:
+                    progress = self._body(lines)
+
+        self._view = None
+        self._compact()
         return lines
 
-    @staticmethod
-    def count_ws(line: bytes) -> int:
-        return line.count(CR) + line.count(NL)
+    def reset(self) -> None:
+        """
+        Prepare for the next message on the same connection. Any
+        buffered bytes are kept since they belong to it.
+        """
+        self._state = MessageState.StartLine
+        self._head_size = 0
+        self._body_size_total = 0
+        self._body_remaining = 0
+        self._length = None
+        self._chunked = False
+        self._chunk_state = ChunkState.Size
+        self._complete = False
+
+    def _next_line(self, strip: bool = True) -> Optional[bytes]:
+        buffer = self._buffer
+        end = buffer.find(NL, self._scan)
+        if end < 0:
+            self._scan = len(buffer)
+            return None
+
+        start = self._start
+        self._start = self._scan = end + 1
+        if end > start and buffer[end - 1] == 13:  # CR
+            end -= 1
+        line = bytes(self._view[start:end])
+        return line.strip() if strip else line
+
+    def _head_line(
+        self, lines: List[Line], state: MessageState
+    ) -> bool:
+        start = self._start
+        line = self._next_line()
+        if line is None:
+            if (
+                self._head_size + self.buffered
+                > self._max_header_size
+            ):
+                raise HeaderLengthError(
+                    f"Head exceeds {self._max_header_size} bytes"
+                )
+            return False
+
+        self._head_size += self._start - start
+        if self._head_size > self._max_header_size:
+            raise HeaderLengthError(
+                f"Head exceeds {self._max_header_size} bytes"
+            )
+
+        if state is START_LINE:
+            # RFC 7230 3.5: ignore empty lines between messages
+            # on a persistent connection
+            if not line:
+                return True
+            self._state = HEADER
+        elif not line:
+            self._end_head()
+            return True
+        else:
+            self._maybe_framing(line)
+
+        lines.append(Line(line, state))
+        return True
+
+    def _maybe_framing(self, line: bytes) -> None:
+        name, _, value = line.partition(b":")
+        if name[-1:] in (b" ", b"\t"):
+            # RFC 7230 3.2.4: else a name that framing does not
+            # recognize could still be read as one once stripped
+            raise FramingError(f"Whitespace before colon in {name}")
+        if len(name) not in (14, 17):
+            return
+        name = name.lower()
+
+        if name == CONTENT_LENGTH:
+            if self._chunked:
+                raise FramingError(
+                    "Both Content-Length and Transfer-Encoding"
+                )
+            # digits only, where int() would also take a sign,
+            # underscores or other whitespace
+            digits = value.strip(b" \t")
+            if not digits.isdigit():
+                raise FramingError(f"Invalid Content-Length {value}")
+            length = int(digits)
+            if self._length is not None:
+                if length != self._length:
+                    raise FramingError(
+                        "Conflicting Content-Length headers"
+                    )
+                return
+            self._check_body_size(length)
+            self._length = length
+            self._body_remaining = length
+
+        elif name == TRANSFER_ENCODING:
+            # whatever the length, even 0, since a proxy in front
+            # may have framed the message by the other header
+            if self._length is not None:
+                raise FramingError(
+                    "Both Content-Length and Transfer-Encoding"
+                )
+            codings = value.lower().split(b",")
+            if codings[-1].strip() != CHUNKED:
+                raise FramingError(
+                    f"Unsupported Transfer-Encoding {value}"
+                )
+            self._chunked = True
+
+    def _end_head(self) -> None:
+        if self._body_remaining or self._chunked:
+            self._state = MessageState.Body
+        else:
+            self._complete = True
+
+    def _body(self, lines: List[Line]) -> bool:
+        body = self._take(self._body_size())
+        if not body:
+            return False
+
+        self._body_remaining -= len(body)
+        if not self._body_remaining:
+            self._complete = True
+        self._emit_body(body, lines)
+        return True
+
+    def _pass_body(self, data: bytes, lines: List[Line]) -> bytes:
+        size = min(len(data), self._body_remaining)
+        step = self._max_body_chunk
+        for start in range(0, size, step):
+            end = min(start + step, size)
+            # a slice of the whole of `data` is `data` itself
+            lines.append(Line(data[start:end], BODY))
+
+        self._body_remaining -= size
+        if not self._body_remaining:
+            self._complete = True
+        return data[size:]
+
+    def _chunked_body(self, lines: List[Line]) -> bool:
+        match self._chunk_state:
+            case ChunkState.Size:
+                line = self._chunk_line(strip=False)
+                if line is None:
+                    return False
+                size, extended, _extensions = line.partition(b";")
+                if extended:
+                    size = size.rstrip(b" \t")
+                # int() would also take a sign, underscores and
+                # whitespace
+                if not size or not HEX_DIGITS.issuperset(size):
+                    raise FramingError(f"Invalid chunk size {size}")
+                self._body_remaining = int(size, 16)
+                self._body_size_total += self._body_remaining
+                self._check_body_size(self._body_size_total)
+                if self._body_remaining:
+                    self._chunk_state = ChunkState.Data
+                else:
+                    self._chunk_state = ChunkState.Trailer
+
+            case ChunkState.Data:
+                data = self._take(self._body_size())
+                if not data:
+                    return False
+                self._body_remaining -= len(data)
+                if not self._body_remaining:
+                    self._chunk_state = ChunkState.DataEnd
+                self._emit_body(data, lines)
+
+            case ChunkState.DataEnd:
+                line = self._chunk_line()
+                if line is None:
+                    return False
+                if line:
+                    raise FramingError("Chunk data too long")
+                self._chunk_state = ChunkState.Size
+
+            case ChunkState.Trailer:
+                # trailer fields are not surfaced, but count
+                # towards the head's limit like other fields
+                start = self._start
+                line = self._chunk_line()
+                if line is None:
+                    return False
+                self._head_size += self._start - start
+                if self._head_size > self._max_header_size:
+                    raise HeaderLengthError(
+                        f"Head exceeds {self._max_header_size} bytes"
+                    )
+                if not line:
+                    self._complete = True
+
+        return True
+
+    def _chunk_line(self, strip: bool = True) -> Optional[bytes]:
+        """
+        The next line of the chunked framing, held to the limit of
+        the head so that a line that never ends cannot grow the
+        buffer without bound.
+        """
+        start = self._start
+        line = self._next_line(strip)
+        if line is None:
+            size = self.buffered
+        else:
+            size = self._start - start
+        if size > self._max_header_size:
+            raise FramingError(
+                f"Chunk line exceeds {self._max_header_size} bytes"
+            )
+        return line
+
+    def _check_body_size(self, size: int) -> None:
+        limit = self._max_body_size
+        if limit is not None and size > limit:
+            raise BodyLengthError(f"Body exceeds {limit} bytes")
+
+    def _take(self, size: int) -> bytes:
+        start = self._start
+        end = min(start + size, len(self._buffer))
+        self._start = self._scan = end
+        return bytes(self._view[start:end])
+
+    def _compact(self) -> None:
+        buffer = self._buffer
+        start = self._start
+        if start == len(buffer):
+            buffer.clear()
+        elif start > len(buffer) // 2:
+            del buffer[:start]
+        else:
+            return
+        self._scan -= start
+        self._start = 0
+
+    def _body_size(self) -> int:
+        if self._raw:
+            return min(self._body_remaining, self._max_body_chunk)
+        return self._body_remaining
+
+    def _emit_body(self, body: bytes, lines: List[Line]) -> None:
+        if self._raw:
+            lines.append(Line(body, BODY))
+        else:
+            lines.extend(BufferedParser.body_lines(body))
 
     @staticmethod
-    def incomplete_actually_complete(line: bytes) -> bool:
-        return line.endswith(CR + NL)
+    def body_lines(body: bytes) -> List[Line]:
+        return [Line(b, BODY) for b in body.splitlines(True)]
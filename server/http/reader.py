@@ -1,53 +1,203 @@
 from server.http import parser
+from server.http.error import HttpBaseError
 
 import asyncio
 from collections import deque
 from typing import List, Optional
 
 
+class BufferBudgetError(HttpBaseError):
+    pass
+
+
+class ReadTimeoutError(HttpBaseError):
+    pass
+
+
+class BufferBudget(object):
+    """
+    Bytes held by all the readers of one server, which together
+    may not exceed `limit`. Each reader charges what it holds
+    after every receive and releases it when done.
+    """
+
+    __slots__ = (
+        "_limit",
+        "_used",
+    )
+
+    def __init__(self, limit: int) -> None:
+        self._limit: int = limit
+        self._used: int = 0
+
+    @property
+    def used(self) -> int:
+        return self._used
+
+    def charge(self, before: int, after: int) -> None:
+        self._used += after - before
+        if after > before and self._used > self._limit:
+            raise BufferBudgetError(
+                f"Buffered bytes exceed {self._limit}"
+            )
+
+
 class BufferedLineReader(object):
+    """
+    Reads a stream as the lines of one message after another.
+    Given a `timeout`, every read waits at most that long for
+    data, so a client going quiet halfway through a message
+    does not hold the connection forever.
+    """
+
     __slots__ = (
         "_reader",
+        "_timeout",
         "_buff_size",
         "_max_header_size",
         "_max_body_chunk",
         "_lines",
-        "_end_of_stream",
+        "_closed",
         "_parser",
+        "_budget",
+        "_charged",
+        "_received",
     )
 
     def __init__(
         self,
         reader: asyncio.StreamReader,
         buff_size: int = 1_024,
-        max_header_size: int = 1_024,
+        max_header_size: int = parser.MAX_HEADER_SIZE,
         max_body_chunk: int = 102_400,
+        body_mode: parser.BodyMode = parser.BodyMode.Raw,
+        max_body_size: Optional[int] = None,
+        budget: Optional[BufferBudget] = None,
+        timeout: Optional[float] = None,
     ) -> None:
         self._reader: asyncio.StreamReader = reader
+        self._timeout: Optional[float] = timeout
         self._buff_size: int = buff_size
         self._max_header_size: int = max_header_size
         self._max_body_chunk: int = max_body_chunk
         self._lines: deque[Optional[parser.Line]] = deque()
-        self._end_of_stream: bool = False
+        self._closed: bool = False
         self._parser: parser.BufferedParser = parser.BufferedParser(
             max_header_size=max_header_size,
             max_body_chunk=max_body_chunk,
+            body_mode=body_mode,
+            max_body_size=max_body_size,
         )
+        self._budget: Optional[BufferBudget] = budget
+        self._charged: int = 0
+        self._received: int = 0
 
-    async def lines(self):
-        while not self._end_of_stream:
-            if not self._lines:
-                lines = None
-                while not lines:
-                    data = await self._recv()
-                    lines = self._parser.maybe_get_lines(data)
-                self._lines.extend(lines)
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    @property
+    def received(self) -> int:
+        """Bytes read from the stream so far."""
+        return self._received
+
+    @property
+    def exhausted(self) -> bool:
+        """Whether every line of the current message was read."""
+        return self._closed or (
+            self._parser.complete and not self._lines
+        )
+
+    @property
+    def head_read(self) -> bool:
+        """
+        Whether every start line and header line of the current
+        message was read, so that only its body is left.
+        """
+        if self._lines:
+            return self._lines[0].type is parser.BODY
+        return self._closed or not self._parser.in_head
 
+    @property
+    def pending(self) -> bool:
+        """
+        Whether lines are already buffered, i.e. the client has
+        pipelined its next message.
+        """
+        return bool(self._lines)
+
+    async def lines(self):
+        """
+        Yield the lines of the current message, stopping at its
+        boundary even if more data has already been received.
+        The connection closing before the message is complete
+        raises a `FramingError`, unless none of it was received.
+        """
+        while True:
             while self._lines:
                 yield self._lines.popleft()
+            if self._parser.complete:
+                return
+
+            lines = []
+            while not lines and not self._parser.complete:
+                data = await self._recv()
+                if self._closed:
+                    if self._parser.started:
+                        # not the end of the message, which must
+                        # not pass for one
+                        raise parser.FramingError(
+                            "Connection closed mid-message"
+                        )
+                    return
+                lines = self._parser.maybe_get_lines(data)
+                if self._budget:
+                    self._charge(lines)
+            self._lines.extend(lines)
+
+    def reset(self) -> None:
+        """
+        Prepare for the next message on the same connection.
+        Lines of the previous message that were never consumed
+        are dropped, while bytes already received for the next
+        one (e.g. a pipelined request) are parsed straight away.
+        """
+        self._lines.clear()
+        self._parser.reset()
+        self._lines.extend(self._parser.maybe_get_lines(b""))
+        if self._budget:
+            self._charge(self._lines)
+
+    def release(self) -> None:
+        """Return whatever is charged to the budget."""
+        if self._budget:
+            self._budget.charge(self._charged, 0)
+            self._charged = 0
+
+    def _charge(self, lines: List[parser.Line]) -> None:
+        # lines are only received once the previous ones have
+        # been consumed, so this is all the reader holds
+        held = self._parser.buffered
+        for line in lines:
+            held += len(line.data)
+        before, self._charged = self._charged, held
+        self._budget.charge(before, held)
 
     async def _recv(self):
-        buffer = await self._reader.read(self._buff_size)
-        if len(buffer) < self._buff_size:
-            self._end_of_stream = True
+        # a large body can be read in one go rather than in many
+        # `buff_size` reads, since the parser knows its length
+        size = min(self._parser.expected, self._max_body_chunk)
+        read = self._reader.read(max(size, self._buff_size))
+        if self._timeout is None:
+            buffer = await read
+        else:
+            try:
+                buffer = await asyncio.wait_for(read, self._timeout)
+            except asyncio.TimeoutError:
+                raise ReadTimeoutError(
+                    f"Nothing received for {self._timeout}s"
+                ) from None
+        self._received += len(buffer)
+        if not buffer:
+            self._closed = True
         return buffer
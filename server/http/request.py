@@ -1,14 +1,22 @@
 from server.error import HttpServerError
-from server.http.header import Header
+from server.http.header import Header, HeaderIndex
 from server.http.method import Method
 from server.http.protocol import Protocol
-from server.http.parser import MessageState
+from server.http.parser import BodyMode, Line, MessageState
 from server.http.reader import BufferedLineReader
 
 import asyncio
 import logging
 from collections import deque
-from typing import AsyncGenerator, List, NamedTuple, Optional
+from typing import (
+    AsyncGenerator,
+    Callable,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
 
 
 LOGGER = logging.getLogger("http_parser")
@@ -22,11 +30,28 @@ class BacktrackError(HttpServerError):
     pass
 
 
+class ConnectionClosedError(HttpServerError):
+    pass
+
+
 class LazyRequest(object):
     """
     Request object that only reads from a TCP stream when
     required. For example, if no headers are interrogated,
     then parsing will stop at the Start Line.
+
+    Passing an existing `BufferedLineReader` lets several
+    requests on one persistent connection share its state.
+
+    `headers` streams the header block once; `header` reads all
+    of it into an index instead, which can be queried any number
+    of times. Either way every header line ends up in the index.
+
+    Given a `clock`, the request notes when its start line was
+    received and parsed and when its head was read in full.
+
+    `reset` turns a request that has been served into the next
+    one on its connection, so that one object serves them all.
     """
 
     method: Method
@@ -34,11 +59,15 @@ class LazyRequest(object):
     protocol: Protocol
     headers: AsyncGenerator[Header, None]
     body: AsyncGenerator[bytes, None]
+    # path parameters filled in by `server.router.Router`
+    params: Dict[str, bytes]
 
     __slots__ = (
         "_reader",
         "_buff_size",
+        "_body_mode",
         "_state",
+        "_line_reader",
         "_lines",
         "_exhausted",
         "_method",
@@ -46,18 +75,30 @@ class LazyRequest(object):
         "_protocol",
         "_headers",
         "_body",
+        "_header_index",
+        "_index_shared",
+        "_clock",
+        "_received_at",
+        "_parsed_at",
+        "_head_at",
+        "params",
     )
 
     def __init__(
         self,
         reader: asyncio.StreamReader,
         buff_size: int = 1024,
+        lines: Optional[BufferedLineReader] = None,
+        body_mode: BodyMode = BodyMode.Raw,
+        clock: Optional[Callable[[], float]] = None,
     ) -> None:
         self._reader: asyncio.StreamReader = reader
         self._buff_size: int = buff_size
+        self._body_mode: BodyMode = body_mode
 
         self._state: MessageState = MessageState.StartLine
-        self._lines: BufferedLineReader = None
+        self._line_reader: Optional[BufferedLineReader] = lines
+        self._lines: AsyncGenerator[Line, None] = None
         self._exhausted: bool = False
 
         self._method: Method = None
@@ -65,6 +106,14 @@ class LazyRequest(object):
         self._protocol: Protocol = None
         self._headers: deque[Optional[Header]] = deque()
         self._body: deque[Optional[bytes]] = deque()
+        self._header_index: HeaderIndex = HeaderIndex()
+        # handed out by `buffered`, so not to be cleared
+        self._index_shared: bool = False
+        self._clock: Optional[Callable[[], float]] = clock
+        self._received_at: Optional[float] = None
+        self._parsed_at: Optional[float] = None
+        self._head_at: Optional[float] = None
+        self.params: Dict[str, bytes] = {}
 
     @property
     async def method(self) -> Method:
@@ -94,17 +143,135 @@ class LazyRequest(object):
         async for chunk in self._handle_body():
             yield chunk
 
+    @property
+    def keep_alive(self) -> bool:
+        """
+        Whether the client wants the connection to persist. Only
+        reliable once the headers have been consumed, e.g. after
+        `finish`.
+        """
+        return keep_alive(self._protocol, self._header_index)
+
+    async def header(
+        self, name: bytes, default: Optional[bytes] = None
+    ) -> Optional[bytes]:
+        """
+        Value of the first header called `name`, compared
+        case-insensitively, reading the rest of the header block
+        if needed.
+        """
+        await self._index_headers()
+        return self._header_index.get(name, default)
+
+    async def header_values(self, name: bytes) -> List[bytes]:
+        await self._index_headers()
+        return self._header_index.getall(name)
+
+    async def header_items(self) -> List[Tuple[bytes, bytes]]:
+        await self._index_headers()
+        return self._header_index.items()
+
+    @property
+    def received_at(self) -> Optional[float]:
+        return self._received_at
+
+    @property
+    def parsed_at(self) -> Optional[float]:
+        return self._parsed_at
+
+    @property
+    def head_at(self) -> Optional[float]:
+        return self._head_at
+
+    @property
+    def body_complete(self) -> bool:
+        """
+        Whether the body has been handed out in full, so that
+        reading on would yield nothing.
+        """
+        return (
+            self._state == MessageState.Body
+            and not self._body
+            and self._line_reader.exhausted
+        )
+
+    async def buffered(self) -> "BufferedRequest":
+        """
+        Read whatever is left of the request into a
+        `BufferedRequest`, which code that cannot await, such as
+        a handler running on another thread, can use freely.
+        """
+        method = await self.method
+        await self._index_headers()
+        chunks = [chunk async for chunk in self._handle_body()]
+        self._index_shared = True
+        return BufferedRequest(
+            method=method,
+            path=self._path,
+            protocol=self._protocol,
+            headers=self._header_index,
+            body=b"".join(chunks),
+            params=self.params,
+        )
+
+    async def finish(self) -> None:
+        """
+        Consume whatever the handler left unread so that the
+        stream is positioned at the start of the next message.
+        """
+        # headers no one asked for only go into the index
+        await self._index_headers()
+        async for _ in self._handle_body():
+            pass
+
+    def reset(self) -> None:
+        """
+        Start over as the next request on the same connection,
+        keeping the containers of this one. Whatever was handed
+        out for this request, such as its body generator, must
+        be done with, except for a `BufferedRequest`, which keeps
+        its headers; the line reader is reset on its own.
+        """
+        self._state = MessageState.StartLine
+        self._lines = None
+        self._exhausted = False
+        self._method = None
+        self._path = None
+        self._protocol = None
+        self._headers.clear()
+        self._body.clear()
+        if self._index_shared:
+            self._header_index = HeaderIndex()
+            self._index_shared = False
+        else:
+            self._header_index.clear()
+        if self.params:
+            # routers hand each request a dict of its own
+            self.params = {}
+        self._received_at = None
+        self._parsed_at = None
+        self._head_at = None
+
     async def _handle_start_line(self):
         if not self._lines:
             await self._initialize_lines()
 
         match self._state:
             case MessageState.StartLine:
-                line = await anext(self._lines)
+                try:
+                    line = await anext(self._lines)
+                except StopAsyncIteration:
+                    raise ConnectionClosedError(
+                        "Connection closed before start line"
+                    )
+                if self._clock:
+                    self._received_at = self._clock()
                 method, path, protocol = parse_start_line(line.data)
                 self._method = method
                 self._path = path
                 self._protocol = protocol
+                if self._clock:
+                    self._parsed_at = self._clock()
 
                 self._state = MessageState.Header
 
@@ -140,8 +307,35 @@ class LazyRequest(object):
                 self._body.append(line.data)
                 break
             header = parse_header(line.data)
+            self._header_index.add(line.data)
             yield header
+        self._head_read()
+
+    async def _index_headers(self):
+        if self._state == MessageState.Body:
+            return
+        if self._state == MessageState.StartLine:
+            await self._handle_start_line()
+
+        # stop at the end of the head rather than at the first
+        # body line, so that no body is read before it is wanted
+        while not self._line_reader.head_read:
+            line = await anext(self._lines, None)
+            if line is None:
+                break
+            try:
+                self._header_index.add(line.data)
+            except ValueError as e:
+                msg = "Improperly formatted HTTP header"
+                LOGGER.error(msg)
+                LOGGER.debug(e)
+                raise RequestParseError(msg)
+        self._head_read()
+
+    def _head_read(self) -> None:
         self._state = MessageState.Body
+        if self._clock:
+            self._head_at = self._clock()
 
     async def _handle_body(self):
         if not self._lines:
@@ -177,10 +371,153 @@ class LazyRequest(object):
                     yield line.data
 
     async def _initialize_lines(self):
-        self._lines = BufferedLineReader(
-            reader=self._reader,
-            buff_size=self._buff_size,
-        ).lines()
+        if not self._line_reader:
+            self._line_reader = BufferedLineReader(
+                reader=self._reader,
+                buff_size=self._buff_size,
+                body_mode=self._body_mode,
+            )
+        self._lines = self._line_reader.lines()
+
+
+class ParsedRequest(object):
+    """
+    A request whose every line has already been received, e.g.
+    by `server.protocol.HttpProtocol`, behind the interface of
+    `LazyRequest` so that the same handlers can serve it. Nothing
+    is awaited for real, and the start line and headers are
+    parsed up front.
+    """
+
+    __slots__ = (
+        "_method",
+        "_path",
+        "_protocol",
+        "_header_index",
+        "_body",
+        "params",
+        "received_at",
+        "parsed_at",
+        "head_at",
+    )
+
+    def __init__(
+        self,
+        start_line: bytes,
+        header_lines: List[bytes],
+        body: List[bytes],
+    ) -> None:
+        method, path, protocol = parse_start_line(start_line)
+        self._method: Method = method
+        self._path: bytes = path
+        self._protocol: Protocol = protocol
+        self._header_index: HeaderIndex = HeaderIndex()
+        for line in header_lines:
+            try:
+                self._header_index.add(line)
+            except ValueError as e:
+                msg = "Improperly formatted HTTP header"
+                LOGGER.error(msg)
+                LOGGER.debug(e)
+                raise RequestParseError(msg)
+        self._body: deque[bytes] = deque(body)
+        self.params: Dict[str, bytes] = {}
+        # not timed
+        self.received_at: Optional[float] = None
+        self.parsed_at: Optional[float] = None
+        self.head_at: Optional[float] = None
+
+    @property
+    async def method(self) -> Method:
+        return self._method
+
+    @property
+    async def path(self) -> bytes:
+        return self._path
+
+    @property
+    async def protocol(self) -> Protocol:
+        return self._protocol
+
+    @property
+    async def headers(self) -> AsyncGenerator[Header, None]:
+        for name, value in self._header_index.items():
+            yield Header(name.upper(), value)
+
+    @property
+    async def body(self) -> AsyncGenerator[bytes, None]:
+        while self._body:
+            yield self._body.popleft()
+
+    @property
+    def keep_alive(self) -> bool:
+        return keep_alive(self._protocol, self._header_index)
+
+    @property
+    def body_complete(self) -> bool:
+        return not self._body
+
+    async def header(
+        self, name: bytes, default: Optional[bytes] = None
+    ) -> Optional[bytes]:
+        return self._header_index.get(name, default)
+
+    async def header_values(self, name: bytes) -> List[bytes]:
+        return self._header_index.getall(name)
+
+    async def header_items(self) -> List[Tuple[bytes, bytes]]:
+        return self._header_index.items()
+
+    async def buffered(self) -> "BufferedRequest":
+        body = b"".join(self._body)
+        self._body.clear()
+        return BufferedRequest(
+            method=self._method,
+            path=self._path,
+            protocol=self._protocol,
+            headers=self._header_index,
+            body=body,
+            params=self.params,
+        )
+
+    async def finish(self) -> None:
+        self._body.clear()
+
+
+class BufferedRequest(object):
+    """
+    A request that has been read in full.
+    """
+
+    __slots__ = (
+        "method",
+        "path",
+        "protocol",
+        "headers",
+        "body",
+        "params",
+    )
+
+    def __init__(
+        self,
+        method: Method,
+        path: bytes,
+        protocol: Protocol,
+        headers: HeaderIndex,
+        body: bytes,
+        params: Dict[str, bytes],
+    ) -> None:
+        self.method: Method = method
+        self.path: bytes = path
+        self.protocol: Protocol = protocol
+        self.headers: HeaderIndex = headers
+        self.body: bytes = body
+        self.params: Dict[str, bytes] = params
+
+    def header(
+        self, name: bytes, default: Optional[bytes] = None
+    ) -> Optional[bytes]:
+        return self.headers.get(name, default)
 
 
 class StartLine(NamedTuple):
@@ -189,6 +526,15 @@ class StartLine(NamedTuple):
     protocol: Protocol
 
 
+def keep_alive(protocol: Protocol, headers: HeaderIndex) -> bool:
+    """Whether the client wants the connection to persist."""
+    connection = headers.get(b"connection", b"")
+    tokens = {t.strip() for t in connection.lower().split(b",")}
+    if protocol == Protocol.HTTP1_1:
+        return b"close" not in tokens
+    return b"keep-alive" in tokens
+
+
 def parse_start_line(line: bytes) -> StartLine:
     try:
         method, path, protocol = line.split()
@@ -228,8 +574,9 @@ def parse_method(method: bytes) -> Method:
 
 def parse_header(line: bytes) -> Header:
     try:
-        name, *value = line.split(b":")
-        value = b"".join(value)
+        name, sep, value = line.partition(b":")
+        if not sep:
+            raise ValueError(f"No colon in header line {line}")
 
         name = name.strip().upper()
         value = value.strip()
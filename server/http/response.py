@@ -3,8 +3,29 @@ from server.http.header import Header
 from server.http.protocol import Protocol
 from server.http.status import Status, STATUS_MESSAGE
 
-from dataclasses import dataclass
-from typing import List, Optional
+from dataclasses import dataclass, replace
+from typing import AsyncIterable, Dict, List, Optional, Tuple
+
+
+CRLF = b"\r\n"
+
+# a Content-Length is added to every response that may have a
+# body, unless its headers already frame it
+NO_BODY_STATUSES = frozenset(
+    (100, 101, 102, 103, 204, 304),
+)
+FRAMING_HEADERS = frozenset(
+    (b"content-length", b"transfer-encoding"),
+)
+
+STATUS_LINES: Dict[Tuple[Protocol, Status], bytes] = {
+    (protocol, status): (
+        f"{protocol.value} {status.value} "
+        f"{STATUS_MESSAGE[status.value]}"
+    ).encode()
+    for protocol in Protocol
+    for status in Status
+}
 
 
 class ResponseParseError(HttpServerError):
@@ -29,40 +50,149 @@ class Response:
             raise ResponseParseError(e)
 
 
+@dataclass(eq=True, frozen=True)
+class FileResponse(Response):
+    """
+    Response whose body is `count` bytes of the file at `path`
+    from `offset` on, sent by the kernel rather than read into
+    memory.
+    """
+
+    path: Optional[str] = None
+    offset: int = 0
+    count: int = 0
+
+
+@dataclass(eq=True, frozen=True)
+class StreamingResponse(Response):
+    """
+    Response whose body is produced a piece at a time by `stream`
+    while it is being sent. With a known `length` it is framed
+    by Content-Length, otherwise by chunked Transfer-Encoding,
+    or for HTTP/1.0 by closing the connection.
+    """
+
+    stream: Optional[AsyncIterable[bytes]] = None
+    length: Optional[int] = None
+
+
+def with_headers(response: Response, *headers: Header) -> Response:
+    existing = response.headers or []
+    return replace(response, headers=[*existing, *headers])
+
+
+# bytes of the responses registered with `prerender`, keyed by
+# id() and holding on to the response so that the id stays valid
+_PRERENDERED: Dict[int, Tuple[Response, bytes]] = {}
+
+
+def prerender(response: Response) -> Response:
+    """
+    Render a fixed response once, e.g. at startup, so that
+    `to_bytes` returns the same bytes for it at no cost. The
+    response is kept alive for the life of the process.
+    """
+    _PRERENDERED[id(response)] = (response, render(response))
+    return response
+
+
+def is_prerendered(response: Response) -> bool:
+    return id(response) in _PRERENDERED
+
+
 def to_bytes(response: Response) -> bytes:
-    msg = []
-    status_line = make_status_line(response)
-    headers = make_headers(response)
+    prerendered = _PRERENDERED.get(id(response))
+    if prerendered:
+        return prerendered[1]
+    return render(response)
+
+
+def to_buffers(response: Response) -> List[bytes]:
+    """
+    The response as a head and, if there is one, the body as
+    separate buffers, so that the body never has to be copied
+    to be put behind the head.
+    """
+    prerendered = _PRERENDERED.get(id(response))
+    if prerendered:
+        return [prerendered[1]]
+
+    head = make_head(response)
     body = make_body(response)
+    if body:
+        return [head, body]
+    return [head]
 
-    msg.append(status_line)
-
-    if headers:
-        msg.append(headers)
 
+def render(response: Response) -> bytes:
+    head = make_head(response)
+    body = make_body(response)
     if body:
-        msg.append(b"\n" + body)
+        return head + body
+    return head
 
-    response_text = b"\n".join(msg)
-    return response_text
+
+def make_head(response: Response) -> bytes:
+    head = [make_status_line(response)]
+    headers = make_headers(response)
+    if headers:
+        head.append(headers)
+    head.append(CRLF)
+    return CRLF.join(head)
 
 
 def make_status_line(response: Response) -> bytes:
-    protocol = response.protocol.value
-    status = response.status.value
-    status_message = STATUS_MESSAGE[status]
-    status_line = f"{protocol} {status} {status_message}".encode()
-    return status_line
-
-
-def make_headers(response: Response) -> bytes:
-    if response.headers:
-        headers = "\n".join(
-            f"{h.name}: {h.value}" for h in response.headers
-        ).encode()
-        return headers
+    return STATUS_LINES[response.protocol, response.status]
+
+
+def make_headers(response: Response) -> Optional[bytes]:
+    headers = [
+        _to_bytes(h.name) + b": " + _to_bytes(h.value)
+        for h in response.headers or ()
+    ]
+    if needs_content_length(response):
+        length = body_length(response)
+        if is_chunked(response):
+            headers.append(b"Transfer-Encoding: chunked")
+        elif length is not None:
+            headers.append(b"Content-Length: %d" % length)
+
+    if headers:
+        return CRLF.join(headers)
     return None
 
 
-def make_body(response: Response) -> bytes:
+def make_body(response: Response) -> Optional[bytes]:
     return response.body
+
+
+def body_length(response: Response) -> Optional[int]:
+    if isinstance(response, FileResponse):
+        return response.count
+    if isinstance(response, StreamingResponse):
+        return response.length
+    return len(response.body or b"")
+
+
+def is_chunked(response: Response) -> bool:
+    return (
+        isinstance(response, StreamingResponse)
+        and response.length is None
+        and response.protocol == Protocol.HTTP1_1
+        and response.status.value not in NO_BODY_STATUSES
+    )
+
+
+def needs_content_length(response: Response) -> bool:
+    if response.status.value in NO_BODY_STATUSES:
+        return False
+    for header in response.headers or ():
+        if _to_bytes(header.name).lower() in FRAMING_HEADERS:
+            return False
+    return True
+
+
+def _to_bytes(value) -> bytes:
+    if isinstance(value, bytes):
+        return value
+    return str(value).encode()
@@ -0,0 +1,288 @@
+from server import server
+from server.http.header import Header
+from server.http.protocol import Protocol
+from server.http.response import Response
+from server.http.status import Status
+
+import asyncio
+import time
+from bisect import bisect_left
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+# upper bounds in seconds, the same for every phase so that
+# phases can be compared bucket by bucket
+BUCKETS = (
+    0.000_025,
+    0.000_05,
+    0.000_1,
+    0.000_25,
+    0.000_5,
+    0.001,
+    0.002_5,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+)
+
+# wait: from the connection being accepted, or the previous
+#   response being written, to the start line arriving
+# start_line: parsing the start line
+# headers: from the start line to the end of the head; overlaps
+#   with handler when the handler reads the headers
+# handler: the handler, from being called to returning
+# write: from the handler returning to the response being sent
+# request: from the start line arriving to the response being
+#   sent, i.e. the latency the client sees
+PHASES = (
+    "wait",
+    "start_line",
+    "headers",
+    "handler",
+    "write",
+    "request",
+)
+
+CONTENT_TYPE = Header("Content-Type", "text/plain; version=0.0.4")
+
+
+class Histogram(object):
+    """
+    Counts of observations falling into fixed `buckets`, kept
+    per bucket and summed up only when rendered.
+    """
+
+    __slots__ = (
+        "_buckets",
+        "_counts",
+        "_sum",
+    )
+
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS) -> None:
+        self._buckets: Tuple[float, ...] = buckets
+        # the last one counts whatever is above every bucket
+        self._counts: List[int] = [0] * (len(buckets) + 1)
+        self._sum: float = 0.0
+
+    @property
+    def count(self) -> int:
+        return sum(self._counts)
+
+    @property
+    def sum(self) -> float:
+        return self._sum
+
+    def observe(self, value: float) -> None:
+        self._counts[bisect_left(self._buckets, value)] += 1
+        self._sum += value
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """Prometheus `le` labels and the counts up to them."""
+        total = 0
+        counts = []
+        for bound, count in zip(self._buckets, self._counts):
+            total += count
+            counts.append((f"{bound:g}", total))
+        counts.append(("+Inf", total + self._counts[-1]))
+        return counts
+
+
+class Metrics(object):
+    """
+    Counters and per-phase latency histograms of one server
+    process, rendered in the Prometheus text format.
+
+    `clock` is what requests are timed with; it is only called
+    when a `Metrics` is passed to `http_client_handler`.
+
+        metrics = Metrics()
+        client_handler = partial(
+            server.http_client_handler,
+            handler=metrics.expose(handler),
+            metrics=metrics,
+        )
+    """
+
+    __slots__ = (
+        "clock",
+        "phases",
+        "requests",
+        "responses",
+        "bytes_received",
+        "bytes_sent",
+        "connections",
+        "open_connections",
+        "parse_errors",
+    )
+
+    def __init__(
+        self,
+        clock: Callable[[], float] = time.perf_counter,
+        buckets: Tuple[float, ...] = BUCKETS,
+    ) -> None:
+        self.clock: Callable[[], float] = clock
+        self.phases: Dict[str, Histogram] = {
+            phase: Histogram(buckets) for phase in PHASES
+        }
+        self.requests: int = 0
+        # by status code
+        self.responses: Dict[int, int] = {}
+        self.bytes_received: int = 0
+        self.bytes_sent: int = 0
+        self.connections: int = 0
+        self.open_connections: int = 0
+        self.parse_errors: int = 0
+
+    def connection_made(self) -> None:
+        self.connections += 1
+        self.open_connections += 1
+
+    def connection_lost(self) -> None:
+        self.open_connections -= 1
+
+    def responded(self, status: Status, sent: int) -> None:
+        code = status.value
+        self.responses[code] = self.responses.get(code, 0) + 1
+        self.bytes_sent += sent
+
+    def request_done(
+        self,
+        req,
+        began: float,
+        called: float,
+        returned: float,
+        done: float,
+    ) -> None:
+        """
+        Record the phases of one request from the times it
+        `began` to be waited for, its handler was `called` and
+        `returned`, and it was `done` with.
+        """
+        phases = self.phases
+        received = req.received_at
+        parsed = req.parsed_at
+        phases["wait"].observe(received - began)
+        phases["start_line"].observe(parsed - received)
+        if req.head_at is not None:
+            phases["headers"].observe(req.head_at - parsed)
+        phases["handler"].observe(returned - called)
+        phases["write"].observe(done - returned)
+        phases["request"].observe(done - received)
+        self.requests += 1
+
+    def render(self) -> bytes:
+        lines = [
+            *counter(
+                "http_requests_total",
+                "Requests served.",
+                [("", self.requests)],
+            ),
+            *counter(
+                "http_responses_total",
+                "Responses sent, by status code.",
+                [
+                    (f'code="{code}"', count)
+                    for code, count in sorted(self.responses.items())
+                ],
+            ),
+            *counter(
+                "http_received_bytes_total",
+                "Bytes read from clients.",
+                [("", self.bytes_received)],
+            ),
+            *counter(
+                "http_sent_bytes_total",
+                "Bytes of responses sent, without chunk framing.",
+                [("", self.bytes_sent)],
+            ),
+            *counter(
+                "http_connections_total",
+                "Connections accepted.",
+                [("", self.connections)],
+            ),
+            "# HELP http_connections_open Connections open.",
+            "# TYPE http_connections_open gauge",
+            f"http_connections_open {self.open_connections}",
+            *counter(
+                "http_parse_errors_total",
+                "Requests that could not be parsed.",
+                [("", self.parse_errors)],
+            ),
+            "# HELP http_request_phase_seconds Time spent in each "
+            "phase of a request.",
+            "# TYPE http_request_phase_seconds histogram",
+        ]
+        name = "http_request_phase_seconds"
+        for phase, histogram in self.phases.items():
+            label = f'phase="{phase}"'
+            for le, count in histogram.cumulative():
+                lines.append(
+                    f'{name}_bucket{{{label},le="{le}"}} {count}'
+                )
+            lines.append(f"{name}_sum{{{label}}} {histogram.sum}")
+            lines.append(
+                f"{name}_count{{{label}}} {histogram.count}"
+            )
+        lines.append("")
+        return "\n".join(lines).encode()
+
+    def response(self) -> Response:
+        return Response(
+            protocol=Protocol.HTTP1_1,
+            status=Status.OK,
+            headers=[CONTENT_TYPE],
+            body=self.render(),
+        )
+
+    def expose(self, handler: Callable, path: bytes = b"/metrics"):
+        """
+        Wrap a request handler so that GET `path` returns the
+        metrics instead of reaching it.
+        """
+
+        async def metrics_handler(req) -> Response:
+            if await req.path == path:
+                return self.response()
+            return await handler(req)
+
+        return metrics_handler
+
+
+def counter(
+    name: str, description: str, samples: List[Tuple[str, int]]
+) -> List[str]:
+    lines = [
+        f"# HELP {name} {description}",
+        f"# TYPE {name} counter",
+    ]
+    for labels, value in samples:
+        labels = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}{labels} {value}")
+    return lines
+
+
+async def serve_metrics(
+    metrics: Metrics, host: str, port: int
+) -> asyncio.AbstractServer:
+    """
+    Serve the metrics on every path of their own `host`/`port`,
+    e.g. one only reachable from inside the network.
+    """
+
+    async def handler(req) -> Response:
+        await req.path
+        return metrics.response()
+
+    return await asyncio.start_server(
+        partial(server.http_client_handler, handler=handler),
+        host,
+        port,
+    )
@@ -0,0 +1,375 @@
+from server import server
+from server.http import parser, request, response
+from server.http.reader import ReadTimeoutError
+from server.shutdown import Shutdown
+
+import asyncio
+import logging
+from collections import deque
+from typing import Callable, List, Optional
+
+
+LOGGER = logging.getLogger("protocol")
+
+# bytes received at most per read, always into the same buffer
+BUFFER_SIZE = 65_536
+# complete requests waiting for the handler before reading stops
+MAX_PIPELINED = 16
+
+
+class HttpProtocol(asyncio.BufferedProtocol):
+    """
+    Serves requests on one connection like `http_client_handler`,
+    but built on the transport directly instead of on streams.
+
+    Data is received into one preallocated buffer and parsed
+    synchronously as it arrives, and the handler is only called
+    once a request is complete, with a `ParsedRequest`. That does
+    away with the `StreamReader`, the async generators between
+    it and the request and the task `wait_for` starts for every
+    idle timeout, at the cost of holding each request body in
+    memory in full, up to `max_body_size`.
+
+    Connections are not counted by `Metrics`, `Admission` or a
+    `BufferBudget`; use `http_client_handler` for those.
+
+        server.serve(
+            host,
+            port,
+            protocol_factory=partial(HttpProtocol, handler=router),
+        )
+    """
+
+    __slots__ = (
+        "_handler",
+        "_idle_timeout",
+        "_max_requests",
+        "_shutdown",
+        "_write_high",
+        "_write_low",
+        "_loop",
+        "_transport",
+        "_buffer",
+        "_parser",
+        "_start_line",
+        "_head",
+        "_body",
+        "_requests",
+        "_waiter",
+        "_timer",
+        "_received_at",
+        "_drained",
+        "_paused",
+        "_failed",
+        "_eof",
+        "_closed",
+    )
+
+    def __init__(
+        self,
+        handler: Optional[Callable] = None,
+        idle_timeout: float = server.IDLE_TIMEOUT,
+        max_requests: Optional[int] = server.MAX_REQUESTS,
+        max_body_size: Optional[int] = server.MAX_BODY_SIZE,
+        shutdown: Optional[Shutdown] = None,
+        write_high: Optional[int] = None,
+        write_low: Optional[int] = None,
+    ) -> None:
+        self._handler: Callable = (
+            handler or server.hello_world_handler
+        )
+        self._idle_timeout: float = idle_timeout
+        self._max_requests: Optional[int] = max_requests
+        self._shutdown: Optional[Shutdown] = shutdown
+        self._write_high: Optional[int] = write_high
+        self._write_low: Optional[int] = write_low
+        self._loop: asyncio.AbstractEventLoop = None
+        self._transport: asyncio.Transport = None
+        self._buffer: memoryview = memoryview(bytearray(BUFFER_SIZE))
+        self._parser: parser.BufferedParser = parser.BufferedParser(
+            max_body_size=max_body_size
+        )
+        # lines of the request being received
+        self._start_line: bytes = b""
+        self._head: List[bytes] = []
+        self._body: List[bytes] = []
+        # complete requests, or the error that ended reading
+        self._requests: deque = deque()
+        self._waiter: Optional[asyncio.Future] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # when data last arrived, which restarts the idle timeout
+        self._received_at: float = 0.0
+        self._drained: Optional[asyncio.Future] = None
+        self._paused: bool = False
+        self._failed: bool = False
+        self._eof: bool = False
+        self._closed: bool = False
+
+    @property
+    def transport(self) -> asyncio.Transport:
+        return self._transport
+
+    def connection_made(self, transport: asyncio.Transport) -> None:
+        self._transport = transport
+        self._loop = asyncio.get_running_loop()
+        if (
+            self._write_high is not None
+            or self._write_low is not None
+        ):
+            transport.set_write_buffer_limits(
+                self._write_high, self._write_low
+            )
+        if self._shutdown:
+            self._loop.create_task(
+                self._shutdown.serving(self._serve())
+            )
+        else:
+            self._loop.create_task(self._serve())
+
+    def get_buffer(self, sizehint: int) -> memoryview:
+        return self._buffer
+
+    def buffer_updated(self, nbytes: int) -> None:
+        if self._failed:
+            return
+        self._received_at = self._loop.time()
+        try:
+            self._received(self._buffer[:nbytes])
+        except Exception as e:
+            # answered once the requests before it are
+            self._failed = True
+            self._requests.append(e)
+            self._transport.pause_reading()
+        if self._requests:
+            # only then, so that waking up means a request or
+            # the end of the connection
+            self._wake()
+
+    def eof_received(self) -> bool:
+        self._eof = True
+        self._wake()
+        # keep the transport open to answer what was received
+        return True
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        self._closed = True
+        self._wake()
+        drained = self._drained
+        if drained and not drained.done():
+            drained.set_exception(
+                ConnectionResetError("Connection lost")
+            )
+
+    def pause_writing(self) -> None:
+        self._drained = self._loop.create_future()
+
+    def resume_writing(self) -> None:
+        drained = self._drained
+        self._drained = None
+        if drained and not drained.done():
+            drained.set_result(None)
+
+    # the parts of `asyncio.StreamWriter` the writing helpers use
+
+    def write(self, data: bytes) -> None:
+        self._transport.write(data)
+
+    def writelines(self, buffers: List[bytes]) -> None:
+        self._transport.writelines(buffers)
+
+    async def drain(self) -> None:
+        if self._closed:
+            raise ConnectionResetError("Connection lost")
+        if self._drained:
+            await self._drained
+
+    def _received(self, data: memoryview) -> None:
+        p = self._parser
+        lines = p.maybe_get_lines(data)
+        while True:
+            for line in lines:
+                kind = line.type
+                if kind is parser.BODY:
+                    chunk = line.data
+                    if type(chunk) is memoryview:
+                        # sliced straight out of the receive
+                        # buffer, which the next read overwrites
+                        chunk = bytes(chunk)
+                    self._body.append(chunk)
+                elif kind is parser.HEADER:
+                    self._head.append(line.data)
+                else:
+                    self._start_line = line.data
+            if not p.complete:
+                break
+
+            req = request.ParsedRequest(
+                self._start_line, self._head, self._body
+            )
+            self._requests.append(req)
+            self._head = []
+            self._body = []
+            # whatever is left belongs to pipelined requests
+            p.reset()
+            lines = p.maybe_get_lines(b"")
+
+        if len(self._requests) >= MAX_PIPELINED and not self._paused:
+            self._paused = True
+            self._transport.pause_reading()
+
+    def _wake(self) -> None:
+        waiter = self._waiter
+        if waiter and not waiter.done():
+            waiter.set_result(None)
+
+    def _check_idle(self) -> None:
+        # cheaper than a new timer for every read
+        remaining = (
+            self._received_at
+            + self._idle_timeout
+            - self._loop.time()
+        )
+        if remaining > 0:
+            self._timer = self._loop.call_later(
+                remaining, self._check_idle
+            )
+        else:
+            self._wake()
+
+    async def _next_request(self):
+        """
+        The next complete request, or `None` if the connection is
+        over. Going without data for the idle timeout ends the
+        connection, with a 408 if a request was under way.
+        """
+        if not self._requests:
+            if self._closed or self._eof:
+                return None
+            if self._shutdown:
+                self._shutdown.idle()
+            self._waiter = self._loop.create_future()
+            self._timer = self._loop.call_later(
+                self._idle_timeout, self._check_idle
+            )
+            try:
+                await self._waiter
+            except asyncio.CancelledError:
+                if self._shutdown and self._shutdown.draining:
+                    return None
+                raise
+            finally:
+                self._timer.cancel()
+                self._timer = None
+                self._waiter = None
+            if not self._requests:
+                if self._closed or self._eof:
+                    return None
+                if self._parser.started:
+                    raise ReadTimeoutError(
+                        f"Nothing received for {self._idle_timeout}s"
+                    )
+                return None
+            if self._shutdown:
+                self._shutdown.busy()
+
+        req = self._requests.popleft()
+        if self._paused and len(self._requests) < MAX_PIPELINED:
+            self._paused = False
+            self._transport.resume_reading()
+        if isinstance(req, Exception):
+            raise req
+        return req
+
+    async def _serve(self) -> None:
+        transport = self._transport
+        max_requests = self._max_requests
+        shutdown = self._shutdown
+        served = 0
+        pending = server.Batch()
+
+        try:
+            while max_requests is None or served < max_requests:
+                req = await self._next_request()
+                if req is None:
+                    break
+
+                served += 1
+                resp = await self._handler(req)
+                keep_alive = (
+                    req.keep_alive
+                    and (
+                        max_requests is None or served < max_requests
+                    )
+                    and not (shutdown and shutdown.draining)
+                )
+                resp, keep_alive = server.for_connection(
+                    resp, await req.protocol, keep_alive
+                )
+
+                buffers, deferred = await server.response_buffers(
+                    resp, await req.method
+                )
+                pending.add(buffers)
+                if keep_alive and self._requests:
+                    if not (deferred or pending.full):
+                        continue
+
+                pending.write(transport)
+                if deferred:
+                    _, keep_alive = await server.write_body(
+                        self, resp, keep_alive
+                    )
+                await self.drain()
+
+                if not keep_alive:
+                    break
+
+            transport.close()
+
+        except tuple(server.REJECTIONS) as e:
+            LOGGER.warning(e)
+            pending.add(
+                response.to_buffers(server.REJECTIONS[type(e)])
+            )
+            pending.write(transport)
+            await self._linger()
+
+        except ConnectionError:
+            transport.close()
+
+        except asyncio.CancelledError:
+            transport.close()
+            raise
+
+        except Exception as e:
+            pending.add(response.to_buffers(server.failure(e)))
+            pending.write(transport)
+            transport.close()
+
+    async def _linger(self) -> None:
+        """
+        Like `server.linger`: close once the client has had the
+        chance to read the response, discarding what it sends.
+        """
+        transport = self._transport
+        self._failed = True
+        if self._paused:
+            transport.resume_reading()
+        try:
+            if transport.can_write_eof():
+                transport.write_eof()
+        except OSError:
+            # the client is gone already
+            transport.close()
+            return
+        self._waiter = self._loop.create_future()
+        timer = self._loop.call_later(
+            server.LINGER_TIMEOUT, self._wake
+        )
+        try:
+            if not (self._eof or self._closed):
+                await self._waiter
+        finally:
+            timer.cancel()
+            self._waiter = None
+            transport.close()
@@ -0,0 +1,243 @@
+from server.error import HttpServerError
+from server.http.header import Header
+from server.http.method import Method
+from server.http.protocol import Protocol
+from server.http.response import Response, prerender
+from server.http.status import Status
+
+import logging
+from typing import (
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Union,
+)
+
+
+LOGGER = logging.getLogger("router")
+
+SLASH = b"/"
+
+NOT_FOUND = prerender(
+    Response(
+        protocol=Protocol.HTTP1_1,
+        status=Status.NotFound,
+        body=b"Not Found",
+    )
+)
+
+Handler = Callable[..., Awaitable[Response]]
+Params = Dict[str, bytes]
+
+
+class RouterError(HttpServerError):
+    pass
+
+
+class Match(NamedTuple):
+    handlers: Dict[Method, Handler]
+    params: Params
+
+
+class Node(object):
+    """
+    One path segment of the routing tree. Literal segments are
+    looked up in a dict, so a lookup costs one dict access per
+    segment however many routes share the prefix.
+    """
+
+    __slots__ = (
+        "children",
+        "param",
+        "param_name",
+        "catch_all",
+        "catch_all_name",
+        "handlers",
+    )
+
+    def __init__(self) -> None:
+        self.children: Dict[bytes, Node] = {}
+        self.param: Optional[Node] = None
+        self.param_name: Optional[str] = None
+        self.catch_all: Optional[Dict[Method, Handler]] = None
+        self.catch_all_name: Optional[str] = None
+        self.handlers: Dict[Method, Handler] = {}
+
+
+class Router(object):
+    """
+    Dispatches requests to handlers registered by `Method` and
+    path pattern, and is itself a handler for
+    `http_client_handler`.
+
+    Patterns are split on `/` into segments, where `{name}`
+    matches any one non-empty segment and a trailing `{name*}`
+    matches the rest of the path. Literal segments win over
+    parameters, and parameters over catch-alls. Matching works
+    on the raw `bytes` path; parameter values are handed to the
+    handler undecoded as `req.params`.
+
+        router = Router()
+
+        @router.route(Method.GET, "/users/{id}")
+        async def get_user(req):
+            ...
+    """
+
+    __slots__ = ("_root",)
+
+    def __init__(self) -> None:
+        self._root: Node = Node()
+
+    def add(
+        self,
+        method: Method,
+        pattern: Union[str, bytes],
+        handler: Handler,
+    ) -> None:
+        if isinstance(pattern, str):
+            pattern = pattern.encode()
+        if not pattern.startswith(SLASH):
+            raise RouterError(f"Pattern {pattern} must start with /")
+
+        node = self._root
+        segments = pattern.split(SLASH)[1:]
+        for i, segment in enumerate(segments):
+            name = parse_param(segment)
+            if name is None:
+                node = node.children.setdefault(segment, Node())
+
+            elif name.endswith("*"):
+                if i != len(segments) - 1:
+                    raise RouterError(
+                        f"Catch-all must be last in {pattern}"
+                    )
+                name = name[:-1]
+                if node.catch_all is None:
+                    node.catch_all = {}
+                    node.catch_all_name = name
+                elif node.catch_all_name != name:
+                    raise RouterError(
+                        f"Conflicting parameter {name} in {pattern}"
+                    )
+                register(node.catch_all, method, handler, pattern)
+                return
+
+            else:
+                if node.param is None:
+                    node.param = Node()
+                    node.param_name = name
+                elif node.param_name != name:
+                    raise RouterError(
+                        f"Conflicting parameter {name} in {pattern}"
+                    )
+                node = node.param
+
+        register(node.handlers, method, handler, pattern)
+
+    def route(
+        self, method: Method, pattern: Union[str, bytes]
+    ) -> Callable[[Handler], Handler]:
+        def decorator(handler: Handler) -> Handler:
+            self.add(method, pattern, handler)
+            return handler
+
+        return decorator
+
+    def lookup(self, path: bytes) -> Optional[Match]:
+        """
+        Handlers registered for the pattern matching `path`, by
+        method, together with the parameter values. Any query
+        string is ignored.
+        """
+        path, _, _query = path.partition(b"?")
+        if not path.startswith(SLASH):
+            return None
+        segments = path.split(SLASH)[1:]
+        params: Params = {}
+        handlers = match(self._root, segments, 0, params)
+        if handlers is None:
+            return None
+        return Match(handlers, params)
+
+    async def __call__(self, req) -> Response:
+        found = self.lookup(await req.path)
+        if found is None:
+            return NOT_FOUND
+
+        method = await req.method
+        handler = found.handlers.get(method)
+        if handler is None and method == Method.HEAD:
+            handler = found.handlers.get(Method.GET)
+        if handler is None:
+            return method_not_allowed(found.handlers)
+
+        req.params = found.params
+        return await handler(req)
+
+
+def parse_param(segment: bytes) -> Optional[str]:
+    if not (segment.startswith(b"{") and segment.endswith(b"}")):
+        return None
+    name = segment[1:-1].decode()
+    if not name or not name.rstrip("*").isidentifier():
+        raise RouterError(f"Invalid parameter {segment}")
+    return name
+
+
+def register(
+    handlers: Dict[Method, Handler],
+    method: Method,
+    handler: Handler,
+    pattern: bytes,
+) -> None:
+    if method in handlers:
+        raise RouterError(
+            f"{method.name} {pattern} is already registered"
+        )
+    handlers[method] = handler
+
+
+def match(
+    node: Node, segments: List[bytes], i: int, params: Params
+) -> Optional[Dict[Method, Handler]]:
+    if i == len(segments):
+        if node.handlers:
+            return node.handlers
+        if node.catch_all is not None:
+            params[node.catch_all_name] = b""
+            return node.catch_all
+        return None
+
+    segment = segments[i]
+    child = node.children.get(segment)
+    if child is not None:
+        found = match(child, segments, i + 1, params)
+        if found is not None:
+            return found
+
+    if node.param is not None and segment:
+        found = match(node.param, segments, i + 1, params)
+        if found is not None:
+            params[node.param_name] = segment
+            return found
+
+    if node.catch_all is not None:
+        params[node.catch_all_name] = SLASH.join(segments[i:])
+        return node.catch_all
+
+    return None
+
+
+def method_not_allowed(handlers: Dict[Method, Handler]) -> Response:
+    allowed = [m.name for m in Method if m in handlers]
+    if Method.GET in handlers and Method.HEAD not in handlers:
+        allowed.insert(allowed.index("GET") + 1, "HEAD")
+    return Response(
+        protocol=Protocol.HTTP1_1,
+        status=Status.MethodNotAllowed,
+        headers=[Header("Allow", ", ".join(allowed))],
+    )
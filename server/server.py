@@ -1,23 +1,157 @@
-from server import error
+from server import asgi, error
+from server.admission import RETRY_AFTER, AdmissionError
+from server.shutdown import SHUTDOWN_TIMEOUT, Shutdown
 
 import asyncio
 import logging
+import signal
+from dataclasses import replace
+from functools import partial
+from typing import List, Tuple
 
-from server.http import request, response
+from server.http import parser, request, response
+from server.http.header import Header
+from server.http.method import Method
+from server.http.reader import (
+    BufferBudget,
+    BufferBudgetError,
+    BufferedLineReader,
+    ReadTimeoutError,
+)
+from server.writer import (
+    send_file,
+    set_write_limits,
+    write_buffers,
+    write_stream,
+)
 
 
 LOGGER = logging.getLogger("server")
 # LOGGER.setLevel(logging.WARN)
 
+IDLE_TIMEOUT = 5.0
+MAX_REQUESTS = 100
+MAX_BODY_SIZE = 1_048_576
+# asyncio stops reading from a connection once twice this many
+# bytes are waiting in its StreamReader
+READ_LIMIT = 16_384
+# bytes buffered across all connections of one server process
+BUFFER_BUDGET = 64 * 1_048_576
+# connections the kernel queues until they are accepted
+BACKLOG = 100
+# how long a rejected client may go on sending before the
+# connection is closed on it
+LINGER_TIMEOUT = 1.0
+# responses to pipelined requests held back to be written in one
+# go, at most
+MAX_BATCH = 16
+MAX_BATCH_SIZE = 65_536
 
-async def serve(host, port, client_handler=None):
+
+async def serve(
+    host=None,
+    port=None,
+    client_handler=None,
+    sock=None,
+    reuse_port=None,
+    write_high=None,
+    write_low=None,
+    read_limit=READ_LIMIT,
+    app=None,
+    backlog=BACKLOG,
+    shutdown=None,
+    shutdown_timeout=SHUTDOWN_TIMEOUT,
+    protocol_factory=None,
+):
+    """
+    Serve on `host`/`port`, or on an already listening `sock`
+    such as one inherited from a pre-forking parent.
+
+    `write_high`/`write_low` are the watermarks of every
+    connection's write buffer, at which `drain` starts and stops
+    waiting. Reading from a connection pauses while more than
+    twice `read_limit` bytes are left unread, e.g. while its
+    handler is busy. `backlog` also applies to a `sock` passed
+    in, since asyncio listens on it anew.
+
+    An ASGI 3 `app` is served with `http_client_handler`.
+
+    On SIGTERM the server stops accepting connections and drains
+    the open ones within `shutdown_timeout` seconds, see
+    `server.shutdown.Shutdown`, before returning. Pass the same
+    `shutdown` to `http_client_handler` so that connections
+    waiting for a request are closed without waiting.
+
+    A `protocol_factory`, such as `server.protocol.HttpProtocol`,
+    is served on the transports directly instead of on streams;
+    `client_handler`, `app`, the write watermarks and
+    `read_limit` are then left to the protocol, which is also
+    what should be given the `shutdown`.
+    """
+    if shutdown is None:
+        shutdown = Shutdown()
+    if app is not None:
+        client_handler = partial(
+            http_client_handler,
+            handler=asgi.ASGIHandler(app),
+            shutdown=shutdown,
+        )
     if not client_handler:
         client_handler = default_client_handler
+    client_handler = shutdown.track(client_handler)
+    if write_high is not None or write_low is not None:
+        client_handler = with_write_limits(
+            client_handler, write_high, write_low
+        )
 
-    server = await asyncio.start_server(client_handler, host, port)
+    if protocol_factory:
+        server = await asyncio.get_running_loop().create_server(
+            protocol_factory,
+            host,
+            port,
+            sock=sock,
+            reuse_port=reuse_port,
+            backlog=backlog,
+        )
+    elif sock:
+        server = await asyncio.start_server(
+            client_handler,
+            sock=sock,
+            limit=read_limit,
+            backlog=backlog,
+        )
+    else:
+        server = await asyncio.start_server(
+            client_handler,
+            host,
+            port,
+            reuse_port=reuse_port,
+            limit=read_limit,
+            backlog=backlog,
+        )
+
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    try:
+        loop.add_signal_handler(signal.SIGTERM, stop.set)
+    except (ValueError, RuntimeError, NotImplementedError):
+        # not the main thread, or no signals to speak of
+        LOGGER.debug("Not handling SIGTERM")
 
     async with server:
-        await server.serve_forever()
+        await stop.wait()
+        LOGGER.info(f"Draining {shutdown.connections} connections")
+        server.close()
+        await shutdown.drain(shutdown_timeout)
+    loop.remove_signal_handler(signal.SIGTERM)
+
+
+def with_write_limits(client_handler, high, low):
+    async def limited_client_handler(reader, writer):
+        set_write_limits(writer, high, low)
+        await client_handler(reader, writer)
+
+    return limited_client_handler
 
 
 async def default_client_handler(reader, writer, buff_size=1024):
@@ -30,33 +164,463 @@ async def default_client_handler(reader, writer, buff_size=1024):
     writer.close()
 
 
-async def http_client_handler(reader, writer, buff_size=1024):
+HELLO_WORLD = response.prerender(
+    response.Response(
+        protocol=response.Protocol.HTTP1_1,
+        status=response.Status.OK,
+        body=b"Hello, world!",
+    )
+)
+
+
+def error_response(
+    status: response.Status, *headers: Header, body: bytes = b""
+) -> response.Response:
+    return response.prerender(
+        response.Response(
+            protocol=response.Protocol.HTTP1_1,
+            status=status,
+            headers=[Header("Connection", "close"), *headers],
+            body=body,
+        )
+    )
+
+
+# errors counted as parse errors by `Metrics`
+PARSE_ERRORS = (request.RequestParseError, parser.FramingError)
+
+BAD_REQUEST = error_response(
+    response.Status.BadRequest, body=b"Bad Request"
+)
+INTERNAL_SERVER_ERROR = error_response(
+    response.Status.InternalServerError,
+    body=b"Internal Server Error",
+)
+
+# requests rejected before they have been read in full
+REJECTIONS = {
+    parser.HeaderLengthError: error_response(
+        response.Status.RequestHeaderFieldsTooLarge
+    ),
+    parser.BodyLengthError: error_response(
+        response.Status.PayloadTooLarge
+    ),
+    BufferBudgetError: error_response(
+        response.Status.ServiceUnavailable
+    ),
+    ReadTimeoutError: error_response(response.Status.RequestTimeout),
+    AdmissionError: error_response(
+        response.Status.ServiceUnavailable,
+        Header("Retry-After", str(RETRY_AFTER)),
+    ),
+}
+
+
+async def hello_world_handler(req):
+    await req.path
+    return HELLO_WORLD
+
+
+async def http_client_handler(
+    reader,
+    writer,
+    buff_size=1024,
+    handler=None,
+    idle_timeout=IDLE_TIMEOUT,
+    max_requests=MAX_REQUESTS,
+    max_body_size=MAX_BODY_SIZE,
+    budget=None,
+    metrics=None,
+    admission=None,
+    shutdown=None,
+):
+    """
+    Serve requests on one connection until the client asks to
+    close it, goes idle for `idle_timeout` seconds, or has sent
+    `max_requests` requests (`None` for no limit). A client
+    going idle halfway through a request gets a 408.
+
+    A request whose head or body is too large, or that would
+    take the server past its `budget` of buffered bytes, gets
+    a 431, 413 or 503 straight away and the connection is closed
+    without reading the rest of it.
+
+    So is a connection or request refused by `admission`, with
+    a 503 telling the client when to retry.
+
+    Once `shutdown` is draining, the connection is closed after
+    the response in progress, or straight away if it is waiting
+    for a request.
+
+    Given `metrics`, every request is timed phase by phase and
+    counted, see `server.metrics.Metrics`.
+    """
     # addr = writer.get_extra_info("peername")
     # LOGGER.info(f"Client connected: [{addr}]")
 
+    if not handler:
+        handler = hello_world_handler
+
+    # the idle timeout applies to every read, not only while
+    # waiting for the next request
+    lines = BufferedLineReader(
+        reader,
+        128,
+        max_body_size=max_body_size,
+        budget=budget,
+        timeout=idle_timeout,
+    )
+    served = 0
+    pending = Batch()
+    clock = None
+    if metrics:
+        clock = metrics.clock
+        metrics.connection_made()
+        began = clock()
+
+    connected = admitted = False
+
     try:
-        req = request.LazyRequest(reader, 128)
-        await req.path
-        body = b"Hello, world!"
-        resp = response.Response(
-            protocol=response.Protocol.HTTP1_1,
-            status=response.Status.OK,
-            body=body,
+        if admission:
+            admission.admit_connection()
+            connected = True
+
+        # one request object serves every request in turn
+        req = request.LazyRequest(
+            reader, 128, lines=lines, clock=clock
         )
-        resp_msg = response.to_bytes(resp)
-        writer.write(resp_msg)
-        await writer.drain()
+        while max_requests is None or served < max_requests:
+            if admitted:
+                admission.release_request()
+                admitted = False
+            if served:
+                req.reset()
+            if shutdown:
+                shutdown.idle()
+            try:
+                await req.path
+            except (
+                ReadTimeoutError,
+                request.ConnectionClosedError,
+            ):
+                break
+            except asyncio.CancelledError:
+                if shutdown and shutdown.draining:
+                    break
+                raise
+            if shutdown:
+                shutdown.busy()
+
+            served += 1
+            if admission:
+                admission.admit_request()
+                admitted = True
+            if metrics:
+                called = clock()
+            resp = await handler(req)
+            if metrics:
+                returned = clock()
+            # the rest of the head, which `keep_alive` needs; the
+            # body is left to a response stream that may read it
+            await req.header(b"connection")
+
+            keep_alive = (
+                req.keep_alive
+                and (max_requests is None or served < max_requests)
+                and not (shutdown and shutdown.draining)
+            )
+            resp, keep_alive = for_connection(
+                resp, await req.protocol, keep_alive
+            )
+            buffers, deferred = await response_buffers(
+                resp, await req.method
+            )
+            sent = pending.add(buffers)
+            is_stream = deferred and isinstance(
+                resp, response.StreamingResponse
+            )
+            if keep_alive and not is_stream:
+                try:
+                    await req.finish()
+                except ReadTimeoutError as e:
+                    # the response is ready all the same, only the
+                    # connection cannot go on without the body
+                    LOGGER.warning(e)
+                    keep_alive = False
+                else:
+                    lines.reset()
+                    if lines.pending and not (
+                        deferred or pending.full
+                    ):
+                        if metrics:
+                            # it is only written with the next one
+                            began = record(
+                                metrics,
+                                req,
+                                resp,
+                                sent,
+                                began,
+                                called,
+                                returned,
+                            )
+                        continue
+
+            pending.write(writer)
+            if deferred:
+                written, keep_alive = await write_body(
+                    writer, resp, keep_alive
+                )
+                sent += written
+            if is_stream and keep_alive:
+                try:
+                    await req.finish()
+                except Exception as e:
+                    # too late to answer with an error
+                    LOGGER.warning(e)
+                    break
+                lines.reset()
+            await writer.drain()
+            if metrics:
+                began = record(
+                    metrics, req, resp, sent, began, called, returned
+                )
+
+            if not keep_alive:
+                break
+
         writer.close()
         await writer.wait_closed()
 
+    except asyncio.CancelledError:
+        # e.g. still busy when draining ran out of time
+        writer.close()
+        raise
+
+    except ConnectionError:
+        # e.g. reset by a client done with an idle connection,
+        # which browsers and load balancers do routinely
+        writer.close()
+
+    except tuple(REJECTIONS) as e:
+        if isinstance(e, AdmissionError):
+            # routine under overload, when it has to stay cheap
+            LOGGER.debug(e)
+        else:
+            LOGGER.warning(e)
+        rejection = REJECTIONS[type(e)]
+        if metrics:
+            metrics.responded(
+                rejection.status, len(response.to_bytes(rejection))
+            )
+        pending.add(response.to_buffers(rejection))
+        pending.write(writer)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            writer.close()
+        else:
+            await linger(reader, writer)
+
     except Exception as e:
-        body = e.args[0].encode()
-        resp = response.Response(
-            protocol=response.Protocol.HTTP1_1,
-            status=response.Status.NotFound,
-            body=body,
+        resp = failure(e)
+        buffers = response.to_buffers(resp)
+        if metrics:
+            if isinstance(e, PARSE_ERRORS):
+                metrics.parse_errors += 1
+            sent = sum(len(buffer) for buffer in buffers)
+            metrics.responded(resp.status, sent)
+        pending.add(buffers)
+        pending.write(writer)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+
+    finally:
+        lines.release()
+        if admitted:
+            admission.release_request()
+        if connected:
+            admission.release_connection()
+        if metrics:
+            metrics.bytes_received += lines.received
+            metrics.connection_lost()
+
+
+def for_connection(
+    resp: response.Response,
+    protocol: response.Protocol,
+    keep_alive: bool,
+) -> Tuple[response.Response, bool]:
+    """
+    The response with the headers telling a client speaking
+    `protocol` whether the connection persists, and whether it
+    can given the response.
+    """
+    if isinstance(resp, response.StreamingResponse):
+        if (
+            resp.length is None
+            and protocol == response.Protocol.HTTP1_0
+        ):
+            # no chunked encoding, the body ends when the
+            # connection does
+            resp = replace(resp, protocol=response.Protocol.HTTP1_0)
+            keep_alive = False
+
+    if not keep_alive:
+        resp = response.with_headers(
+            resp, Header("Connection", "close")
+        )
+    elif protocol == response.Protocol.HTTP1_0:
+        resp = response.with_headers(
+            resp, Header("Connection", "keep-alive")
+        )
+    return resp, keep_alive
+
+
+async def head_buffers(resp: response.Response) -> List[bytes]:
+    """
+    The buffers answering a HEAD request with `resp`: its head,
+    framing headers included, as a GET would get it, but no
+    body, which the client would take for the next response.
+    """
+    if isinstance(resp, response.StreamingResponse):
+        aclose = getattr(resp.stream, "aclose", None)
+        if aclose:
+            await aclose()
+    return [response.make_head(resp)]
+
+
+async def response_buffers(
+    resp: response.Response, method: Method
+) -> Tuple[List[bytes], bool]:
+    """
+    The buffers of `resp` to a request with `method`, and whether
+    a file or stream body is left to `write_body` after them.
+    """
+    if method is Method.HEAD:
+        return await head_buffers(resp), False
+    return response.to_buffers(resp), isinstance(
+        resp, (response.FileResponse, response.StreamingResponse)
+    )
+
+
+async def write_body(
+    writer, resp: response.Response, keep_alive: bool
+) -> Tuple[int, bool]:
+    """
+    Write the file or stream body of `resp` once its head is out,
+    returning the bytes written and whether the connection can
+    still be kept alive.
+    """
+    if isinstance(resp, response.FileResponse):
+        if resp.count:
+            await send_file(
+                writer, resp.path, resp.offset, resp.count
+            )
+        return resp.count, keep_alive
+    if resp.stream is None:
+        return 0, keep_alive
+
+    try:
+        written = await write_stream(
+            writer,
+            resp.stream,
+            response.is_chunked(resp),
+            resp.length,
         )
-        resp_msg = response.to_bytes(resp)
-        writer.write(resp_msg)
-        await writer.drain()
+    except ConnectionError:
+        raise
+    except Exception:
+        # the head is out, so all that is left is to cut the
+        # response short
+        LOGGER.exception("Response stream failed")
+        return 0, False
+    if resp.length not in (None, written):
+        LOGGER.error(f"Streamed {written} of {resp.length} bytes")
+        return written, False
+    return written, keep_alive
+
+
+class Batch:
+    """
+    The buffers of responses to pipelined requests, held back to
+    be written in one go until there are too many of them.
+    """
+
+    __slots__ = ("_buffers", "_count", "_size")
+
+    def __init__(self) -> None:
+        self._buffers: List[bytes] = []
+        self._count = 0
+        self._size = 0
+
+    @property
+    def full(self) -> bool:
+        return (
+            self._count >= MAX_BATCH or self._size >= MAX_BATCH_SIZE
+        )
+
+    def add(self, buffers: List[bytes]) -> int:
+        """Hold back the buffers of one response, returning its size."""
+        size = sum(len(buffer) for buffer in buffers)
+        self._buffers.extend(buffers)
+        self._count += 1
+        self._size += size
+        return size
+
+    def write(self, writer) -> None:
+        write_buffers(writer, self._buffers)
+        self._buffers = []
+        self._count = self._size = 0
+
+
+def failure(e: Exception) -> response.Response:
+    """
+    What a request that failed with `e` is answered with. The
+    error is logged rather than sent, since it may tell the
+    client more about the server than it should know.
+    """
+    if isinstance(e, PARSE_ERRORS):
+        LOGGER.warning(e)
+        return BAD_REQUEST
+    LOGGER.error("Request failed", exc_info=e)
+    return INTERNAL_SERVER_ERROR
+
+
+async def linger(reader, writer):
+    """
+    Close a connection whose request was not read in full, once
+    the client has had the chance to read the response: closing
+    with unread data makes the kernel reset the connection, which
+    can discard the response before the client sees it.
+    """
+    try:
+        if writer.can_write_eof():
+            writer.write_eof()
+    except OSError:
+        # the client is gone already, with nothing left to read
         writer.close()
+        return
+
+    async def discard():
+        while await reader.read(65_536):
+            pass
+
+    try:
+        await asyncio.wait_for(discard(), LINGER_TIMEOUT)
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    writer.close()
+
+
+def record(metrics, req, resp, sent, began, called, returned):
+    """
+    Count a response of `sent` bytes and time the phases of its
+    request, returning when it was done with.
+    """
+    done = metrics.clock()
+    metrics.request_done(req, began, called, returned, done)
+    metrics.responded(resp.status, sent)
+    return done
@@ -0,0 +1,120 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional, Set
+
+
+LOGGER = logging.getLogger("shutdown")
+
+# seconds open connections get to finish once draining starts
+SHUTDOWN_TIMEOUT = 10.0
+# seconds a connection waiting for a request is kept once
+# draining starts, in case one is already on its way
+IDLE_GRACE = 0.5
+
+
+class Shutdown(object):
+    """
+    The connections of one server, so that they can be drained:
+    each is closed once its current response has been sent, or
+    if it is waiting for a request, once none has come within a
+    short grace period. Closing those right away would cut off
+    requests clients have sent but the server not yet read.
+
+    `track` wraps a client handler to register its connections,
+    and `serving` registers the task of any other connection.
+    `http_client_handler`, when given the same `Shutdown`, also
+    reports when it waits for a request and stops keeping
+    connections alive while draining; connections of other
+    handlers are waited for until the deadline.
+    """
+
+    __slots__ = (
+        "_idle",
+        "_busy",
+        "_draining",
+        "_drained",
+    )
+
+    def __init__(self) -> None:
+        self._idle: Set[asyncio.Task] = set()
+        self._busy: Set[asyncio.Task] = set()
+        self._draining: bool = False
+        self._drained: Optional[asyncio.Event] = None
+
+    @property
+    def draining(self) -> bool:
+        return self._draining
+
+    @property
+    def connections(self) -> int:
+        return len(self._idle) + len(self._busy)
+
+    def track(self, client_handler: Callable):
+        async def tracked_client_handler(reader, writer):
+            await self.serving(client_handler(reader, writer))
+
+        return tracked_client_handler
+
+    async def serving(self, connection: Awaitable) -> None:
+        """Await `connection` as one of the tracked connections."""
+        task = asyncio.current_task()
+        self._busy.add(task)
+        try:
+            await connection
+        finally:
+            self._closed(task)
+
+    def idle(self) -> None:
+        """The current connection waits for its next request."""
+        task = asyncio.current_task()
+        self._busy.discard(task)
+        self._idle.add(task)
+
+    def busy(self) -> None:
+        """The current connection is serving a request."""
+        task = asyncio.current_task()
+        self._idle.discard(task)
+        self._busy.add(task)
+
+    async def drain(
+        self,
+        timeout: float = SHUTDOWN_TIMEOUT,
+        idle_grace: float = IDLE_GRACE,
+    ) -> None:
+        """
+        Close connections as they finish, and wait up to
+        `timeout` seconds for them, cancelling those still open
+        then. Connections still waiting for a request after
+        `idle_grace` seconds are closed at that point.
+        """
+        self._draining = True
+        if not self.connections:
+            return
+
+        self._drained = asyncio.Event()
+        closing = asyncio.get_running_loop().call_later(
+            idle_grace, self._close_idle
+        )
+        try:
+            await asyncio.wait_for(self._drained.wait(), timeout)
+        except asyncio.TimeoutError:
+            tasks = self._idle | self._busy
+            LOGGER.warning(
+                f"Closing {len(tasks)} connections still open "
+                f"after {timeout} s"
+            )
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            closing.cancel()
+
+    def _close_idle(self) -> None:
+        for task in self._idle:
+            task.cancel()
+
+    def _closed(self, task: asyncio.Task) -> None:
+        self._idle.discard(task)
+        self._busy.discard(task)
+        if self._drained and not self.connections:
+            self._drained.set()
@@ -0,0 +1,301 @@
+from server.error import HttpServerError
+from server.http.header import Header
+from server.http.method import Method
+from server.http.protocol import Protocol
+from server.http.response import FileResponse, Response, prerender
+from server.http.status import Status
+
+import email.utils
+import logging
+import mimetypes
+import os
+import stat
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import unquote_to_bytes
+
+
+LOGGER = logging.getLogger("static")
+
+# how long a cached stat result is trusted before the file is
+# looked at again
+REVALIDATE_AFTER = 1.0
+MAX_ENTRIES = 1_024
+
+NOT_FOUND = prerender(
+    Response(
+        protocol=Protocol.HTTP1_1,
+        status=Status.NotFound,
+        body=b"Not Found",
+    )
+)
+METHOD_NOT_ALLOWED = prerender(
+    Response(
+        protocol=Protocol.HTTP1_1,
+        status=Status.MethodNotAllowed,
+        headers=[Header("Allow", "GET, HEAD")],
+    )
+)
+
+
+class StaticFileError(HttpServerError):
+    pass
+
+
+class FileInfo(NamedTuple):
+    path: str
+    size: int
+    mtime: float
+    mtime_ns: int
+    etag: bytes
+    last_modified: str
+    content_type: str
+    checked: float
+
+
+class Conditions(NamedTuple):
+    if_none_match: Optional[bytes] = None
+    if_modified_since: Optional[bytes] = None
+    range: Optional[bytes] = None
+    if_range: Optional[bytes] = None
+
+
+class StaticFiles(object):
+    """
+    Request handler serving the files below `root`. Bodies are
+    sent with `loop.sendfile`, stat results and ETags are cached
+    for `REVALIDATE_AFTER` seconds, conditional requests get a
+    304 and single byte ranges a 206.
+    """
+
+    __slots__ = (
+        "_root",
+        "_index",
+        "_files",
+        "_max_entries",
+    )
+
+    def __init__(
+        self,
+        root: str,
+        index: str = "index.html",
+        max_entries: int = MAX_ENTRIES,
+    ) -> None:
+        root = os.path.realpath(root)
+        if not os.path.isdir(root):
+            raise StaticFileError(f"{root} is not a directory")
+        self._root: str = root
+        self._index: str = index
+        self._files: Dict[bytes, FileInfo] = {}
+        self._max_entries: int = max_entries
+
+    async def __call__(self, req) -> Response:
+        method = await req.method
+        if method not in (Method.GET, Method.HEAD):
+            return METHOD_NOT_ALLOWED
+
+        info = self.lookup(await req.path)
+        if not info:
+            return NOT_FOUND
+
+        conditions = await read_conditions(req)
+        headers = [
+            Header("Content-Type", info.content_type),
+            Header("ETag", info.etag.decode()),
+            Header("Last-Modified", info.last_modified),
+            Header("Accept-Ranges", "bytes"),
+        ]
+
+        if not_modified(info, conditions):
+            return Response(
+                protocol=Protocol.HTTP1_1,
+                status=Status.NotModified,
+                headers=headers,
+            )
+
+        status = Status.OK
+        offset, count = 0, info.size
+        byte_range = requested_range(info, conditions)
+        if byte_range == UNSATISFIABLE:
+            return Response(
+                protocol=Protocol.HTTP1_1,
+                status=Status.RangeNotSatisfiable,
+                headers=[
+                    Header("Content-Range", f"bytes */{info.size}")
+                ],
+            )
+        if byte_range:
+            status = Status.PartialContent
+            offset, count = byte_range
+            last = offset + count - 1
+            headers.append(
+                Header(
+                    "Content-Range",
+                    f"bytes {offset}-{last}/{info.size}",
+                )
+            )
+
+        if method == Method.HEAD:
+            headers.append(Header("Content-Length", str(count)))
+            return Response(
+                protocol=Protocol.HTTP1_1,
+                status=status,
+                headers=headers,
+            )
+
+        return FileResponse(
+            protocol=Protocol.HTTP1_1,
+            status=status,
+            headers=headers,
+            path=info.path,
+            offset=offset,
+            count=count,
+        )
+
+    def lookup(self, path: bytes) -> Optional[FileInfo]:
+        """
+        Cached stat result for a request path, or None if it does
+        not name a regular file below the root.
+        """
+        now = time.monotonic()
+        info = self._files.get(path)
+        if info and now - info.checked < REVALIDATE_AFTER:
+            return info
+
+        full_path = self._resolve(path)
+        if not full_path:
+            self._files.pop(path, None)
+            return None
+        try:
+            st = os.stat(full_path)
+        except (OSError, ValueError):
+            self._files.pop(path, None)
+            return None
+        if not stat.S_ISREG(st.st_mode):
+            return None
+
+        if (
+            info
+            and info.path == full_path
+            and info.mtime_ns == st.st_mtime_ns
+            and info.size == st.st_size
+        ):
+            info = info._replace(checked=now)
+        else:
+            info = make_file_info(full_path, st, now)
+
+        if (
+            path not in self._files
+            and len(self._files) >= self._max_entries
+        ):
+            self._files.pop(next(iter(self._files)))
+        self._files[path] = info
+        return info
+
+    def _resolve(self, path: bytes) -> Optional[str]:
+        path, _, _query = path.partition(b"?")
+        relative = os.fsdecode(unquote_to_bytes(path)).lstrip("/")
+        try:
+            full_path = os.path.realpath(
+                os.path.join(self._root, relative)
+            )
+        except ValueError:
+            # e.g. an embedded null byte, which names no file
+            return None
+        if os.path.commonpath((self._root, full_path)) != self._root:
+            LOGGER.warning(f"Refusing path outside of root: {path}")
+            return None
+        if os.path.isdir(full_path):
+            full_path = os.path.join(full_path, self._index)
+        return full_path
+
+
+def make_file_info(
+    path: str, st: os.stat_result, now: float
+) -> FileInfo:
+    content_type, _ = mimetypes.guess_type(path)
+    return FileInfo(
+        path=path,
+        size=st.st_size,
+        mtime=st.st_mtime,
+        mtime_ns=st.st_mtime_ns,
+        etag=f'"{st.st_mtime_ns:x}-{st.st_size:x}"'.encode(),
+        last_modified=email.utils.formatdate(
+            st.st_mtime, usegmt=True
+        ),
+        content_type=content_type or "application/octet-stream",
+        checked=now,
+    )
+
+
+async def read_conditions(req) -> Conditions:
+    return Conditions(
+        if_none_match=await req.header(b"if-none-match"),
+        if_modified_since=await req.header(b"if-modified-since"),
+        range=await req.header(b"range"),
+        if_range=await req.header(b"if-range"),
+    )
+
+
+def not_modified(info: FileInfo, conditions: Conditions) -> bool:
+    # RFC 7232 6: If-None-Match takes precedence
+    if conditions.if_none_match is not None:
+        tags = conditions.if_none_match.split(b",")
+        matching = {b"*", info.etag, b"W/" + info.etag}
+        return any(t.strip() in matching for t in tags)
+
+    if conditions.if_modified_since is not None:
+        try:
+            since = email.utils.parsedate_to_datetime(
+                conditions.if_modified_since.decode()
+            )
+        except (TypeError, ValueError):
+            return False
+        return int(info.mtime) <= since.timestamp()
+
+    return False
+
+
+UNSATISFIABLE = (-1, -1)
+
+
+def requested_range(
+    info: FileInfo, conditions: Conditions
+) -> Optional[Tuple[int, int]]:
+    """
+    (offset, count) of a single satisfiable byte range, None to
+    send the whole file, or `UNSATISFIABLE`. Multiple ranges
+    are answered with the whole file, which RFC 7233 allows.
+    """
+    if conditions.range is None:
+        return None
+    if (
+        conditions.if_range is not None
+        and conditions.if_range.strip() != info.etag
+    ):
+        return None
+
+    unit, _, ranges = conditions.range.partition(b"=")
+    if unit.strip().lower() != b"bytes" or b"," in ranges:
+        return None
+
+    first, sep, last = ranges.strip().partition(b"-")
+    try:
+        if not sep:
+            return None
+        if not first:
+            suffix = int(last)
+            if suffix <= 0:
+                return UNSATISFIABLE
+            offset = max(info.size - suffix, 0)
+            end = info.size - 1
+        else:
+            offset = int(first)
+            end = int(last) if last else info.size - 1
+    except ValueError:
+        return None
+
+    end = min(end, info.size - 1)
+    if offset >= info.size or end < offset:
+        return UNSATISFIABLE
+    return offset, end - offset + 1
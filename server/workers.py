@@ -0,0 +1,162 @@
+from server.error import HttpServerError
+
+import logging
+import os
+import signal
+import socket
+import time
+from typing import Callable, Dict, Optional, Set
+
+
+LOGGER = logging.getLogger("workers")
+
+# a worker dying sooner than this after being forked is most
+# likely broken, so wait a little before forking it again
+MIN_UPTIME = 1.0
+
+# what the parent handles, and its workers must not
+HANDLED = (signal.SIGTERM, signal.SIGINT, signal.SIGHUP)
+
+
+class WorkerError(HttpServerError):
+    pass
+
+
+def listen(
+    host: str, port: int, backlog: int = 100
+) -> socket.socket:
+    """
+    Create a listening socket in the parent, to be inherited by
+    every forked worker.
+    """
+    sock = socket.create_server((host, port), backlog=backlog)
+    sock.setblocking(False)
+    return sock
+
+
+class Supervisor(object):
+    """
+    Pre-forks `workers` processes that each run `target`, and
+    forks a replacement whenever one of them dies. The parent
+    never runs an event loop itself.
+
+    SIGTERM or SIGINT asks every worker to stop with a SIGTERM.
+    SIGHUP forks a new set of workers and only then asks the old
+    ones to stop, so that with a listening socket inherited from
+    the parent there is always a worker accepting connections
+    while the old ones drain theirs. The new workers are forked
+    from the parent and so run the code it has already loaded.
+    """
+
+    __slots__ = (
+        "_target",
+        "_workers",
+        "_children",
+        "_retiring",
+        "_running",
+    )
+
+    def __init__(
+        self,
+        target: Callable[[], None],
+        workers: int,
+    ) -> None:
+        if workers < 1:
+            raise WorkerError(
+                f"Need at least one worker, got {workers}"
+            )
+        self._target: Callable[[], None] = target
+        self._workers: int = workers
+        self._children: Dict[int, float] = {}
+        # workers replaced by a reload, which are not restarted
+        self._retiring: Set[int] = set()
+        self._running: bool = False
+
+    def run(self) -> None:
+        self._running = True
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        signal.signal(signal.SIGHUP, self._reload)
+
+        for _ in range(self._workers):
+            self._spawn()
+
+        while self._children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            started = self._children.pop(pid, None)
+            if started is None:
+                continue
+
+            code = os.waitstatus_to_exitcode(status)
+            if pid in self._retiring:
+                self._retiring.discard(pid)
+                LOGGER.info(f"Worker {pid} retired ({code})")
+                continue
+            if not self._running:
+                LOGGER.info(f"Worker {pid} exited ({code})")
+                continue
+
+            LOGGER.warning(f"Worker {pid} died ({code}), restarting")
+            if time.monotonic() - started < MIN_UPTIME:
+                time.sleep(MIN_UPTIME)
+            self._spawn()
+
+    def _spawn(self) -> Optional[int]:
+        # a signal handled before the new worker is noted would
+        # leave it out, to run on unstopped or unreplaced
+        signal.pthread_sigmask(signal.SIG_BLOCK, HANDLED)
+        try:
+            pid = os.fork()
+            if pid:
+                self._children[pid] = time.monotonic()
+                LOGGER.info(f"Started worker {pid}")
+                return pid
+
+            # child: the parent handles interrupts for everyone
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        finally:
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, HANDLED)
+        code = 0
+        try:
+            self._target()
+        except BaseException:
+            LOGGER.exception("Worker crashed")
+            code = 1
+        finally:
+            os._exit(code)
+
+    def _stop(self, signum, frame) -> None:
+        if not self._running:
+            return
+        self._running = False
+        LOGGER.info(
+            f"Received {signal.Signals(signum).name}, stopping workers"
+        )
+        for pid in self._children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def _reload(self, signum, frame) -> None:
+        if not self._running:
+            return
+        old = [
+            pid
+            for pid in self._children
+            if pid not in self._retiring
+        ]
+        LOGGER.info(f"Received SIGHUP, replacing {len(old)} workers")
+        for _ in range(self._workers):
+            self._spawn()
+        for pid in old:
+            self._retiring.add(pid)
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
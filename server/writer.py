@@ -0,0 +1,124 @@
+from server.http.error import HttpBaseError
+
+import asyncio
+import sys
+from typing import AsyncIterable, List, Optional
+
+
+# since 3.12 socket transports send a list of buffers with one
+# sendmsg() call; before that writelines() joins them into a copy
+SCATTER_GATHER = sys.version_info >= (3, 12)
+
+# buffers smaller than this are cheaper to join than to send on
+# their own
+JOIN_LIMIT = 16_384
+
+CRLF = b"\r\n"
+LAST_CHUNK = b"0\r\n\r\n"
+
+
+class StreamLengthError(HttpBaseError):
+    pass
+
+
+def write_buffers(
+    writer: asyncio.StreamWriter,
+    buffers: List[bytes],
+) -> None:
+    """
+    Hand `buffers` to the transport in order without copying
+    the large ones, e.g. a response body behind its head.
+    """
+    if SCATTER_GATHER:
+        writer.writelines(buffers)
+        return
+
+    small = []
+    for buffer in buffers:
+        if len(buffer) < JOIN_LIMIT:
+            small.append(buffer)
+            continue
+        if small:
+            writer.writelines(small)
+            small = []
+        writer.write(buffer)
+
+    if small:
+        writer.writelines(small)
+
+
+def set_write_limits(
+    writer: asyncio.StreamWriter,
+    high: Optional[int] = None,
+    low: Optional[int] = None,
+) -> None:
+    """
+    Set the watermarks of the transport's write buffer: writing
+    pauses once more than `high` bytes are queued and resumes
+    below `low`. `None` keeps asyncio's default.
+    """
+    writer.transport.set_write_buffer_limits(high, low)
+
+
+async def write_stream(
+    writer: asyncio.StreamWriter,
+    chunks: AsyncIterable[bytes],
+    chunked: bool = False,
+    length: Optional[int] = None,
+) -> int:
+    """
+    Write each chunk as soon as it is produced, framed with
+    chunked Transfer-Encoding if `chunked`. The producer is not
+    asked for the next one while the transport is above its
+    high watermark, so a slow client holds at most that much
+    of the response in memory. Returns the number of body bytes
+    written.
+
+    A producer going past the declared `length` has what still
+    fits written and is then closed with a `StreamLengthError`,
+    since the client would take the rest for the next response.
+    """
+    written = 0
+    async for chunk in chunks:
+        if not chunk:
+            # an empty chunk would end a chunked body
+            continue
+        if length is not None and written + len(chunk) > length:
+            fits = length - written
+            if fits:
+                writer.write(chunk[:fits])
+            aclose = getattr(chunks, "aclose", None)
+            if aclose:
+                await aclose()
+            raise StreamLengthError(
+                f"Stream longer than its length of {length} bytes"
+            )
+        if chunked:
+            write_buffers(
+                writer, [b"%x\r\n" % len(chunk), chunk, CRLF]
+            )
+        else:
+            writer.write(chunk)
+        written += len(chunk)
+        # returns straight away unless the transport is paused
+        await writer.drain()
+
+    if chunked:
+        writer.write(LAST_CHUNK)
+    return written
+
+
+async def send_file(
+    writer: asyncio.StreamWriter,
+    path: str,
+    offset: int = 0,
+    count: Optional[int] = None,
+) -> None:
+    """
+    Send part of a file with `loop.sendfile`, which lets the
+    kernel copy it straight to the socket where it can and
+    falls back to reading it in chunks otherwise.
+    """
+    loop = asyncio.get_running_loop()
+    with open(path, "rb") as f:
+        await loop.sendfile(writer.transport, f, offset, count)
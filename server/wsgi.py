@@ -0,0 +1,218 @@
+from server.blocking import BlockingPool
+from server.error import HttpServerError
+from server.http.header import Header
+from server.http.protocol import Protocol
+from server.http.request import BufferedRequest
+from server.http.response import Response, StreamingResponse
+from server.http.status import Status
+
+import io
+import logging
+import sys
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+from urllib.parse import unquote_to_bytes
+
+
+LOGGER = logging.getLogger("wsgi")
+
+# headers the environ has dedicated keys for
+CGI_HEADERS = {
+    b"CONTENT_TYPE": "CONTENT_TYPE",
+    b"CONTENT_LENGTH": "CONTENT_LENGTH",
+}
+
+
+class WSGIError(HttpServerError):
+    pass
+
+
+class Started(object):
+    """
+    What the application passed to `start_response`, and the
+    start of its body.
+    """
+
+    __slots__ = (
+        "status",
+        "headers",
+        "body",
+        "rest",
+        "result",
+        "sent",
+    )
+
+    def __init__(self) -> None:
+        self.status: Optional[str] = None
+        self.headers: List[Tuple[str, str]] = []
+        self.body: List[bytes] = []
+        # the rest of the body when it is produced lazily
+        self.rest: Optional[Iterator[bytes]] = None
+        self.result: Optional[Iterable[bytes]] = None
+        self.sent: bool = False
+
+
+class WSGIHandler(object):
+    """
+    Request handler running a WSGI application (PEP 3333) on a
+    `BlockingPool`, since WSGI applications block.
+
+    Responses whose body the application returns as a list are
+    sent with a Content-Length. Any other iterable is streamed
+    as it is produced, one chunk per trip to the pool.
+    """
+
+    __slots__ = (
+        "_app",
+        "_pool",
+        "_server_name",
+        "_server_port",
+    )
+
+    def __init__(
+        self,
+        app: Callable,
+        pool: Optional[BlockingPool] = None,
+        server_name: str = "localhost",
+        server_port: int = 8080,
+    ) -> None:
+        self._app: Callable = app
+        self._pool: BlockingPool = pool or BlockingPool()
+        self._server_name: str = server_name
+        self._server_port: int = server_port
+
+    async def __call__(self, req) -> Response:
+        buffered = await req.buffered()
+        environ = make_environ(
+            buffered, self._server_name, self._server_port
+        )
+        started = await self._pool.run(self._start, environ)
+
+        status = parse_status(started.status)
+        headers = [Header(n, v) for n, v in started.headers]
+        if started.rest is None:
+            return Response(
+                protocol=Protocol.HTTP1_1,
+                status=status,
+                headers=headers,
+                body=b"".join(started.body),
+            )
+
+        return StreamingResponse(
+            protocol=Protocol.HTTP1_1,
+            status=status,
+            headers=headers,
+            stream=self._stream(started),
+            length=content_length(started.headers),
+        )
+
+    def _start(self, environ: Dict) -> Started:
+        started = Started()
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and started.sent:
+                # too late to change the status
+                raise exc_info[1].with_traceback(exc_info[2])
+            started.status = status
+            started.headers = headers
+            return started.body.append
+
+        result = self._app(environ, start_response)
+        if isinstance(result, (list, tuple)):
+            started.body.extend(result)
+            close(result)
+        else:
+            started.result = result
+            started.rest = iter(result)
+            # applications may call start_response as late as
+            # when producing their first chunk
+            for chunk in started.rest:
+                started.body.append(chunk)
+                if chunk:
+                    break
+            else:
+                started.rest = None
+                close(result)
+
+        if started.status is None:
+            close(result)
+            raise WSGIError(
+                "Application did not call start_response"
+            )
+        started.sent = True
+        return started
+
+    async def _stream(self, started: Started):
+        try:
+            for chunk in started.body:
+                yield chunk
+            while True:
+                chunk = await self._pool.run(
+                    next, started.rest, None
+                )
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            await self._pool.run(close, started.result)
+
+
+def make_environ(
+    req: BufferedRequest, server_name: str, server_port: int
+) -> Dict:
+    path, _, query = req.path.partition(b"?")
+    environ = {
+        "REQUEST_METHOD": req.method.name,
+        "SCRIPT_NAME": "",
+        # PEP 3333: native strings holding bytes as latin-1
+        "PATH_INFO": unquote_to_bytes(path).decode("latin-1"),
+        "QUERY_STRING": query.decode("latin-1"),
+        "SERVER_NAME": server_name,
+        "SERVER_PORT": str(server_port),
+        "SERVER_PROTOCOL": req.protocol.value,
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": "http",
+        "wsgi.input": io.BytesIO(req.body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+
+    for name, value in req.headers.items():
+        name = name.upper().replace(b"-", b"_")
+        key = CGI_HEADERS.get(name)
+        if key is None:
+            key = "HTTP_" + name.decode("latin-1")
+        value = value.decode("latin-1")
+        if key in environ:
+            value = environ[key] + "," + value
+        environ[key] = value
+    return environ
+
+
+def parse_status(status: str) -> Status:
+    try:
+        return Status(int(status.split(maxsplit=1)[0]))
+    except (ValueError, IndexError):
+        raise WSGIError(f"Invalid status {status}")
+
+
+def content_length(headers: List[Tuple[str, str]]) -> Optional[int]:
+    for name, value in headers:
+        if name.lower() == "content-length":
+            return int(value)
+    return None
+
+
+def close(result) -> None:
+    method = getattr(result, "close", None)
+    if method:
+        method()
@@ -0,0 +1,27 @@
+from server.http import request, response
+
+from collections import deque
+from typing import List, Optional
+
+
+class MockStreamReader:
+    """Hands out one chunk per read, counting the reads."""
+
+    def __init__(self, chunks: List[bytes]) -> None:
+        self.chunks = deque(chunks)
+        self.reads = 0
+
+    async def read(self, buff_size: int):
+        self.reads += 1
+        return self.chunks.popleft()
+
+
+def make_request(*chunks: bytes) -> request.LazyRequest:
+    return request.LazyRequest(MockStreamReader(list(chunks)))
+
+
+def header(resp: response.Response, name: str) -> Optional[str]:
+    for h in resp.headers or ():
+        if h.name == name:
+            return h.value
+    return None
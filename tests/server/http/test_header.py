@@ -0,0 +1,50 @@
+from server.http import header
+
+import unittest
+
+
+class test_HeaderIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = header.HeaderIndex()
+        for line in (
+            b"Host: localhost:8080",
+            b"Accept: text/html",
+            b"accept:  application/json ",
+            b"X-Empty:",
+        ):
+            self.index.add(line)
+
+    def test_get(self):
+        cases = [
+            (b"host", b"localhost:8080"),
+            (b"HOST", b"localhost:8080"),
+            (b"Accept", b"text/html"),
+            (b"x-empty", b""),
+            (b"missing", None),
+        ]
+        for name, expect in cases:
+            with self.subTest(name=name):
+                self.assertEqual(expect, self.index.get(name))
+
+    def test_getall(self):
+        expect = [b"text/html", b"application/json"]
+        self.assertEqual(expect, self.index.getall(b"accept"))
+        self.assertEqual([], self.index.getall(b"missing"))
+
+    def test_repeated_get(self):
+        first = self.index.get(b"host")
+        self.assertIs(first, self.index.get(b"host"))
+
+    def test_contains(self):
+        self.assertIn(b"Host", self.index)
+        self.assertNotIn(b"Cookie", self.index)
+        self.assertEqual(4, len(self.index))
+
+    def test_clear(self):
+        self.index.clear()
+        self.assertIsNone(self.index.get(b"host"))
+        self.assertEqual(0, len(self.index))
+
+    def test_no_colon(self):
+        with self.assertRaises(ValueError):
+            self.index.add(b"not a header")
@@ -56,15 +56,15 @@ class test_Parser(unittest.TestCase):
         self.assertEqual(expect, actual)
 
     def test_start_line_and_header_and_body_within_buffer(self):
-        line = b"GET / HTTP/1.1\r\nHost: localhost\r\n\r\nBODY\nTEXT\r\n\r\n"
-        p = parser.BufferedParser()
+        line = b"GET / HTTP/1.1\r\nContent-Length: 13\r\n\r\nBODY\nTEXT\r\n\r\n"
+        p = parser.BufferedParser(body_mode=parser.BodyMode.Lines)
         expect = [
             parser.Line(
                 data=b"GET / HTTP/1.1",
                 type=parser.MessageState.StartLine,
             ),
             parser.Line(
-                data=b"Host: localhost",
+                data=b"Content-Length: 13",
                 type=parser.MessageState.Header,
             ),
             parser.Line(
@@ -72,7 +72,11 @@ class test_Parser(unittest.TestCase):
                 type=parser.MessageState.Body,
             ),
             parser.Line(
-                data=b"TEXT\r\n\r\n",
+                data=b"TEXT\r\n",
+                type=parser.MessageState.Body,
+            ),
+            parser.Line(
+                data=b"\r\n",
                 type=parser.MessageState.Body,
             ),
         ]
@@ -147,10 +151,10 @@ class test_Parser(unittest.TestCase):
     def test_start_line_header_body_broken_up(self):
         lines = [
             b"GET /path/to/resource HTTP/1.1\r",
-            b"\nHost: localhost",
+            b"\nContent-Length: 13",
             b"\r\n\r\nbody text\r\n\r\n",
         ]
-        p = parser.BufferedParser()
+        p = parser.BufferedParser(body_mode=parser.BodyMode.Lines)
 
         with self.subTest("not_enough_data_yet"):
             expect = []
@@ -170,11 +174,15 @@ class test_Parser(unittest.TestCase):
         with self.subTest("header_and_body_now"):
             expect = [
                 parser.Line(
-                    data=b"Host: localhost",
+                    data=b"Content-Length: 13",
                     type=parser.MessageState.Header,
                 ),
                 parser.Line(
-                    data=b"body text\r\n\r\n",
+                    data=b"body text\r\n",
+                    type=parser.MessageState.Body,
+                ),
+                parser.Line(
+                    data=b"\r\n",
                     type=parser.MessageState.Body,
                 ),
             ]
@@ -184,10 +192,10 @@ class test_Parser(unittest.TestCase):
     def test_body_with_newline(self):
         lines = [
             b"GET /path/to/resource HTTP/1.1\r",
-            b"\nHost: localhost",
+            b"\nContent-Length: 17",
             b"\r\n\r\nBODY\n    TEXT\r\n\r\n",
         ]
-        p = parser.BufferedParser()
+        p = parser.BufferedParser(body_mode=parser.BodyMode.Lines)
 
         with self.subTest("not_enough_data_yet"):
             expect = []
@@ -207,16 +215,381 @@ class test_Parser(unittest.TestCase):
         with self.subTest("header_and_body_now"):
             expect = [
                 parser.Line(
-                    data=b"Host: localhost",
+                    data=b"Content-Length: 17",
                     type=parser.MessageState.Header,
                 ),
                 parser.Line(
                     data=b"BODY\n", type=parser.MessageState.Body
                 ),
                 parser.Line(
-                    data=b"    TEXT\r\n\r\n",
+                    data=b"    TEXT\r\n",
+                    type=parser.MessageState.Body,
+                ),
+                parser.Line(
+                    data=b"\r\n",
+                    type=parser.MessageState.Body,
+                ),
+            ]
+            actual = p.maybe_get_lines(lines[2])
+            self.assertEqual(expect, actual)
+
+    def test_pipelined_messages(self):
+        data = b"".join(
+            (
+                b"POST /first HTTP/1.1\r\n",
+                b"Content-Length: 5\r\n\r\n",
+                b"hello",
+                b"GET /second HTTP/1.1\r\n\r\n",
+            )
+        )
+        p = parser.BufferedParser()
+
+        with self.subTest("first_message"):
+            expect = [
+                parser.Line(
+                    data=b"POST /first HTTP/1.1",
+                    type=parser.MessageState.StartLine,
+                ),
+                parser.Line(
+                    data=b"Content-Length: 5",
+                    type=parser.MessageState.Header,
+                ),
+                parser.Line(
+                    data=b"hello",
                     type=parser.MessageState.Body,
                 ),
             ]
+            actual = p.maybe_get_lines(data)
+            self.assertEqual(expect, actual)
+            self.assertTrue(p.complete)
+
+        with self.subTest("nothing_until_reset"):
+            self.assertEqual([], p.maybe_get_lines(b""))
+
+        with self.subTest("second_message"):
+            p.reset()
+            expect = [
+                parser.Line(
+                    data=b"GET /second HTTP/1.1",
+                    type=parser.MessageState.StartLine,
+                ),
+            ]
+            actual = p.maybe_get_lines(b"")
+            self.assertEqual(expect, actual)
+            self.assertTrue(p.complete)
+
+    def test_invalid_content_length(self):
+        line = b"GET / HTTP/1.1\r\nContent-Length: ten\r\n\r\n"
+        p = parser.BufferedParser()
+        with self.assertRaises(parser.FramingError):
+            p.maybe_get_lines(line)
+
+    def test_content_length_digits_only(self):
+        for value in (
+            b"+10",
+            b"1_0",
+            b"-1",
+            b"0x10",
+            b"\x0b10",
+            "١٠".encode(),
+        ):
+            with self.subTest(value=value):
+                p = parser.BufferedParser()
+                with self.assertRaises(parser.FramingError):
+                    p.maybe_get_lines(
+                        b"GET / HTTP/1.1\r\nContent-Length: "
+                        + value
+                        + b"\r\n\r\n"
+                    )
+
+    def test_content_length_optional_whitespace(self):
+        p = parser.BufferedParser()
+        p.maybe_get_lines(
+            b"POST / HTTP/1.1\r\nContent-Length:\t 2 \r\n\r\nhi"
+        )
+        self.assertTrue(p.complete)
+
+    def test_duplicate_content_length(self):
+        with self.subTest("conflicting"):
+            p = parser.BufferedParser()
+            with self.assertRaises(parser.FramingError):
+                p.maybe_get_lines(
+                    b"POST / HTTP/1.1\r\nContent-Length: 5\r\n"
+                    b"Content-Length: 50\r\n\r\n"
+                )
+
+        with self.subTest("identical"):
+            p = parser.BufferedParser()
+            p.maybe_get_lines(
+                b"POST / HTTP/1.1\r\nContent-Length: 5\r\n"
+                b"Content-Length: 5\r\n\r\nhello"
+            )
+            self.assertTrue(p.complete)
+
+    def test_chunked_body(self):
+        lines = [
+            b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n",
+            b"5\r\nhel",
+            b"lo\r\n6;ext=1\r\n world\r\n",
+            b"0\r\nTrailer: ignored\r\n\r\n",
+        ]
+        p = parser.BufferedParser()
+
+        with self.subTest("head"):
+            expect = [
+                parser.Line(
+                    data=b"POST / HTTP/1.1",
+                    type=parser.MessageState.StartLine,
+                ),
+                parser.Line(
+                    data=b"Transfer-Encoding: chunked",
+                    type=parser.MessageState.Header,
+                ),
+            ]
+            actual = p.maybe_get_lines(lines[0])
+            self.assertEqual(expect, actual)
+
+        with self.subTest("partial_chunk_streamed"):
+            expect = [
+                parser.Line(
+                    data=b"hel", type=parser.MessageState.Body
+                ),
+            ]
+            actual = p.maybe_get_lines(lines[1])
+            self.assertEqual(expect, actual)
+
+        with self.subTest("rest_of_chunk_and_next_chunk"):
+            expect = [
+                parser.Line(
+                    data=b"lo", type=parser.MessageState.Body
+                ),
+                parser.Line(
+                    data=b" world", type=parser.MessageState.Body
+                ),
+            ]
             actual = p.maybe_get_lines(lines[2])
             self.assertEqual(expect, actual)
+            self.assertFalse(p.complete)
+
+        with self.subTest("last_chunk_and_trailer"):
+            self.assertEqual([], p.maybe_get_lines(lines[3]))
+            self.assertTrue(p.complete)
+
+    def test_both_lengths_rejected(self):
+        line = b"".join(
+            (
+                b"POST / HTTP/1.1\r\n",
+                b"Content-Length: 5\r\n",
+                b"Transfer-Encoding: chunked\r\n\r\n",
+            )
+        )
+        p = parser.BufferedParser()
+        with self.assertRaises(parser.FramingError):
+            p.maybe_get_lines(line)
+
+    def test_both_lengths_rejected_zero_length(self):
+        for head in (
+            b"Content-Length: 0\r\nTransfer-Encoding: chunked\r\n",
+            b"Transfer-Encoding: chunked\r\nContent-Length: 0\r\n",
+        ):
+            with self.subTest(head=head):
+                p = parser.BufferedParser()
+                with self.assertRaises(parser.FramingError):
+                    p.maybe_get_lines(
+                        b"POST / HTTP/1.1\r\n" + head + b"\r\n"
+                    )
+
+    def test_whitespace_before_colon(self):
+        for header in (
+            b"Content-Length : 5",
+            b"Content-Length\t: 5",
+            b"Host : localhost",
+        ):
+            with self.subTest(header=header):
+                p = parser.BufferedParser()
+                with self.assertRaises(parser.FramingError):
+                    p.maybe_get_lines(
+                        b"POST / HTTP/1.1\r\n" + header + b"\r\n\r\n"
+                    )
+
+    def test_invalid_chunk_size(self):
+        for size in (b"-5", b"+5", b"0x5", b"1_0", b" 5", b"", b"g"):
+            with self.subTest(size=size):
+                p = parser.BufferedParser()
+                p.maybe_get_lines(
+                    b"POST / HTTP/1.1\r\n"
+                    b"Transfer-Encoding: chunked\r\n\r\n"
+                )
+                with self.assertRaises(parser.FramingError):
+                    p.maybe_get_lines(size + b"\r\nhello\r\n")
+
+    def test_chunk_size_hex(self):
+        p = parser.BufferedParser()
+        p.maybe_get_lines(
+            b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n"
+        )
+        body = p.maybe_get_lines(b"A ;x\r\n0123456789\r\n0\r\n\r\n")
+        self.assertEqual(
+            b"0123456789", b"".join(l.data for l in body)
+        )
+        self.assertTrue(p.complete)
+
+    def test_chunk_lines_limited(self):
+        head = (
+            b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n"
+        )
+        for body in (
+            b"1" * 2_000,
+            b"5;" + b"x" * 2_000 + b"\r\n",
+            b"5\r\nhello" + b"x" * 2_000,
+        ):
+            with self.subTest(body=body[:8]):
+                p = parser.BufferedParser(max_header_size=1_024)
+                p.maybe_get_lines(head)
+                with self.assertRaises(parser.FramingError):
+                    for _ in range(0, len(body), 100):
+                        p.maybe_get_lines(body[:100])
+                        body = body[100:]
+
+    def test_trailers_limited(self):
+        p = parser.BufferedParser(max_header_size=1_024)
+        p.maybe_get_lines(
+            b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n"
+            b"0\r\n"
+        )
+        with self.assertRaises(parser.HeaderLengthError):
+            for _ in range(100):
+                p.maybe_get_lines(
+                    b"X-Trailer: " + b"x" * 20 + b"\r\n"
+                )
+
+    def test_expected(self):
+        p = parser.BufferedParser()
+        p.maybe_get_lines(
+            b"POST / HTTP/1.1\r\nContent-Length: 100\r\n\r\n0123456789"
+        )
+        self.assertEqual(90, p.expected)
+
+    def test_one_byte_reads(self):
+        message = b"".join(
+            (
+                b"POST /path HTTP/1.1\r\n",
+                b"Host: localhost\r\n",
+                b"Content-Length: 10\r\n\r\n",
+                b"body\ntext\n",
+                b"GET /next HTTP/1.1\r\n\r\n",
+            )
+        )
+        p = parser.BufferedParser()
+        actual = []
+        for i in range(len(message)):
+            actual.extend(p.maybe_get_lines(message[i : i + 1]))
+            if p.complete:
+                break
+
+        head = [
+            line.data
+            for line in actual
+            if line.type != parser.MessageState.Body
+        ]
+        body = b"".join(
+            line.data
+            for line in actual
+            if line.type == parser.MessageState.Body
+        )
+        expect = [
+            b"POST /path HTTP/1.1",
+            b"Host: localhost",
+            b"Content-Length: 10",
+        ]
+        self.assertEqual(expect, head)
+        self.assertEqual(b"body\ntext\n", body)
+
+        p.reset()
+        rest = p.maybe_get_lines(message[i + 1 :])
+        expect = [b"GET /next HTTP/1.1"]
+        self.assertEqual(expect, [line.data for line in rest])
+
+    def test_raw_body_bounded_chunks(self):
+        body = b"\r\n\x00binary\rdata\n" * 4
+        head = b"POST / HTTP/1.1\r\nContent-Length: %d\r\n\r\n"
+        p = parser.BufferedParser(max_body_chunk=20)
+        lines = p.maybe_get_lines(head % len(body) + body)
+        chunks = [
+            line.data
+            for line in lines
+            if line.type == parser.MessageState.Body
+        ]
+        self.assertEqual(body, b"".join(chunks))
+        self.assertTrue(all(len(c) <= 20 for c in chunks))
+        self.assertEqual(3, len(chunks))
+
+    def test_raw_body_passed_through(self):
+        body = b"x" * 1000
+        p = parser.BufferedParser()
+        p.maybe_get_lines(
+            b"POST / HTTP/1.1\r\nContent-Length: 2000\r\n\r\n"
+        )
+
+        with self.subTest("not_copied"):
+            lines = p.maybe_get_lines(body)
+            self.assertIs(body, lines[0].data)
+
+        with self.subTest("leftover_buffered"):
+            lines = p.maybe_get_lines(
+                body + b"GET / HTTP/1.1\r\n\r\n"
+            )
+            self.assertEqual([body], [line.data for line in lines])
+            self.assertTrue(p.complete)
+            p.reset()
+            lines = p.maybe_get_lines(b"")
+            self.assertEqual(
+                [b"GET / HTTP/1.1"], [line.data for line in lines]
+            )
+
+    def test_header_too_long(self):
+        with self.subTest("endless_line"):
+            p = parser.BufferedParser(max_header_size=64)
+            p.maybe_get_lines(b"GET / HTTP/1.1\r\nX-Long: ")
+            with self.assertRaises(parser.HeaderLengthError):
+                for _ in range(10):
+                    p.maybe_get_lines(b"a" * 16)
+
+        with self.subTest("many_headers"):
+            p = parser.BufferedParser(max_header_size=64)
+            with self.assertRaises(parser.HeaderLengthError):
+                p.maybe_get_lines(
+                    b"GET / HTTP/1.1\r\n" + b"X-Short: a\r\n" * 10
+                )
+
+        with self.subTest("limit_is_per_message"):
+            p = parser.BufferedParser(max_header_size=64)
+            message = b"GET / HTTP/1.1\r\n" + b"X-Short: a\r\n" * 3
+            for _ in range(3):
+                p.maybe_get_lines(message + b"\r\n")
+                self.assertTrue(p.complete)
+                p.reset()
+
+    def test_body_too_long(self):
+        with self.subTest("content_length"):
+            p = parser.BufferedParser(max_body_size=10)
+            with self.assertRaises(parser.BodyLengthError):
+                p.maybe_get_lines(
+                    b"POST / HTTP/1.1\r\nContent-Length: 11\r\n"
+                )
+
+        with self.subTest("chunked"):
+            p = parser.BufferedParser(max_body_size=10)
+            p.maybe_get_lines(
+                b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n"
+            )
+            p.maybe_get_lines(b"6\r\nhello \r\n")
+            with self.assertRaises(parser.BodyLengthError):
+                p.maybe_get_lines(b"5\r\n")
+
+        with self.subTest("within_limit"):
+            p = parser.BufferedParser(max_body_size=10)
+            p.maybe_get_lines(
+                b"POST / HTTP/1.1\r\nContent-Length: 10\r\n\r\n0123456789"
+            )
+            self.assertTrue(p.complete)
@@ -1,20 +1,21 @@
 from server.http import parser, reader
+from tests.server.helpers import MockStreamReader
 
+import asyncio
 import unittest
-from collections import deque
 from textwrap import wrap
-from typing import List
 
 
 MOCK_RECV_SIZE = 16
 
 
-class MockStreamReader:
-    def __init__(self, msg: List[bytes]) -> None:
-        self.chunks = deque(msg)
+class QuietStreamReader(MockStreamReader):
+    """Goes quiet, without closing, once its chunks are read."""
 
     async def read(self, buff_size: int):
-        return self.chunks.popleft()
+        if self.chunks:
+            return self.chunks.popleft()
+        await asyncio.Event().wait()
 
 
 class test_BufferedLineReader(unittest.IsolatedAsyncioTestCase):
@@ -64,7 +65,7 @@ class test_BufferedLineReader(unittest.IsolatedAsyncioTestCase):
 
     async def test_start_line_and_header_and_body(self):
         data = [
-            b"GET /path/to/resource HTTP/1.1\r\nHost: localhost\r\n\r\nbody text\r\n\r\n",
+            b"GET /path/to/resource HTTP/1.1\r\nContent-Length: 13\r\n\r\nbody text\r\n\r\n",
         ]
         mock_reader = MockStreamReader(data)
         blr = reader.BufferedLineReader(mock_reader)
@@ -74,7 +75,7 @@ class test_BufferedLineReader(unittest.IsolatedAsyncioTestCase):
                 type=parser.MessageState.StartLine,
             ),
             parser.Line(
-                data=b"Host: localhost",
+                data=b"Content-Length: 13",
                 type=parser.MessageState.Header,
             ),
             parser.Line(
@@ -87,3 +88,149 @@ class test_BufferedLineReader(unittest.IsolatedAsyncioTestCase):
         async for line in blr.lines():
             actual.append(line)
         self.assertEqual(expect, actual)
+
+    async def test_reset_between_messages(self):
+        data = [
+            b"GET /first HTTP/1.1\r\n\r\n",
+            b"GET /second HTTP/1.1\r\n\r\n",
+        ]
+        mock_reader = MockStreamReader(data)
+        blr = reader.BufferedLineReader(mock_reader)
+
+        with self.subTest("first_message"):
+            expect = [
+                parser.Line(
+                    data=b"GET /first HTTP/1.1",
+                    type=parser.MessageState.StartLine,
+                ),
+            ]
+            actual = [line async for line in blr.lines()]
+            self.assertEqual(expect, actual)
+
+        blr.reset()
+
+        with self.subTest("second_message"):
+            expect = [
+                parser.Line(
+                    data=b"GET /second HTTP/1.1",
+                    type=parser.MessageState.StartLine,
+                ),
+            ]
+            actual = [line async for line in blr.lines()]
+            self.assertEqual(expect, actual)
+
+    async def test_closed(self):
+        mock_reader = MockStreamReader([b""])
+        blr = reader.BufferedLineReader(mock_reader)
+        actual = [line async for line in blr.lines()]
+        self.assertEqual([], actual)
+        self.assertTrue(blr.closed)
+
+    async def test_closed_mid_message(self):
+        for data in (
+            b"GET / HT",
+            b"GET / HTTP/1.1\r\nHost: localhost\r\n",
+            b"POST / HTTP/1.1\r\nContent-Length: 100\r\n\r\nabc",
+        ):
+            with self.subTest(data=data):
+                blr = reader.BufferedLineReader(
+                    MockStreamReader([data, b""])
+                )
+                with self.assertRaises(parser.FramingError):
+                    [line async for line in blr.lines()]
+
+    async def test_pipelined_messages(self):
+        data = [
+            b"GET /first HTTP/1.1\r\n\r\nGET /second HTTP/1.1\r\n\r\n",
+        ]
+        mock_reader = MockStreamReader(data)
+        blr = reader.BufferedLineReader(mock_reader)
+
+        with self.subTest("first_message"):
+            expect = [
+                parser.Line(
+                    data=b"GET /first HTTP/1.1",
+                    type=parser.MessageState.StartLine,
+                ),
+            ]
+            actual = [line async for line in blr.lines()]
+            self.assertEqual(expect, actual)
+
+        blr.reset()
+
+        with self.subTest("second_message_without_read"):
+            expect = [
+                parser.Line(
+                    data=b"GET /second HTTP/1.1",
+                    type=parser.MessageState.StartLine,
+                ),
+            ]
+            actual = [line async for line in blr.lines()]
+            self.assertEqual(expect, actual)
+
+    async def test_no_read_past_exact_multiple(self):
+        # the mock raises IndexError if read a third time
+        data = [
+            b"GET /path HTTP/1.1\r\nContent-Leng",
+            b"th: 16\r\n\r\n0123456789abcdef",
+        ]
+        mock_reader = MockStreamReader(data)
+        blr = reader.BufferedLineReader(mock_reader, MOCK_RECV_SIZE)
+        actual = [line.data async for line in blr.lines()]
+        self.assertEqual(b"0123456789abcdef", actual[-1])
+
+    async def test_slow_client(self):
+        data = [
+            b"GET /path HTTP/1.1\r\n",
+            b"Host: localhost\r\n",
+            b"Accept: */*\r\n",
+            b"\r\n",
+        ]
+        mock_reader = MockStreamReader(data)
+        blr = reader.BufferedLineReader(mock_reader)
+        actual = [line.data async for line in blr.lines()]
+        expect = [
+            b"GET /path HTTP/1.1",
+            b"Host: localhost",
+            b"Accept: */*",
+        ]
+        self.assertEqual(expect, actual)
+
+    async def test_timeout(self):
+        blr = reader.BufferedLineReader(
+            QuietStreamReader([b"GET / HTTP/1.1\r\nHost: loc"]),
+            timeout=0.01,
+        )
+        lines = blr.lines()
+        self.assertEqual(
+            b"GET / HTTP/1.1", (await anext(lines)).data
+        )
+        with self.assertRaises(reader.ReadTimeoutError):
+            await anext(lines)
+
+    async def test_budget(self):
+        budget = reader.BufferBudget(48)
+        first = reader.BufferedLineReader(
+            MockStreamReader([b"GET / HTTP/1.1\r\nHost: a"]),
+            budget=budget,
+        )
+        second = reader.BufferedLineReader(
+            MockStreamReader(
+                [b"GET / HTTP/1.1\r\nHost: b" + b"x" * 32]
+            ),
+            budget=budget,
+        )
+
+        with self.subTest("charged"):
+            await anext(first.lines())
+            self.assertEqual(21, budget.used)
+
+        with self.subTest("exceeded"):
+            with self.assertRaises(reader.BufferBudgetError):
+                await anext(second.lines())
+
+        with self.subTest("released"):
+            second.release()
+            self.assertEqual(21, budget.used)
+            first.release()
+            self.assertEqual(0, budget.used)
@@ -1,16 +1,7 @@
 from server.http import request
+from tests.server.helpers import MockStreamReader
 
 import unittest
-from collections import deque
-from typing import List
-
-
-class MockStreamReader:
-    def __init__(self, chunks: List[bytes]) -> None:
-        self.chunks = deque(chunks)
-
-    async def read(self, buff_size: int):
-        return self.chunks.popleft()
 
 
 class test_LazyRequest(unittest.IsolatedAsyncioTestCase):
@@ -123,14 +114,11 @@ class test_LazyRequest(unittest.IsolatedAsyncioTestCase):
 
     async def test_body(self):
         data = [
-            b"GET /path/to/resource HTTP/1.1\r\nHost: localhost\r\n\r\nTHIS IS\nBODY TEXT\r\n\r\n"
+            b"GET /path/to/resource HTTP/1.1\r\nContent-Length: 21\r\n\r\nTHIS IS\nBODY TEXT\r\n\r\n"
         ]
         reader = MockStreamReader(data)
         lazy_request = request.LazyRequest(reader)
-        expect = [
-            b"THIS IS\n",
-            b"BODY TEXT\r\n\r\n",
-        ]
+        expect = [b"THIS IS\nBODY TEXT\r\n\r\n"]
         actual = []
         async for chunk in lazy_request.body:
             actual.append(chunk)
@@ -143,7 +131,7 @@ class test_LazyRequest(unittest.IsolatedAsyncioTestCase):
                     b"GET /path/to/resource HTTP/1.1\r\n",
                     b"Host: localhost\r\n",
                     b"Content-Type: application/json\r\n",
-                    b"Another: foo\r\n\r\n",
+                    b"Content-Length: 21\r\n\r\n",
                     b"THIS IS\nBODY TEXT\r\n\r\n",
                 )
             )
@@ -169,11 +157,205 @@ class test_LazyRequest(unittest.IsolatedAsyncioTestCase):
             self.assertEqual(expect, actual)
 
         with self.subTest("get_body"):
-            expect = [
-                b"THIS IS\n",
-                b"BODY TEXT\r\n\r\n",
-            ]
+            expect = [b"THIS IS\nBODY TEXT\r\n\r\n"]
             actual = []
             async for chunk in lazy_request.body:
                 actual.append(chunk)
             self.assertEqual(expect, actual)
+
+    async def test_keep_alive(self):
+        cases = [
+            (b"GET / HTTP/1.1\r\n\r\n", True),
+            (b"GET / HTTP/1.1\r\nConnection: close\r\n\r\n", False),
+            (b"GET / HTTP/1.0\r\n\r\n", False),
+            (
+                b"GET / HTTP/1.0\r\nConnection: Keep-Alive\r\n\r\n",
+                True,
+            ),
+        ]
+        for data, expect in cases:
+            with self.subTest(data=data):
+                reader = MockStreamReader([data])
+                lazy_request = request.LazyRequest(reader)
+                await lazy_request.path
+                await lazy_request.finish()
+                self.assertEqual(expect, lazy_request.keep_alive)
+
+    async def test_shared_line_reader(self):
+        data = [
+            b"GET /first HTTP/1.1\r\nHost: localhost\r\n\r\n",
+            b"POST /second HTTP/1.1\r\n\r\n",
+        ]
+        reader = MockStreamReader(data)
+        lines = request.BufferedLineReader(reader)
+
+        first = request.LazyRequest(reader, lines=lines)
+        self.assertEqual(b"/first", await first.path)
+        await first.finish()
+        lines.reset()
+
+        second = request.LazyRequest(reader, lines=lines)
+        self.assertEqual(request.Method.POST, await second.method)
+        self.assertEqual(b"/second", await second.path)
+
+    async def test_reset(self):
+        data = [
+            b"POST /first HTTP/1.1\r\nHost: localhost\r\n"
+            b"Content-Length: 4\r\n\r\nBODY",
+            b"GET /second HTTP/1.0\r\nAccept: */*\r\n\r\n",
+        ]
+        reader = MockStreamReader(data)
+        lines = request.BufferedLineReader(reader)
+
+        req = request.LazyRequest(reader, lines=lines)
+        self.assertEqual(b"/first", await req.path)
+        req.params = {"name": b"value"}
+        await req.finish()
+        self.assertEqual(b"localhost", await req.header(b"host"))
+        lines.reset()
+        req.reset()
+
+        self.assertEqual(request.Method.GET, await req.method)
+        self.assertEqual(b"/second", await req.path)
+        self.assertEqual(
+            request.Protocol.HTTP1_0, await req.protocol
+        )
+        self.assertIsNone(await req.header(b"host"))
+        self.assertEqual(b"*/*", await req.header(b"accept"))
+        self.assertEqual({}, req.params)
+        self.assertEqual([], [chunk async for chunk in req.body])
+
+    async def test_buffered_outlives_reset(self):
+        data = [
+            b"POST /first HTTP/1.1\r\nHost: localhost\r\n"
+            b"Content-Length: 4\r\n\r\nBODY",
+            b"GET /second HTTP/1.1\r\nHost: other\r\n\r\n",
+        ]
+        reader = MockStreamReader(data)
+        lines = request.BufferedLineReader(reader)
+
+        req = request.LazyRequest(reader, lines=lines)
+        buffered = await req.buffered()
+        lines.reset()
+        req.reset()
+        self.assertEqual(b"other", await req.header(b"host"))
+        await req.finish()
+
+        self.assertEqual(b"localhost", buffered.headers.get(b"host"))
+        self.assertEqual(
+            b"4", buffered.headers.get(b"content-length")
+        )
+        self.assertEqual(b"BODY", buffered.body)
+
+    async def test_connection_closed(self):
+        reader = MockStreamReader([b""])
+        lazy_request = request.LazyRequest(reader)
+        with self.assertRaises(request.ConnectionClosedError):
+            await lazy_request.path
+
+    async def test_chunked_body(self):
+        data = [
+            b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n",
+            b"4\r\nTHIS\r\n",
+            b"8\r\n IS BODY\r\n0\r\n\r\n",
+            b"GET /next HTTP/1.1\r\n\r\n",
+        ]
+        reader = MockStreamReader(data)
+        lazy_request = request.LazyRequest(reader)
+        expect = [b"THIS", b" IS BODY"]
+        actual = []
+        async for chunk in lazy_request.body:
+            actual.append(chunk)
+        self.assertEqual(expect, actual)
+
+    async def test_header(self):
+        data = [
+            b"POST / HTTP/1.1\r\nHost: localhost\r\n",
+            b"Content-Length: 4\r\nhost: other\r\n\r\nBODY",
+        ]
+        reader = MockStreamReader(data)
+        lazy_request = request.LazyRequest(reader)
+
+        with self.subTest("lookup"):
+            expect = b"localhost"
+            actual = await lazy_request.header(b"Host")
+            self.assertEqual(expect, actual)
+
+        with self.subTest("repeated"):
+            self.assertEqual(
+                b"4", await lazy_request.header(b"content-length")
+            )
+            self.assertIsNone(await lazy_request.header(b"cookie"))
+            self.assertEqual(
+                [b"localhost", b"other"],
+                await lazy_request.header_values(b"host"),
+            )
+
+        with self.subTest("body_still_readable"):
+            actual = []
+            async for chunk in lazy_request.body:
+                actual.append(chunk)
+            self.assertEqual([b"BODY"], actual)
+
+    async def test_header_after_stream(self):
+        data = [
+            b"GET / HTTP/1.1\r\nHost: localhost\r\nAccept: */*\r\n\r\n"
+        ]
+        reader = MockStreamReader(data)
+        lazy_request = request.LazyRequest(reader)
+        await anext(lazy_request.headers)
+        self.assertEqual(
+            b"*/*", await lazy_request.header(b"accept")
+        )
+        self.assertEqual(
+            b"localhost", await lazy_request.header(b"host")
+        )
+
+    async def test_header_malformed(self):
+        data = [b"GET / HTTP/1.1\r\nnot a header\r\n\r\n"]
+        reader = MockStreamReader(data)
+        lazy_request = request.LazyRequest(reader)
+        with self.assertRaises(request.RequestParseError):
+            await lazy_request.header(b"host")
+
+
+class test_ParsedRequest(unittest.IsolatedAsyncioTestCase):
+    def make(self, *header_lines, body=()):
+        return request.ParsedRequest(
+            b"POST /upload HTTP/1.0", list(header_lines), list(body)
+        )
+
+    async def test_like_lazy_request(self):
+        req = self.make(
+            b"Host: localhost",
+            b"Connection: keep-alive",
+            body=[b"hello", b" world"],
+        )
+        self.assertEqual(request.Method.POST, await req.method)
+        self.assertEqual(b"/upload", await req.path)
+        self.assertEqual(b"localhost", await req.header(b"host"))
+        headers = [h async for h in req.headers]
+        self.assertEqual(
+            request.Header(b"HOST", b"localhost"), headers[0]
+        )
+        self.assertTrue(req.keep_alive)
+        self.assertFalse(req.body_complete)
+
+        buffered = await req.buffered()
+        self.assertEqual(b"hello world", buffered.body)
+        self.assertTrue(req.body_complete)
+
+    async def test_header_malformed(self):
+        with self.assertRaises(request.RequestParseError):
+            self.make(b"not a header")
+
+
+class test_parse_header(unittest.TestCase):
+    def test_colon_in_value(self):
+        expect = request.Header(b"HOST", b"localhost:8080")
+        actual = request.parse_header(b"Host: localhost:8080")
+        self.assertEqual(expect, actual)
+
+    def test_no_colon(self):
+        with self.assertRaises(request.RequestParseError):
+            request.parse_header(b"not a header")
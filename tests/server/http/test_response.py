@@ -11,7 +11,7 @@ class test_parse_request(unittest.TestCase):
             protocol=protocol,
             status=status,
         )
-        expect = b"HTTP/1.1 200 OK"
+        expect = b"HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n"
         actual = response.to_bytes(resp)
         self.assertEqual(expect, actual)
 
@@ -25,7 +25,7 @@ class test_parse_request(unittest.TestCase):
                 response.Header("Content-Type", "application/json")
             ],
         )
-        expect = b"HTTP/1.1 200 OK\nContent-Type: application/json"
+        expect = b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: 0\r\n\r\n"
         actual = response.to_bytes(resp)
         self.assertEqual(expect, actual)
 
@@ -40,6 +40,93 @@ class test_parse_request(unittest.TestCase):
             ],
             body=b"THIS IS A MESSAGE",
         )
-        expect = b"HTTP/1.1 200 OK\nContent-Type: application/json\n\nTHIS IS A MESSAGE"
+        expect = b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: 17\r\n\r\nTHIS IS A MESSAGE"
         actual = response.to_bytes(resp)
         self.assertEqual(expect, actual)
+
+    def test_status_lines(self):
+        self.assertEqual(
+            b"HTTP/1.0 404 Not Found",
+            response.STATUS_LINES[
+                response.Protocol.HTTP1_0, response.Status.NotFound
+            ],
+        )
+
+    def test_prerender(self):
+        resp = response.Response(
+            protocol=response.Protocol.HTTP1_1,
+            status=response.Status.OK,
+            body=b"THIS IS A MESSAGE",
+        )
+        expect = response.to_bytes(resp)
+
+        self.assertIs(resp, response.prerender(resp))
+        first = response.to_bytes(resp)
+        self.assertEqual(expect, first)
+        self.assertIs(first, response.to_bytes(resp))
+
+    def test_existing_framing_kept(self):
+        resp = response.Response(
+            protocol=response.Protocol.HTTP1_1,
+            status=response.Status.OK,
+            headers=[response.Header("Content-Length", "4")],
+            body=b"BODY",
+        )
+        expect = b"HTTP/1.1 200 OK\r\nContent-Length: 4\r\n\r\nBODY"
+        actual = response.to_bytes(resp)
+        self.assertEqual(expect, actual)
+
+    def test_no_content_length_without_body(self):
+        resp = response.Response(
+            protocol=response.Protocol.HTTP1_1,
+            status=response.Status.NotModified,
+        )
+        expect = b"HTTP/1.1 304 Not Modified\r\n\r\n"
+        actual = response.to_bytes(resp)
+        self.assertEqual(expect, actual)
+
+    def test_to_buffers(self):
+        body = b"x" * 100_000
+        resp = response.Response(
+            protocol=response.Protocol.HTTP1_1,
+            status=response.Status.OK,
+            body=body,
+        )
+        head, actual_body = response.to_buffers(resp)
+        self.assertEqual(
+            b"HTTP/1.1 200 OK\r\nContent-Length: 100000\r\n\r\n",
+            head,
+        )
+        self.assertIs(body, actual_body)
+
+    def test_streaming_framing(self):
+        cases = [
+            (
+                response.Protocol.HTTP1_1,
+                None,
+                b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n",
+            ),
+            (
+                response.Protocol.HTTP1_1,
+                5,
+                b"HTTP/1.1 200 OK\r\nContent-Length: 5\r\n\r\n",
+            ),
+            (
+                response.Protocol.HTTP1_0,
+                None,
+                b"HTTP/1.0 200 OK\r\n\r\n",
+            ),
+        ]
+        for protocol, length, expect in cases:
+            with self.subTest(protocol=protocol, length=length):
+                resp = response.StreamingResponse(
+                    protocol=protocol,
+                    status=response.Status.OK,
+                    length=length,
+                )
+                self.assertEqual([expect], response.to_buffers(resp))
+                self.assertEqual(
+                    length is None
+                    and protocol == response.Protocol.HTTP1_1,
+                    response.is_chunked(resp),
+                )
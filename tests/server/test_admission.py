@@ -0,0 +1,119 @@
+from server import admission, server
+
+import asyncio
+import time
+import unittest
+from functools import partial
+
+
+class test_Admission(unittest.TestCase):
+    def test_max_connections(self):
+        a = admission.Admission(max_connections=2)
+        a.admit_connection()
+        a.admit_connection()
+        with self.assertRaises(admission.AdmissionError):
+            a.admit_connection()
+
+        a.release_connection()
+        a.admit_connection()
+        self.assertEqual(2, a.connections)
+
+    def test_max_in_flight(self):
+        a = admission.Admission(max_in_flight=1)
+        a.admit_request()
+        with self.assertRaises(admission.AdmissionError):
+            a.admit_request()
+
+        a.release_request()
+        a.admit_request()
+        self.assertEqual(1, a.in_flight)
+
+    def test_no_limits(self):
+        a = admission.Admission()
+        for _ in range(1_000):
+            a.admit_connection()
+            a.admit_request()
+        self.assertFalse(a.overloaded)
+
+
+class test_lag(unittest.IsolatedAsyncioTestCase):
+    async def test_lagging_loop_sheds(self):
+        a = admission.Admission(max_lag=0.05)
+        self.addCleanup(a.stop)
+        a.admit_request()
+
+        # block the loop while the monitor sleeps
+        await asyncio.sleep(0)
+        time.sleep(0.2)
+        await asyncio.sleep(admission.LAG_INTERVAL)
+        self.assertTrue(a.overloaded)
+        with self.assertRaises(admission.AdmissionError):
+            a.admit_request()
+
+        await asyncio.sleep(admission.LAG_INTERVAL * 3)
+        self.assertFalse(a.overloaded)
+        a.admit_request()
+
+
+class test_http_client_handler(unittest.IsolatedAsyncioTestCase):
+    async def start(self, handler, **limits):
+        client_handler = partial(
+            server.http_client_handler,
+            handler=handler,
+            admission=admission.Admission(**limits),
+        )
+        srv = await asyncio.start_server(
+            client_handler, "127.0.0.1", 0
+        )
+        self.addAsyncCleanup(srv.wait_closed)
+        self.addCleanup(srv.close)
+        return srv.sockets[0].getsockname()[1]
+
+    async def request(self, port: int) -> bytes:
+        reader, writer = await asyncio.open_connection(
+            "127.0.0.1", port
+        )
+        writer.write(b"GET / HTTP/1.1\r\nConnection: close\r\n\r\n")
+        try:
+            return await asyncio.wait_for(reader.read(), 5)
+        finally:
+            writer.close()
+
+    async def test_connection_refused_with_503(self):
+        port = await self.start(
+            server.hello_world_handler, max_connections=1
+        )
+        _, first = await asyncio.open_connection("127.0.0.1", port)
+        # let the server take the first connection
+        await asyncio.sleep(0.05)
+
+        received = await self.request(port)
+        self.assertTrue(received.startswith(b"HTTP/1.1 503"))
+        self.assertIn(b"\r\nRetry-After: 1\r\n", received)
+        self.assertIn(b"\r\nConnection: close\r\n", received)
+
+        first.close()
+        await asyncio.sleep(0.05)
+        received = await self.request(port)
+        self.assertTrue(received.startswith(b"HTTP/1.1 200"))
+
+    async def test_request_refused_with_503(self):
+        release = asyncio.Event()
+
+        async def handler(req):
+            await req.path
+            await release.wait()
+            return server.HELLO_WORLD
+
+        port = await self.start(handler, max_in_flight=1)
+        first = asyncio.ensure_future(self.request(port))
+        await asyncio.sleep(0.05)
+
+        received = await self.request(port)
+        self.assertTrue(received.startswith(b"HTTP/1.1 503"))
+
+        release.set()
+        received = await first
+        self.assertTrue(received.startswith(b"HTTP/1.1 200"))
+        received = await self.request(port)
+        self.assertTrue(received.startswith(b"HTTP/1.1 200"))
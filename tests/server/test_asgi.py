@@ -0,0 +1,189 @@
+from server import asgi
+from server.http import request, response
+from tests.server.helpers import MockStreamReader, make_request
+
+import asyncio
+import unittest
+
+
+async def hello_app(scope, receive, send):
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [[b"content-type", b"text/plain"]],
+        }
+    )
+    body = (
+        f"{scope['method']} {scope['path']} {scope['query_string']}"
+    )
+    await send({"type": "http.response.body", "body": body.encode()})
+
+
+async def echo_app(scope, receive, send):
+    received = []
+    while True:
+        message = await receive()
+        received.append(message)
+        if not message["more_body"]:
+            break
+    await send({"type": "http.response.start", "status": 200})
+    for message in received:
+        await send(
+            {
+                "type": "http.response.body",
+                "body": message["body"],
+                "more_body": True,
+            }
+        )
+    await send({"type": "http.response.body"})
+
+
+async def interleaved_echo_app(scope, receive, send):
+    # answers each chunk of the body as soon as it is read
+    await send({"type": "http.response.start", "status": 200})
+    more = True
+    while more:
+        message = await receive()
+        more = message["more_body"]
+        await send(
+            {
+                "type": "http.response.body",
+                "body": message["body"],
+                "more_body": more,
+            }
+        )
+
+
+async def failing_app(scope, receive, send):
+    raise ValueError("boom")
+
+
+class test_ASGIHandler(unittest.IsolatedAsyncioTestCase):
+    async def collect(self, resp):
+        return b"".join([chunk async for chunk in resp.stream])
+
+    async def test_scope(self):
+        scopes = []
+
+        async def app(scope, receive, send):
+            scopes.append(scope)
+            await hello_app(scope, receive, send)
+
+        handler = asgi.ASGIHandler(app, server=("127.0.0.1", 8080))
+        resp = await handler(
+            make_request(
+                b"GET /a%20b?x=1 HTTP/1.0\r\nHost: localhost\r\n\r\n"
+            )
+        )
+        scope = scopes[0]
+        self.assertEqual("http", scope["type"])
+        self.assertEqual("1.0", scope["http_version"])
+        self.assertEqual(b"/a%20b", scope["raw_path"])
+        self.assertEqual([[b"host", b"localhost"]], scope["headers"])
+        self.assertEqual(("127.0.0.1", 8080), scope["server"])
+        self.assertEqual(b"GET /a b b'x=1'", resp.body)
+
+    async def test_single_body_message(self):
+        handler = asgi.ASGIHandler(hello_app)
+        resp = await handler(make_request(b"GET / HTTP/1.1\r\n\r\n"))
+        self.assertNotIsInstance(resp, response.StreamingResponse)
+        self.assertEqual(
+            [response.Header(b"content-type", b"text/plain")],
+            resp.headers,
+        )
+
+    async def test_streamed_body(self):
+        reader = MockStreamReader(
+            [
+                b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n",
+                b"3\r\none\r\n",
+                b"3\r\ntwo\r\n0\r\n\r\n",
+            ]
+        )
+        handler = asgi.ASGIHandler(echo_app)
+        resp = await handler(request.LazyRequest(reader))
+        self.assertIsInstance(resp, response.StreamingResponse)
+        self.assertIsNone(resp.length)
+        self.assertEqual(b"onetwo", await self.collect(resp))
+
+    async def test_receive_while_streaming(self):
+        reader = MockStreamReader(
+            [
+                b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n",
+                b"5\r\nhello\r\n",
+                b"5\r\nworld\r\n0\r\n\r\n",
+            ]
+        )
+        handler = asgi.ASGIHandler(interleaved_echo_app)
+        resp = await handler(request.LazyRequest(reader))
+        self.assertIsInstance(resp, response.StreamingResponse)
+        self.assertEqual(b"helloworld", await self.collect(resp))
+
+    async def test_body_read_lazily(self):
+        reader = MockStreamReader(
+            [
+                b"POST / HTTP/1.1\r\nContent-Length: 4\r\n\r\n",
+                b"BODY",
+            ]
+        )
+        handler = asgi.ASGIHandler(hello_app)
+        await handler(request.LazyRequest(reader))
+        # the app never called receive
+        self.assertEqual(1, reader.reads)
+
+    async def test_disconnect_after_response(self):
+        messages = []
+
+        async def app(scope, receive, send):
+            messages.append(await receive())
+            await hello_app(scope, receive, send)
+            messages.append(await receive())
+
+        handler = asgi.ASGIHandler(app)
+        await handler(make_request(b"GET / HTTP/1.1\r\n\r\n"))
+        await asyncio.sleep(0)
+        expect = [
+            {
+                "type": "http.request",
+                "body": b"",
+                "more_body": False,
+            },
+            {"type": "http.disconnect"},
+        ]
+        self.assertEqual(expect, messages)
+
+    async def test_body_not_read_after_return(self):
+        messages = []
+        reader = MockStreamReader(
+            [
+                b"POST / HTTP/1.1\r\nContent-Length: 4\r\n\r\n",
+                b"BODY",
+            ]
+        )
+
+        async def app(scope, receive, send):
+            await hello_app(scope, receive, send)
+            # by now the request may be serving the next one
+            messages.append(await receive())
+
+        handler = asgi.ASGIHandler(app)
+        await handler(request.LazyRequest(reader))
+        await asyncio.sleep(0)
+        expect = {
+            "type": "http.request",
+            "body": b"",
+            "more_body": False,
+        }
+        self.assertEqual([expect], messages)
+        self.assertEqual(1, reader.reads)
+
+    async def test_app_error(self):
+        handler = asgi.ASGIHandler(failing_app)
+        with self.assertLogs("asgi"):
+            resp = await handler(
+                make_request(b"GET / HTTP/1.1\r\n\r\n")
+            )
+        self.assertEqual(
+            response.Status.InternalServerError, resp.status
+        )
@@ -0,0 +1,79 @@
+from server import blocking
+from server.http import request, response
+from tests.server.helpers import MockStreamReader
+
+import asyncio
+import threading
+import unittest
+
+
+class test_BlockingPool(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.pool = blocking.BlockingPool(max_workers=1)
+
+    def tearDown(self):
+        self.pool.shutdown()
+
+    async def test_loop_not_blocked(self):
+        release = threading.Event()
+        blocked = asyncio.ensure_future(self.pool.run(release.wait))
+
+        # the loop still runs other tasks while the thread waits
+        await asyncio.sleep(0.05)
+        self.assertFalse(blocked.done())
+        self.assertEqual(1, self.pool.running)
+
+        release.set()
+        self.assertTrue(await blocked)
+        self.assertEqual(0, self.pool.running)
+
+    async def test_pending(self):
+        release = threading.Event()
+        first = asyncio.ensure_future(self.pool.run(release.wait))
+        second = asyncio.ensure_future(self.pool.run(release.wait))
+        await asyncio.sleep(0.05)
+
+        with self.subTest("queued"):
+            self.assertEqual(1, self.pool.running)
+            self.assertEqual(1, self.pool.pending)
+
+        with self.subTest("cancelled_while_queued"):
+            second.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await second
+            self.assertEqual(0, self.pool.pending)
+
+        release.set()
+        await first
+
+    async def test_exception(self):
+        def fail():
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            await self.pool.run(fail)
+        self.assertEqual(0, self.pool.running)
+
+    async def test_handler(self):
+        def echo(req):
+            assert threading.current_thread() is not main
+            return response.Response(
+                protocol=response.Protocol.HTTP1_1,
+                status=response.Status.OK,
+                body=req.header(b"host") + b" " + req.body,
+            )
+
+        main = threading.current_thread()
+        data = [
+            b"POST /echo HTTP/1.1\r\nHost: localhost\r\n",
+            b"Content-Length: 4\r\n\r\nBO",
+            b"DY",
+        ]
+        req = request.LazyRequest(MockStreamReader(data))
+        resp = await self.pool.handler(echo)(req)
+        self.assertEqual(b"localhost BODY", resp.body)
+        await req.finish()
+
+    def test_invalid_size(self):
+        with self.assertRaises(blocking.BlockingPoolError):
+            blocking.BlockingPool(max_workers=0)
@@ -0,0 +1,137 @@
+from server import compression
+from server.http import request, response
+from server.http.header import Header
+from tests.server.helpers import MockStreamReader, header
+
+import gzip
+import unittest
+import zlib
+from unittest import mock
+
+
+def make_request(accept_encoding: bytes = None):
+    head = b"GET / HTTP/1.1\r\n"
+    if accept_encoding is not None:
+        head += b"Accept-Encoding: " + accept_encoding + b"\r\n"
+    reader = MockStreamReader([head + b"\r\n"])
+    return request.LazyRequest(reader)
+
+
+BODY = b"Hello, world! " * 200
+
+
+def make_handler(resp):
+    async def handler(req):
+        return resp
+
+    return handler
+
+
+class test_accepted_encoding(unittest.TestCase):
+    def test_accepted_encoding(self):
+        cases = [
+            (None, None),
+            (b"", None),
+            (b"identity", None),
+            (b"gzip", b"gzip"),
+            (b"deflate, gzip", b"gzip"),
+            (b"gzip;q=0.5, deflate", b"deflate"),
+            (b"gzip;q=0, *", b"deflate"),
+            (b"*;q=0", None),
+            (b"br, *;q=0.1", b"gzip"),
+            (b"GZIP", b"gzip"),
+        ]
+        for value, expect in cases:
+            with self.subTest(value=value):
+                actual = compression.accepted_encoding(value)
+                self.assertEqual(expect, actual)
+
+
+class test_Compressor(unittest.IsolatedAsyncioTestCase):
+    def make_response(self, *headers, body=BODY):
+        return response.Response(
+            protocol=response.Protocol.HTTP1_1,
+            status=response.Status.OK,
+            headers=list(headers),
+            body=body,
+        )
+
+    async def test_gzip(self):
+        resp = self.make_response(
+            Header("Content-Type", "text/plain"),
+            Header("ETag", '"abc"'),
+        )
+        compressor = compression.Compressor(make_handler(resp))
+        actual = await compressor(make_request(b"gzip, deflate"))
+
+        self.assertEqual(BODY, gzip.decompress(actual.body))
+        self.assertEqual("gzip", header(actual, "Content-Encoding"))
+        self.assertEqual("Accept-Encoding", header(actual, "Vary"))
+        self.assertEqual('"abc-gzip"', header(actual, "ETag"))
+
+    async def test_deflate(self):
+        compressor = compression.Compressor(
+            make_handler(self.make_response())
+        )
+        actual = await compressor(make_request(b"deflate"))
+        self.assertEqual(BODY, zlib.decompress(actual.body))
+
+    async def test_identity(self):
+        resp = self.make_response()
+        compressor = compression.Compressor(make_handler(resp))
+        actual = await compressor(make_request())
+        self.assertEqual(BODY, actual.body)
+        self.assertEqual("Accept-Encoding", header(actual, "Vary"))
+
+    async def test_not_eligible(self):
+        cases = [
+            self.make_response(body=b"short"),
+            self.make_response(Header("Content-Type", "image/png")),
+            self.make_response(Header("Content-Encoding", "br")),
+            response.FileResponse(
+                protocol=response.Protocol.HTTP1_1,
+                status=response.Status.OK,
+                path="/dev/null",
+            ),
+        ]
+        for resp in cases:
+            with self.subTest(resp=resp):
+                compressor = compression.Compressor(
+                    make_handler(resp)
+                )
+                actual = await compressor(make_request(b"gzip"))
+                self.assertIs(resp, actual)
+
+    async def test_cached(self):
+        resp = response.prerender(self.make_response())
+        compressor = compression.Compressor(make_handler(resp))
+        first = await compressor(make_request(b"gzip"))
+        second = await compressor(make_request(b"gzip"))
+        self.assertIs(first.body, second.body)
+
+    async def test_not_cached(self):
+        compressor = compression.Compressor(
+            make_handler(self.make_response())
+        )
+        first = await compressor(make_request(b"gzip"))
+        second = await compressor(make_request(b"gzip"))
+        self.assertIsNot(first.body, second.body)
+
+    async def test_cache_bounded(self):
+        compressor = compression.Compressor(
+            None, cache_size=2 * len(BODY)
+        )
+        bodies = [BODY + bytes([i]) for i in range(5)]
+        for body in bodies:
+            await compressor.compress(b"gzip", body, True)
+        self.assertLessEqual(compressor._cached_bytes, 2 * len(BODY))
+        self.assertIn((b"gzip", bodies[-1]), compressor._cache)
+        self.assertNotIn((b"gzip", bodies[0]), compressor._cache)
+
+    async def test_executor(self):
+        with mock.patch.object(compression, "EXECUTOR_SIZE", 0):
+            compressor = compression.Compressor(
+                make_handler(self.make_response())
+            )
+            actual = await compressor(make_request(b"gzip"))
+        self.assertEqual(BODY, gzip.decompress(actual.body))
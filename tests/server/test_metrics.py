@@ -0,0 +1,118 @@
+from server import metrics, server
+
+import asyncio
+import unittest
+from functools import partial
+from types import SimpleNamespace
+
+
+class test_Histogram(unittest.TestCase):
+    def test_cumulative(self):
+        histogram = metrics.Histogram((0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value)
+
+        expect = [("0.1", 2), ("1", 3), ("+Inf", 4)]
+        self.assertEqual(expect, histogram.cumulative())
+        self.assertEqual(4, histogram.count)
+        self.assertAlmostEqual(2.65, histogram.sum)
+
+
+class test_Metrics(unittest.TestCase):
+    def test_request_done(self):
+        m = metrics.Metrics(buckets=(1.0, 10.0))
+        req = SimpleNamespace(
+            received_at=2.0, parsed_at=2.5, head_at=3.0
+        )
+        m.request_done(req, 0.0, 3.0, 5.0, 20.0)
+        m.responded(server.HELLO_WORLD.status, 100)
+
+        rendered = m.render().decode()
+        expect = [
+            "http_requests_total 1",
+            'http_responses_total{code="200"} 1',
+            "http_sent_bytes_total 100",
+            'http_request_phase_seconds_bucket{phase="wait",le="1"} 0',
+            'http_request_phase_seconds_bucket{phase="wait",le="10"} 1',
+            'http_request_phase_seconds_bucket{phase="write",le="10"} 0',
+            'http_request_phase_seconds_bucket{phase="write",le="+Inf"} 1',
+            'http_request_phase_seconds_sum{phase="request"} 18.0',
+            'http_request_phase_seconds_count{phase="headers"} 1',
+        ]
+        for line in expect:
+            self.assertIn(line, rendered.splitlines())
+
+    def test_head_never_read(self):
+        m = metrics.Metrics()
+        req = SimpleNamespace(
+            received_at=2.0, parsed_at=2.5, head_at=None
+        )
+        m.request_done(req, 0.0, 3.0, 5.0, 20.0)
+        self.assertEqual(0, m.phases["headers"].count)
+        self.assertEqual(1, m.phases["handler"].count)
+
+
+class test_http_client_handler(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.metrics = metrics.Metrics()
+        client_handler = partial(
+            server.http_client_handler,
+            handler=self.metrics.expose(server.hello_world_handler),
+            metrics=self.metrics,
+        )
+        self.server = await asyncio.start_server(
+            client_handler, "127.0.0.1", 0
+        )
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def send(self, data: bytes) -> bytes:
+        reader, writer = await asyncio.open_connection(
+            "127.0.0.1", self.port
+        )
+        writer.write(data)
+        received = await asyncio.wait_for(reader.read(), 5)
+        writer.close()
+        await writer.wait_closed()
+        return received
+
+    async def test_requests_counted(self):
+        requests = (
+            b"GET / HTTP/1.1\r\n\r\n"
+            + b"GET / HTTP/1.1\r\n\r\n"
+            + b"GET / HTTP/1.1\r\nConnection: close\r\n\r\n"
+        )
+        received = await self.send(requests)
+        await asyncio.sleep(0.01)
+
+        m = self.metrics
+        self.assertEqual(3, m.requests)
+        self.assertEqual({200: 3}, m.responses)
+        self.assertEqual(len(requests), m.bytes_received)
+        self.assertEqual(len(received), m.bytes_sent)
+        self.assertEqual(1, m.connections)
+        self.assertEqual(0, m.open_connections)
+        for phase in metrics.PHASES:
+            self.assertEqual(3, m.phases[phase].count, phase)
+
+    async def test_parse_error_counted(self):
+        await self.send(b"NOPE\r\n\r\n")
+        await asyncio.sleep(0.01)
+
+        self.assertEqual(1, self.metrics.parse_errors)
+        self.assertEqual({400: 1}, self.metrics.responses)
+
+    async def test_exposed(self):
+        await self.send(
+            b"GET / HTTP/1.1\r\nConnection: close\r\n\r\n"
+        )
+        received = await self.send(
+            b"GET /metrics HTTP/1.1\r\nConnection: close\r\n\r\n"
+        )
+
+        head, _, body = received.partition(b"\r\n\r\n")
+        self.assertIn(b"text/plain; version=0.0.4", head)
+        self.assertIn(b"\nhttp_requests_total 1\n", body)
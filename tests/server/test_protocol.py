@@ -0,0 +1,212 @@
+from server import server, shutdown, workers
+from server.http import response
+from server.protocol import MAX_PIPELINED, HttpProtocol
+
+import asyncio
+import os
+import signal
+import unittest
+from functools import partial
+
+
+REQUEST = b"GET / HTTP/1.1\r\n\r\n"
+
+
+async def echo_handler(req):
+    if await req.path == b"/stream":
+
+        async def chunks():
+            yield b"Hello, "
+            yield b"world!"
+
+        return response.StreamingResponse(
+            protocol=response.Protocol.HTTP1_1,
+            status=response.Status.OK,
+            stream=chunks(),
+        )
+    body = b"".join([chunk async for chunk in req.body])
+    return response.Response(
+        protocol=response.Protocol.HTTP1_1,
+        status=response.Status.OK,
+        body=body or await req.path,
+    )
+
+
+class test_HttpProtocol(unittest.IsolatedAsyncioTestCase):
+    async def start(self, **kwargs):
+        kwargs.setdefault("handler", echo_handler)
+        srv = await asyncio.get_running_loop().create_server(
+            partial(HttpProtocol, **kwargs), "127.0.0.1", 0
+        )
+        self.addAsyncCleanup(srv.wait_closed)
+        self.addCleanup(srv.close)
+        return srv.sockets[0].getsockname()[1]
+
+    async def exchange(self, port: int, data: bytes) -> bytes:
+        reader, writer = await asyncio.open_connection(
+            "127.0.0.1", port
+        )
+        writer.write(data)
+        try:
+            return await asyncio.wait_for(reader.read(), 2)
+        finally:
+            writer.close()
+
+    async def test_keep_alive(self):
+        port = await self.start()
+        reader, writer = await asyncio.open_connection(
+            "127.0.0.1", port
+        )
+        for path in (b"/a", b"/b"):
+            writer.write(b"GET " + path + b" HTTP/1.1\r\n\r\n")
+            received = await asyncio.wait_for(
+                reader.readuntil(path), 1
+            )
+            self.assertTrue(received.startswith(b"HTTP/1.1 200"))
+        writer.close()
+
+    async def test_pipelined(self):
+        port = await self.start()
+        received = await self.exchange(
+            port,
+            b"GET /a HTTP/1.1\r\n\r\n"
+            b"POST /b HTTP/1.1\r\nContent-Length: 5\r\n\r\nhello"
+            b"GET /c HTTP/1.1\r\nConnection: close\r\n\r\n",
+        )
+        self.assertEqual(
+            b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\n/a"
+            b"HTTP/1.1 200 OK\r\nContent-Length: 5\r\n\r\nhello"
+            b"HTTP/1.1 200 OK\r\nConnection: close\r\n"
+            b"Content-Length: 2\r\n\r\n/c",
+            received,
+        )
+
+    async def test_more_pipelined_than_queued(self):
+        port = await self.start()
+        count = MAX_PIPELINED * 3
+        received = await self.exchange(
+            port,
+            REQUEST * (count - 1)
+            + b"GET / HTTP/1.1\r\nConnection: close\r\n\r\n",
+        )
+        self.assertEqual(count, received.count(b"HTTP/1.1 200"))
+
+    async def test_split_reads(self):
+        port = await self.start()
+        reader, writer = await asyncio.open_connection(
+            "127.0.0.1", port
+        )
+        message = (
+            b"POST / HTTP/1.1\r\nContent-Length: 11\r\n"
+            b"Connection: close\r\n\r\nhello world"
+        )
+        for i in range(0, len(message), 7):
+            writer.write(message[i : i + 7])
+            await writer.drain()
+            await asyncio.sleep(0.001)
+        received = await asyncio.wait_for(reader.read(), 2)
+        self.assertTrue(received.endswith(b"\r\n\r\nhello world"))
+        writer.close()
+
+    async def test_chunked_body(self):
+        port = await self.start()
+        received = await self.exchange(
+            port,
+            b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n"
+            b"Connection: close\r\n\r\n"
+            b"5\r\nhello\r\n6\r\n world\r\n0\r\n\r\n",
+        )
+        self.assertTrue(received.endswith(b"\r\n\r\nhello world"))
+
+    async def test_body_too_large(self):
+        port = await self.start(max_body_size=4)
+        received = await self.exchange(
+            port,
+            b"POST / HTTP/1.1\r\nContent-Length: 5\r\n\r\nhello",
+        )
+        self.assertTrue(received.startswith(b"HTTP/1.1 413"))
+
+    async def test_head_too_large(self):
+        port = await self.start()
+        received = await self.exchange(
+            port,
+            b"GET / HTTP/1.1\r\nX-Filler: "
+            + b"a" * 100_000
+            + b"\r\n\r\n",
+        )
+        self.assertTrue(received.startswith(b"HTTP/1.1 431"))
+
+    async def test_rejection_after_pipelined(self):
+        port = await self.start(max_body_size=4)
+        received = await self.exchange(
+            port,
+            b"GET /a HTTP/1.1\r\n\r\n"
+            b"POST / HTTP/1.1\r\nContent-Length: 5\r\n\r\nhello",
+        )
+        self.assertTrue(received.startswith(b"HTTP/1.1 200"))
+        self.assertIn(b"/aHTTP/1.1 413", received)
+
+    async def test_streaming(self):
+        port = await self.start()
+        received = await self.exchange(
+            port,
+            b"GET /stream HTTP/1.1\r\nConnection: close\r\n\r\n",
+        )
+        self.assertIn(
+            b"\r\nTransfer-Encoding: chunked\r\n", received
+        )
+        self.assertTrue(
+            received.endswith(
+                b"7\r\nHello, \r\n6\r\nworld!\r\n0\r\n\r\n"
+            )
+        )
+
+    async def test_max_requests(self):
+        port = await self.start(max_requests=2)
+        received = await self.exchange(port, REQUEST * 3)
+        self.assertEqual(2, received.count(b"HTTP/1.1 200"))
+        self.assertIn(b"\r\nConnection: close\r\n", received)
+
+    async def test_idle_timeout(self):
+        port = await self.start(idle_timeout=0.05)
+        received = await self.exchange(port, b"")
+        self.assertEqual(b"", received)
+
+
+class test_serve(unittest.IsolatedAsyncioTestCase):
+    async def test_sigterm_drains(self):
+        sock = workers.listen("127.0.0.1", 0)
+        port = sock.getsockname()[1]
+        release = asyncio.Event()
+
+        async def handler(req):
+            await release.wait()
+            return server.HELLO_WORLD
+
+        s = shutdown.Shutdown()
+        serving = asyncio.ensure_future(
+            server.serve(
+                sock=sock,
+                protocol_factory=partial(
+                    HttpProtocol, handler=handler, shutdown=s
+                ),
+                shutdown=s,
+            )
+        )
+        await asyncio.sleep(0.05)
+
+        reader, writer = await asyncio.open_connection(
+            "127.0.0.1", port
+        )
+        writer.write(REQUEST)
+        await asyncio.sleep(0.05)
+        os.kill(os.getpid(), signal.SIGTERM)
+        await asyncio.sleep(0.05)
+        self.assertFalse(serving.done())
+
+        release.set()
+        received = await asyncio.wait_for(reader.read(), 2)
+        self.assertTrue(received.startswith(b"HTTP/1.1 200"))
+        self.assertIn(b"\r\nConnection: close\r\n", received)
+        await asyncio.wait_for(serving, 2)
+        writer.close()
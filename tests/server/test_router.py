@@ -0,0 +1,111 @@
+from server import router
+from server.http import request, response
+from server.http.method import Method
+from tests.server.helpers import MockStreamReader
+
+import unittest
+
+
+def make_request(method: bytes, path: bytes):
+    head = b"%s %s HTTP/1.1\r\n\r\n" % (method, path)
+    return request.LazyRequest(MockStreamReader([head]))
+
+
+async def user(req):
+    return response.Response(
+        protocol=response.Protocol.HTTP1_1,
+        status=response.Status.OK,
+        body=req.params["id"],
+    )
+
+
+async def me(req):
+    return response.Response(
+        protocol=response.Protocol.HTTP1_1,
+        status=response.Status.OK,
+        body=b"me",
+    )
+
+
+async def noop(req):
+    return None
+
+
+class test_Router_lookup(unittest.TestCase):
+    def setUp(self):
+        self.router = router.Router()
+        self.router.add(Method.GET, "/", noop)
+        self.router.add(Method.GET, "/users", noop)
+        self.router.add(Method.GET, "/users/me", me)
+        self.router.add(Method.GET, "/users/{id}", user)
+        self.router.add(Method.GET, "/users/{id}/posts/{post}", noop)
+        self.router.add(Method.GET, "/users/me/settings", noop)
+        self.router.add(Method.GET, "/files/{rest*}", noop)
+
+    def test_matches(self):
+        cases = [
+            (b"/", {}),
+            (b"/users", {}),
+            (b"/users?page=2", {}),
+            (b"/users/me", {}),
+            (b"/users/42", {"id": b"42"}),
+            (b"/users/me/posts/7", {"id": b"me", "post": b"7"}),
+            (b"/files", {"rest": b""}),
+            (b"/files/a/b%20c.txt", {"rest": b"a/b%20c.txt"}),
+        ]
+        for path, params in cases:
+            with self.subTest(path=path):
+                found = self.router.lookup(path)
+                self.assertIsNotNone(found)
+                self.assertEqual(params, found.params)
+
+    def test_literal_before_param(self):
+        found = self.router.lookup(b"/users/me")
+        self.assertIs(me, found.handlers[Method.GET])
+
+    def test_no_match(self):
+        for path in (b"/nope", b"/users/", b"/users/1/posts", b"*"):
+            with self.subTest(path=path):
+                self.assertIsNone(self.router.lookup(path))
+
+    def test_invalid_patterns(self):
+        cases = [
+            "users",
+            "/files/{rest*}/more",
+            "/users/{}",
+            "/users/{user_id}",
+            "/users/me",
+        ]
+        for pattern in cases:
+            with self.subTest(pattern=pattern):
+                with self.assertRaises(router.RouterError):
+                    self.router.add(Method.GET, pattern, noop)
+
+
+class test_Router_call(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.router = router.Router()
+        self.router.route(Method.GET, "/users/{id}")(user)
+        self.router.route(Method.DELETE, "/users/{id}")(noop)
+
+    async def test_dispatch(self):
+        resp = await self.router(make_request(b"GET", b"/users/42"))
+        self.assertEqual(b"42", resp.body)
+
+    async def test_head_uses_get(self):
+        resp = await self.router(make_request(b"HEAD", b"/users/42"))
+        self.assertEqual(response.Status.OK, resp.status)
+
+    async def test_not_found(self):
+        resp = await self.router(make_request(b"GET", b"/posts"))
+        self.assertEqual(response.Status.NotFound, resp.status)
+
+    async def test_method_not_allowed(self):
+        resp = await self.router(make_request(b"POST", b"/users/42"))
+        self.assertEqual(
+            response.Status.MethodNotAllowed, resp.status
+        )
+        self.assertEqual(
+            [response.Header("Allow", "GET, HEAD, DELETE")],
+            resp.headers,
+        )
@@ -0,0 +1,360 @@
+from server import asgi, blocking, router, server, wsgi
+from server.http import response
+from server.http.method import Method
+from server.protocol import HttpProtocol
+
+import asyncio
+import socket
+import struct
+import unittest
+from functools import partial
+from unittest import mock
+
+
+REQUEST = b"GET / HTTP/1.1\r\n\r\n"
+
+
+def dechunk(message: bytes) -> bytes:
+    """The body of a chunked response."""
+    rest = message.partition(b"\r\n\r\n")[2]
+    body = b""
+    while True:
+        size, _, rest = rest.partition(b"\r\n")
+        size = int(size, 16)
+        if not size:
+            return body
+        body += rest[:size]
+        rest = rest[size + 2 :]
+
+
+async def hello_body(req):
+    return response.Response(
+        protocol=response.Protocol.HTTP1_1,
+        status=response.Status.OK,
+        body=b"hello-body",
+    )
+
+
+async def hello_stream(req):
+    async def chunks():
+        yield b"hello-"
+        yield b"stream"
+
+    return response.StreamingResponse(
+        protocol=response.Protocol.HTTP1_1,
+        status=response.Status.OK,
+        stream=chunks(),
+    )
+
+
+async def echo_stream(req):
+    async def chunks():
+        async for chunk in req.body:
+            yield chunk
+
+    return response.StreamingResponse(
+        protocol=response.Protocol.HTTP1_1,
+        status=response.Status.OK,
+        stream=chunks(),
+    )
+
+
+async def echo_body(req):
+    body = b"".join([chunk async for chunk in req.body])
+    return response.Response(
+        protocol=response.Protocol.HTTP1_1,
+        status=response.Status.OK,
+        body=b"got %d" % len(body),
+    )
+
+
+async def too_long_stream(req):
+    async def chunks():
+        yield b"hello"
+        yield b" world"
+
+    return response.StreamingResponse(
+        protocol=response.Protocol.HTTP1_1,
+        status=response.Status.OK,
+        stream=chunks(),
+        length=8,
+    )
+
+
+async def large_body(req):
+    return response.Response(
+        protocol=response.Protocol.HTTP1_1,
+        status=response.Status.OK,
+        body=b"x" * 20_000,
+    )
+
+
+async def failing(req):
+    raise ValueError()
+
+
+def no_start_app(environ, start_response):
+    return [b"secret"]
+
+
+async def interleaved_echo_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200})
+    more = True
+    while more:
+        message = await receive()
+        more = message["more_body"]
+        await send(
+            {
+                "type": "http.response.body",
+                "body": message["body"],
+                "more_body": more,
+            }
+        )
+
+
+class test_http_client_handler(unittest.IsolatedAsyncioTestCase):
+    async def start(self, handler, **kwargs):
+        srv = await asyncio.start_server(
+            partial(
+                server.http_client_handler, handler=handler, **kwargs
+            ),
+            "127.0.0.1",
+            0,
+        )
+        self.addAsyncCleanup(srv.wait_closed)
+        self.addCleanup(srv.close)
+        return srv.sockets[0].getsockname()[1]
+
+    async def exchange(self, port: int, data: bytes) -> bytes:
+        reader, writer = await asyncio.open_connection(
+            "127.0.0.1", port
+        )
+        writer.write(data)
+        try:
+            return await asyncio.wait_for(reader.read(), 2)
+        finally:
+            writer.close()
+
+    async def test_head_then_get(self):
+        r = router.Router()
+        r.add(Method.GET, "/", hello_body)
+        r.add(Method.GET, "/stream", hello_stream)
+        port = await self.start(r)
+        received = await self.exchange(
+            port,
+            b"HEAD / HTTP/1.1\r\n\r\n"
+            b"HEAD /stream HTTP/1.1\r\n\r\n"
+            b"GET / HTTP/1.1\r\nConnection: close\r\n\r\n",
+        )
+        self.assertEqual(
+            b"HTTP/1.1 200 OK\r\nContent-Length: 10\r\n\r\n"
+            b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n"
+            b"HTTP/1.1 200 OK\r\nConnection: close\r\n"
+            b"Content-Length: 10\r\n\r\nhello-body",
+            received,
+        )
+
+    async def test_pipelined_batches(self):
+        port = await self.start(large_body)
+        batches = []
+
+        def write_buffers(writer, buffers):
+            batches.append(b"".join(buffers))
+            writer.writelines(buffers)
+
+        with mock.patch.object(
+            server, "write_buffers", write_buffers
+        ):
+            received = await self.exchange(
+                port,
+                REQUEST * 40
+                + b"GET / HTTP/1.1\r\nConnection: close\r\n\r\n",
+            )
+        self.assertEqual(41, received.count(b"HTTP/1.1 200"))
+        self.assertGreater(len(batches), 1)
+        for batch in batches:
+            self.assertLessEqual(
+                batch.count(b"HTTP/1.1 200"), server.MAX_BATCH
+            )
+            self.assertLess(
+                len(batch), server.MAX_BATCH_SIZE + 20_100
+            )
+
+    async def test_stream_reads_request_body(self):
+        port = await self.start(echo_stream)
+        received = await self.exchange(
+            port,
+            b"POST / HTTP/1.1\r\nContent-Length: 11\r\n\r\n"
+            b"hello world"
+            b"POST / HTTP/1.1\r\nContent-Length: 3\r\n"
+            b"Connection: close\r\n\r\nbye",
+        )
+        first, second = received.split(b"HTTP/1.1 200 OK")[1:]
+        self.assertEqual(b"hello world", dechunk(first))
+        self.assertEqual(b"bye", dechunk(second))
+        self.assertEqual(2, received.count(b"HTTP/1.1 200"))
+
+    async def test_stream_longer_than_length(self):
+        port = await self.start(too_long_stream)
+        with self.assertLogs(level="ERROR"):
+            received = await self.exchange(port, REQUEST + REQUEST)
+        self.assertTrue(
+            received.endswith(b"Content-Length: 8\r\n\r\nhello wo")
+        )
+        self.assertEqual(1, received.count(b"HTTP/1.1 200"))
+
+    async def test_parse_error(self):
+        port = await self.start(hello_body)
+        with self.assertLogs("server", level="WARNING"):
+            received = await self.exchange(
+                port,
+                b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n"
+                b"\r\n-5\r\nhello\r\n0\r\n\r\n",
+            )
+        self.assertTrue(received.startswith(b"HTTP/1.1 400"))
+        self.assertTrue(received.endswith(b"\r\n\r\nBad Request"))
+
+    async def test_handler_error(self):
+        port = await self.start(failing)
+        with self.assertLogs("server", level="ERROR"):
+            received = await self.exchange(port, REQUEST)
+        self.assertTrue(received.startswith(b"HTTP/1.1 500"))
+        self.assertTrue(
+            received.endswith(b"\r\n\r\nInternal Server Error")
+        )
+
+    async def test_wsgi_error(self):
+        pool = blocking.BlockingPool(max_workers=1)
+        self.addCleanup(pool.shutdown)
+        port = await self.start(wsgi.WSGIHandler(no_start_app, pool))
+        with self.assertLogs("server", level="ERROR"):
+            received = await self.exchange(port, REQUEST)
+        self.assertTrue(received.startswith(b"HTTP/1.1 500"))
+        self.assertNotIn(b"start_response", received)
+
+    async def test_idle_mid_request(self):
+        port = await self.start(echo_stream, idle_timeout=0.1)
+        for data in (
+            b"GET / HTTP/1.1\r\n",
+            b"GET / HTTP/1.1\r\nHost: loc",
+        ):
+            with self.subTest(data=data):
+                with self.assertLogs(level="WARNING"):
+                    received = await self.exchange(port, data)
+                self.assertTrue(received.startswith(b"HTTP/1.1 408"))
+
+    async def test_idle_mid_body(self):
+        # answered before the body is in, but not kept alive
+        port = await self.start(hello_body, idle_timeout=0.1)
+        with self.assertLogs("server", level="WARNING"):
+            received = await self.exchange(
+                port,
+                b"POST / HTTP/1.1\r\nContent-Length: 5\r\n\r\nhel",
+            )
+        self.assertTrue(received.endswith(b"\r\n\r\nhello-body"))
+
+    async def test_slow_upload(self):
+        port = await self.start(echo_body, idle_timeout=0.2)
+        reader, writer = await asyncio.open_connection(
+            "127.0.0.1", port
+        )
+        writer.write(
+            b"POST / HTTP/1.1\r\nContent-Length: 8\r\n"
+            b"Connection: close\r\n\r\n"
+        )
+        # longer than the idle timeout in all, but never idle
+        for _ in range(8):
+            await asyncio.sleep(0.05)
+            writer.write(b"x")
+        received = await asyncio.wait_for(reader.read(), 2)
+        writer.close()
+        self.assertTrue(received.endswith(b"\r\n\r\ngot 8"))
+
+    async def test_closed_mid_body(self):
+        port = await self.start(echo_body)
+        reader, writer = await asyncio.open_connection(
+            "127.0.0.1", port
+        )
+        writer.write(
+            b"POST / HTTP/1.1\r\nContent-Length: 100\r\n\r\nabc"
+        )
+        writer.write_eof()
+        received = await asyncio.wait_for(reader.read(), 2)
+        writer.close()
+        self.assertNotIn(b"got 3", received)
+        self.assertFalse(received.startswith(b"HTTP/1.1 200"))
+
+    async def test_reset_while_idle(self):
+        port = await self.start(hello_body)
+        reader, writer = await asyncio.open_connection(
+            "127.0.0.1", port
+        )
+        writer.write(REQUEST)
+        await asyncio.wait_for(reader.readuntil(b"hello-body"), 2)
+        with self.assertNoLogs(level="ERROR"):
+            # closing with SO_LINGER 0 sends a reset
+            writer.get_extra_info("socket").setsockopt(
+                socket.SOL_SOCKET,
+                socket.SO_LINGER,
+                struct.pack("ii", 1, 0),
+            )
+            writer.close()
+            await asyncio.sleep(0.05)
+
+    async def test_asgi_receive_while_sending(self):
+        port = await self.start(
+            asgi.ASGIHandler(interleaved_echo_app)
+        )
+        reader, writer = await asyncio.open_connection(
+            "127.0.0.1", port
+        )
+        writer.write(
+            b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n"
+            b"Connection: close\r\n\r\n5\r\nhello\r\n"
+        )
+        await writer.drain()
+        # the first chunk is answered before the rest is sent
+        received = await asyncio.wait_for(
+            reader.readuntil(b"hello\r\n"), 2
+        )
+        writer.write(b"5\r\nworld\r\n0\r\n\r\n")
+        received += await asyncio.wait_for(reader.read(), 2)
+        writer.close()
+        self.assertEqual(b"helloworld", dechunk(received))
+
+
+class test_linger(unittest.IsolatedAsyncioTestCase):
+    async def test_client_gone(self):
+        writer = mock.Mock()
+        writer.can_write_eof.return_value = True
+        writer.write_eof.side_effect = OSError(107, "not connected")
+        await server.linger(mock.AsyncMock(), writer)
+        writer.close.assert_called_once()
+
+
+class test_HttpProtocol(test_http_client_handler):
+    async def start(self, handler, **kwargs):
+        srv = await asyncio.get_running_loop().create_server(
+            partial(HttpProtocol, handler=handler, **kwargs),
+            "127.0.0.1",
+            0,
+        )
+        self.addAsyncCleanup(srv.wait_closed)
+        self.addCleanup(srv.close)
+        return srv.sockets[0].getsockname()[1]
+
+    @unittest.skip(
+        "the body is received in full before the app runs"
+    )
+    async def test_asgi_receive_while_sending(self):
+        pass
+
+    async def test_idle_mid_body(self):
+        # handlers only ever see complete requests
+        port = await self.start(hello_body, idle_timeout=0.1)
+        with self.assertLogs("protocol", level="WARNING"):
+            received = await self.exchange(
+                port,
+                b"POST / HTTP/1.1\r\nContent-Length: 5\r\n\r\nhel",
+            )
+        self.assertTrue(received.startswith(b"HTTP/1.1 408"))
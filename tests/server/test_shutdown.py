@@ -0,0 +1,121 @@
+from server import server, shutdown, workers
+
+import asyncio
+import os
+import signal
+import unittest
+from functools import partial
+
+
+REQUEST = b"GET / HTTP/1.1\r\n\r\n"
+
+
+class test_Shutdown(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.release = asyncio.Event()
+        self.shutdown = shutdown.Shutdown()
+
+        async def handler(req):
+            if await req.path == b"/slow":
+                await self.release.wait()
+            return server.HELLO_WORLD
+
+        client_handler = partial(
+            server.http_client_handler,
+            handler=handler,
+            shutdown=self.shutdown,
+        )
+        self.server = await asyncio.start_server(
+            self.shutdown.track(client_handler), "127.0.0.1", 0
+        )
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def connect(self):
+        return await asyncio.open_connection("127.0.0.1", self.port)
+
+    async def test_no_connections(self):
+        await asyncio.wait_for(self.shutdown.drain(), 1)
+        self.assertTrue(self.shutdown.draining)
+
+    async def test_idle_closed_after_grace(self):
+        reader, writer = await self.connect()
+        writer.write(REQUEST)
+        await reader.readuntil(b"Hello, world!")
+
+        await asyncio.wait_for(
+            self.shutdown.drain(idle_grace=0.05), 1
+        )
+        self.assertEqual(b"", await reader.read())
+        self.assertEqual(0, self.shutdown.connections)
+        writer.close()
+
+    async def test_request_during_grace_answered(self):
+        reader, writer = await self.connect()
+        writer.write(REQUEST)
+        await reader.readuntil(b"Hello, world!")
+
+        drain = asyncio.ensure_future(self.shutdown.drain())
+        await asyncio.sleep(0.01)
+        writer.write(REQUEST)
+        received = await asyncio.wait_for(reader.read(), 1)
+        self.assertTrue(received.startswith(b"HTTP/1.1 200"))
+        self.assertIn(b"\r\nConnection: close\r\n", received)
+        await asyncio.wait_for(drain, 1)
+        writer.close()
+
+    async def test_in_flight_finishes(self):
+        reader, writer = await self.connect()
+        writer.write(b"GET /slow HTTP/1.1\r\n\r\n")
+        await asyncio.sleep(0.01)
+
+        drain = asyncio.ensure_future(self.shutdown.drain())
+        await asyncio.sleep(0.01)
+        self.assertFalse(drain.done())
+
+        self.release.set()
+        received = await asyncio.wait_for(reader.read(), 1)
+        self.assertTrue(received.startswith(b"HTTP/1.1 200"))
+        self.assertIn(b"\r\nConnection: close\r\n", received)
+        await asyncio.wait_for(drain, 1)
+        writer.close()
+
+    async def test_deadline(self):
+        _, writer = await self.connect()
+        writer.write(b"GET /slow HTTP/1.1\r\n\r\n")
+        await asyncio.sleep(0.01)
+
+        await asyncio.wait_for(self.shutdown.drain(timeout=0.05), 1)
+        self.assertEqual(0, self.shutdown.connections)
+        writer.close()
+
+
+class test_serve(unittest.IsolatedAsyncioTestCase):
+    async def test_sigterm_drains(self):
+        sock = workers.listen("127.0.0.1", 0)
+        port = sock.getsockname()[1]
+        s = shutdown.Shutdown()
+        serving = asyncio.ensure_future(
+            server.serve(
+                sock=sock,
+                client_handler=partial(
+                    server.http_client_handler, shutdown=s
+                ),
+                shutdown=s,
+            )
+        )
+
+        reader, writer = await asyncio.open_connection(
+            "127.0.0.1", port
+        )
+        writer.write(REQUEST)
+        # serving, so SIGTERM is handled by now
+        await reader.readuntil(b"Hello, world!")
+
+        os.kill(os.getpid(), signal.SIGTERM)
+        await asyncio.wait_for(serving, 2)
+        self.assertEqual(b"", await reader.read())
+        writer.close()
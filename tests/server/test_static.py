@@ -0,0 +1,119 @@
+from server import static
+from server.http import request, response
+from tests.server.helpers import MockStreamReader, header
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+
+def make_request(path: bytes, *headers: bytes, method=b"GET"):
+    head = b"%s %s HTTP/1.1\r\n" % (method, path)
+    for line in headers:
+        head += line + b"\r\n"
+    reader = MockStreamReader([head + b"\r\n"])
+    return request.LazyRequest(reader)
+
+
+class test_StaticFiles(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.root.name, "styles.css")
+        with open(self.path, "wb") as f:
+            f.write(b"0123456789")
+        self.files = static.StaticFiles(self.root.name)
+
+    def tearDown(self):
+        self.root.cleanup()
+
+    async def test_file(self):
+        resp = await self.files(make_request(b"/styles.css"))
+        self.assertIsInstance(resp, response.FileResponse)
+        self.assertEqual(response.Status.OK, resp.status)
+        self.assertEqual(self.path, resp.path)
+        self.assertEqual((0, 10), (resp.offset, resp.count))
+        self.assertEqual("text/css", header(resp, "Content-Type"))
+
+    async def test_not_found(self):
+        for path in (
+            b"/missing.css",
+            b"/../etc/passwd",
+            b"/%2e%2e/x",
+            b"/%00",
+            b"/styles.css%00.txt",
+        ):
+            with self.subTest(path=path):
+                resp = await self.files(make_request(path))
+                self.assertEqual(
+                    response.Status.NotFound, resp.status
+                )
+
+    async def test_if_none_match(self):
+        resp = await self.files(make_request(b"/styles.css"))
+        etag = header(resp, "ETag").encode()
+
+        resp = await self.files(
+            make_request(b"/styles.css", b"If-None-Match: " + etag)
+        )
+        self.assertEqual(response.Status.NotModified, resp.status)
+
+    async def test_if_modified_since(self):
+        resp = await self.files(make_request(b"/styles.css"))
+        since = header(resp, "Last-Modified").encode()
+
+        resp = await self.files(
+            make_request(
+                b"/styles.css", b"If-Modified-Since: " + since
+            )
+        )
+        self.assertEqual(response.Status.NotModified, resp.status)
+
+    async def test_ranges(self):
+        cases = [
+            (b"bytes=2-5", response.Status.PartialContent, (2, 4)),
+            (b"bytes=7-", response.Status.PartialContent, (7, 3)),
+            (b"bytes=-3", response.Status.PartialContent, (7, 3)),
+            (b"bytes=5-100", response.Status.PartialContent, (5, 5)),
+            (b"bytes=0-1,4-5", response.Status.OK, (0, 10)),
+        ]
+        for value, status, span in cases:
+            with self.subTest(value=value):
+                resp = await self.files(
+                    make_request(b"/styles.css", b"Range: " + value)
+                )
+                self.assertEqual(status, resp.status)
+                self.assertEqual(span, (resp.offset, resp.count))
+
+    async def test_range_not_satisfiable(self):
+        resp = await self.files(
+            make_request(b"/styles.css", b"Range: bytes=10-")
+        )
+        self.assertEqual(
+            response.Status.RangeNotSatisfiable, resp.status
+        )
+        self.assertEqual("bytes */10", header(resp, "Content-Range"))
+
+    async def test_head(self):
+        resp = await self.files(
+            make_request(b"/styles.css", method=b"HEAD")
+        )
+        self.assertNotIsInstance(resp, response.FileResponse)
+        self.assertEqual("10", header(resp, "Content-Length"))
+
+    async def test_cache_invalidated(self):
+        first = await self.files(make_request(b"/styles.css"))
+        with open(self.path, "ab") as f:
+            f.write(b"more")
+
+        with self.subTest("cached"):
+            resp = await self.files(make_request(b"/styles.css"))
+            self.assertEqual(10, resp.count)
+
+        with self.subTest("revalidated"):
+            with mock.patch.object(static, "REVALIDATE_AFTER", 0):
+                resp = await self.files(make_request(b"/styles.css"))
+            self.assertEqual(14, resp.count)
+            self.assertNotEqual(
+                header(first, "ETag"), header(resp, "ETag")
+            )
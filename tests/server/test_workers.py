@@ -0,0 +1,155 @@
+from server import workers
+
+import asyncio
+import os
+import signal
+import socket
+import sys
+import unittest
+
+
+# each worker prints its pid, then waits for its SIGTERM
+SUPERVISED = """
+import os, time
+from server import workers
+
+def target():
+    os.write(1, b"%d\\n" % os.getpid())
+    while True:
+        time.sleep(1)
+
+workers.Supervisor(target, workers=2).run()
+"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+
+
+def alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class test_Supervisor(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.proc = await asyncio.create_subprocess_exec(
+            sys.executable,
+            "-c",
+            SUPERVISED,
+            cwd=ROOT,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            # a group of its own, to take the workers down with it
+            start_new_session=True,
+        )
+
+    async def asyncTearDown(self):
+        try:
+            os.killpg(self.proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        await self.proc.wait()
+
+    async def started(self, count: int):
+        pids = []
+        for _ in range(count):
+            line = await asyncio.wait_for(
+                self.proc.stdout.readline(), 5
+            )
+            pids.append(int(line))
+        return pids
+
+    async def gone(self, pid: int) -> None:
+        for _ in range(100):
+            if not alive(pid):
+                return
+            await asyncio.sleep(0.05)
+        self.fail(f"Worker {pid} still running")
+
+    async def test_restart(self):
+        first, second = await self.started(2)
+        os.kill(first, signal.SIGKILL)
+        (replacement,) = await self.started(1)
+        self.assertNotIn(replacement, (first, second))
+        self.assertTrue(alive(second))
+
+    async def test_reload(self):
+        old = await self.started(2)
+        self.proc.send_signal(signal.SIGHUP)
+        new = await self.started(2)
+        self.assertFalse(set(old) & set(new))
+        for pid in old:
+            await self.gone(pid)
+        for pid in new:
+            self.assertTrue(alive(pid))
+        self.assertIsNone(self.proc.returncode)
+
+    async def test_stop(self):
+        pids = await self.started(2)
+        self.proc.send_signal(signal.SIGTERM)
+        code = await asyncio.wait_for(self.proc.wait(), 5)
+        self.assertEqual(0, code)
+        for pid in pids:
+            await self.gone(pid)
+
+    def test_no_workers(self):
+        with self.assertRaises(workers.WorkerError):
+            workers.Supervisor(lambda: None, workers=0)
+
+
+class test_single_process(unittest.IsolatedAsyncioTestCase):
+    async def test_sighup_ignored(self):
+        port = free_port()
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable,
+            "-m",
+            "server",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            cwd=ROOT,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        try:
+            await self.request(port)
+            proc.send_signal(signal.SIGHUP)
+            await asyncio.sleep(0.1)
+            self.assertIsNone(proc.returncode)
+            self.assertTrue(
+                (await self.request(port)).startswith(
+                    b"HTTP/1.1 200"
+                )
+            )
+            proc.send_signal(signal.SIGTERM)
+            code = await asyncio.wait_for(proc.wait(), 5)
+            self.assertEqual(0, code)
+        finally:
+            if proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+
+    async def request(self, port: int) -> bytes:
+        for _ in range(100):
+            try:
+                reader, writer = await asyncio.open_connection(
+                    "127.0.0.1", port
+                )
+                break
+            except ConnectionRefusedError:
+                await asyncio.sleep(0.05)
+        else:
+            self.fail("Server did not start")
+        writer.write(b"GET / HTTP/1.1\r\nConnection: close\r\n\r\n")
+        try:
+            return await asyncio.wait_for(reader.read(), 2)
+        finally:
+            writer.close()
@@ -0,0 +1,151 @@
+from server import writer
+
+import asyncio
+import socket
+import unittest
+from unittest import mock
+
+
+class MockStreamWriter:
+    def __init__(self) -> None:
+        self.calls = []
+
+    def write(self, data: bytes) -> None:
+        self.calls.append(("write", data))
+
+    def writelines(self, data) -> None:
+        self.calls.append(("writelines", list(data)))
+
+    async def drain(self) -> None:
+        self.calls.append(("drain", None))
+
+
+class test_write_buffers(unittest.TestCase):
+    def test_large_buffer_not_joined(self):
+        head = b"HTTP/1.1 200 OK\r\n\r\n"
+        body = b"x" * writer.JOIN_LIMIT
+        mock_writer = MockStreamWriter()
+
+        with mock.patch.object(writer, "SCATTER_GATHER", False):
+            writer.write_buffers(mock_writer, [head, body, head])
+
+        expect = [
+            ("writelines", [head]),
+            ("write", body),
+            ("writelines", [head]),
+        ]
+        self.assertEqual(expect, mock_writer.calls)
+        self.assertIs(body, mock_writer.calls[1][1])
+
+    def test_scatter_gather(self):
+        buffers = [b"head", b"x" * writer.JOIN_LIMIT]
+        mock_writer = MockStreamWriter()
+
+        with mock.patch.object(writer, "SCATTER_GATHER", True):
+            writer.write_buffers(mock_writer, buffers)
+
+        self.assertEqual(
+            [("writelines", buffers)], mock_writer.calls
+        )
+
+
+class test_write_stream(unittest.IsolatedAsyncioTestCase):
+    async def test_slow_reader_pauses_producer(self):
+        chunk = b"x" * 65_536
+        produced = 0
+        done = asyncio.Event()
+
+        async def chunks():
+            nonlocal produced
+            while produced < 64 * 1_048_576:
+                produced += len(chunk)
+                yield chunk
+
+        async def handler(reader, stream_writer):
+            writer.set_write_limits(stream_writer, 65_536)
+            try:
+                await writer.write_stream(stream_writer, chunks())
+            except ConnectionError:
+                pass
+            finally:
+                done.set()
+
+        server = await asyncio.start_server(handler, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        sock = socket.socket()
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4_096)
+        sock.connect(("127.0.0.1", port))
+
+        try:
+            # the client never reads
+            await asyncio.sleep(0.2)
+            self.assertFalse(done.is_set())
+            self.assertLess(produced, 16 * 1_048_576)
+        finally:
+            sock.close()
+            await asyncio.wait_for(done.wait(), 5)
+            server.close()
+            await server.wait_closed()
+
+    async def test_drained_after_each_chunk(self):
+        async def chunks():
+            for chunk in (b"abc", b"", b"de"):
+                yield chunk
+
+        mock_writer = MockStreamWriter()
+        written = await writer.write_stream(mock_writer, chunks())
+
+        expect = [
+            ("write", b"abc"),
+            ("drain", None),
+            ("write", b"de"),
+            ("drain", None),
+        ]
+        self.assertEqual(expect, mock_writer.calls)
+        self.assertEqual(5, written)
+
+    async def test_chunked(self):
+        async def chunks():
+            for chunk in (b"hello", b"", b" world!"):
+                yield chunk
+
+        mock_writer = MockStreamWriter()
+        with mock.patch.object(writer, "SCATTER_GATHER", True):
+            written = await writer.write_stream(
+                mock_writer, chunks(), chunked=True
+            )
+
+        expect = [
+            ("writelines", [b"5\r\n", b"hello", b"\r\n"]),
+            ("drain", None),
+            ("writelines", [b"7\r\n", b" world!", b"\r\n"]),
+            ("drain", None),
+            ("write", b"0\r\n\r\n"),
+        ]
+        self.assertEqual(expect, mock_writer.calls)
+        self.assertEqual(12, written)
+
+    async def test_longer_than_length(self):
+        closed = False
+
+        async def chunks():
+            nonlocal closed
+            try:
+                for chunk in (b"hello", b" world", b"!"):
+                    yield chunk
+            finally:
+                closed = True
+
+        mock_writer = MockStreamWriter()
+        with self.assertRaises(writer.StreamLengthError):
+            await writer.write_stream(
+                mock_writer, chunks(), length=8
+            )
+
+        expect = [
+            ("write", b"hello"),
+            ("drain", None),
+            ("write", b" wo"),
+        ]
+        self.assertEqual(expect, mock_writer.calls)
+        self.assertTrue(closed)
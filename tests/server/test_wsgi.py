@@ -0,0 +1,108 @@
+from server import blocking, wsgi
+from server.http import response
+from tests.server.helpers import make_request
+
+import unittest
+from wsgiref.validate import validator
+
+
+def environ_app(environ, start_response):
+    body = repr(
+        {
+            key: environ.get(key)
+            for key in (
+                "REQUEST_METHOD",
+                "PATH_INFO",
+                "QUERY_STRING",
+                "CONTENT_TYPE",
+                "HTTP_ACCEPT",
+                "HTTP_X_MULTI",
+            )
+        }
+    ).encode()
+    length = int(environ.get("CONTENT_LENGTH") or 0)
+    body += b"|" + environ["wsgi.input"].read(length)
+    start_response("200 OK", [("Content-Type", "text/plain")])
+    return [body]
+
+
+def generator_app(environ, start_response):
+    # start_response is only called once iteration starts
+    start_response("201 Created", [("Content-Type", "text/plain")])
+    yield b""
+    yield b"one,"
+    yield b"two"
+
+
+def length_app(environ, start_response):
+    start_response(
+        "200 OK",
+        [("Content-Type", "text/plain"), ("Content-Length", "6")],
+    )
+    return iter([b"abc", b"def"])
+
+
+def no_start_app(environ, start_response):
+    return [b"oops"]
+
+
+class test_WSGIHandler(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.pool = blocking.BlockingPool(max_workers=2)
+
+    def tearDown(self):
+        self.pool.shutdown()
+
+    async def collect(self, resp):
+        return b"".join([chunk async for chunk in resp.stream])
+
+    async def test_environ(self):
+        handler = wsgi.WSGIHandler(validator(environ_app), self.pool)
+        req = make_request(
+            b"POST /a%20b?x=1 HTTP/1.1\r\nAccept: */*\r\n",
+            b"Content-Type: text/plain\r\nX-Multi: 1\r\nX-Multi: 2\r\n",
+            b"Content-Length: 4\r\n\r\nBODY",
+        )
+        resp = await handler(req)
+        # validator wraps the result, so it is streamed
+        body = await self.collect(resp)
+
+        expect = {
+            "REQUEST_METHOD": "POST",
+            "PATH_INFO": "/a b",
+            "QUERY_STRING": "x=1",
+            "CONTENT_TYPE": "text/plain",
+            "HTTP_ACCEPT": "*/*",
+            "HTTP_X_MULTI": "1,2",
+        }
+        self.assertEqual(repr(expect).encode() + b"|BODY", body)
+        self.assertEqual(response.Status.OK, resp.status)
+
+    async def test_list_body(self):
+        handler = wsgi.WSGIHandler(environ_app, self.pool)
+        req = make_request(
+            b"GET / HTTP/1.1\r\nAccept: a\r\nX-Multi: b\r\n\r\n"
+        )
+        resp = await handler(req)
+        self.assertNotIsInstance(resp, response.StreamingResponse)
+        self.assertTrue(resp.body.endswith(b"|"))
+
+    async def test_streamed(self):
+        handler = wsgi.WSGIHandler(generator_app, self.pool)
+        resp = await handler(make_request(b"GET / HTTP/1.1\r\n\r\n"))
+        self.assertIsInstance(resp, response.StreamingResponse)
+        self.assertEqual(response.Status.Created, resp.status)
+        self.assertIsNone(resp.length)
+        self.assertEqual(b"one,two", await self.collect(resp))
+
+    async def test_streamed_with_length(self):
+        handler = wsgi.WSGIHandler(length_app, self.pool)
+        resp = await handler(make_request(b"GET / HTTP/1.1\r\n\r\n"))
+        self.assertEqual(6, resp.length)
+        self.assertEqual(b"abcdef", await self.collect(resp))
+        self.assertFalse(response.is_chunked(resp))
+
+    async def test_no_start_response(self):
+        handler = wsgi.WSGIHandler(no_start_app, self.pool)
+        with self.assertRaises(wsgi.WSGIError):
+            await handler(make_request(b"GET / HTTP/1.1\r\n\r\n"))